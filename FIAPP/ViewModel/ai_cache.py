@@ -0,0 +1,65 @@
+"""Caché de respuestas del asistente IA.
+
+Los tenderos repiten las mismas preguntas ("¿quién me debe?", "¿qué tengo
+bajo de stock?"). Si los datos de sus tiendas no cambiaron, la respuesta del
+proveedor sigue siendo válida y se devuelve sin volver a consultarlo.
+
+La clave combina:
+  - el tendero,
+  - el mensaje normalizado (sin tildes, mayúsculas ni signos),
+  - las intenciones detectadas,
+  - las versiones de sus tiendas (`ContextoIA.versiones`): cualquier
+    escritura en una tienda cambia la clave y la respuesta vieja ya no se usa.
+
+Las entradas vencen a los `ttl` segundos (cubre escrituras hechas por otros
+procesos) y, con más de `max_entradas`, se descarta la menos usada. Sólo se
+guardan respuestas del proveedor, no las del motor local.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from ViewModel.ai_planner import normalizar_mensaje
+
+
+class CacheRespuestas:
+    def __init__(self, ttl=600, max_entradas=500):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # clave -> (guardada, respuesta)
+
+    @staticmethod
+    def clave(tendero_id, mensaje, intenciones, versiones):
+        return (tendero_id, normalizar_mensaje(mensaje), tuple(intenciones), versiones)
+
+    def obtener(self, clave):
+        """La respuesta guardada para `clave`, o None si no hay o venció."""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            guardada, respuesta = entrada
+            if time.monotonic() - guardada >= self.ttl:
+                del self._entradas[clave]
+                return None
+            self._entradas.move_to_end(clave)
+            return respuesta
+
+    def guardar(self, clave, respuesta):
+        with self._lock:
+            self._entradas[clave] = (time.monotonic(), respuesta)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self, tendero_id=None):
+        with self._lock:
+            if tendero_id is None:
+                self._entradas.clear()
+            else:
+                for clave in [c for c in self._entradas if c[0] == tendero_id]:
+                    del self._entradas[clave]
+
+    def __len__(self):
+        return len(self._entradas)
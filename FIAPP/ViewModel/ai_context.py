@@ -0,0 +1,222 @@
+"""Contexto de negocio para el asistente IA, cacheado por tienda.
+
+Antes, cada mensaje del chat releía todos los productos y clientes de cada
+tienda y rearmaba el texto desde cero. Aquí:
+
+- los locales del tendero salen de `listar_locales_por_propietario` y se
+  recuerdan mientras no cambie `db.version_locales()`;
+- de cada tienda se guarda un resumen (nombre, productos, clientes) junto
+  con `db.version_local(local_id)`; sólo se vuelve a leer la tienda cuyo
+  número de versión cambió (una escritura en este proceso) o cuya entrada
+  tiene más de `ttl` segundos (escrituras de otros procesos);
+- el texto de cada sección (deudas, productos, ...) se arma una vez por
+  versión de la tienda;
+- varias consultas en un mismo mensaje (`consultas`) comparten la lectura
+  de cada tienda;
+- el resultado se recorta a un presupuesto aproximado de tokens.
+
+Dos mensajes seguidos sin cambios en las tiendas no hacen lecturas.
+"""
+import threading
+import time
+
+from domain.local import Local
+
+TIPOS = ("resumen", "deudas", "productos", "clientes", "stock")
+TITULOS = {
+    "resumen": "Resumen",
+    "deudas": "Deudas",
+    "productos": "Productos",
+    "clientes": "Clientes",
+    "stock": "Bajo stock",
+}
+
+
+def estimar_tokens(texto):
+    """Aproximación barata: ~4 caracteres por token."""
+    return len(texto) // 4 + 1
+
+
+class _Tienda:
+    """Resumen de una tienda en una versión dada, con sus secciones ya formateadas."""
+
+    __slots__ = ("version", "leida", "nombre", "productos", "clientes", "secciones")
+
+    def __init__(self, version, local_id, data):
+        # Se parsea una vez por versión; el historial de deudas no hace falta
+        local = Local.from_dict(data or {}, local_id, historial=False)
+        self.version = version
+        self.leida = time.monotonic()
+        self.nombre = local.nombre
+        self.productos = list(local.productos.values())
+        self.clientes = list(local.clientes.values())
+        for cliente in self.clientes:
+            cliente.nombre = cliente.nombre or cliente.email or cliente.uid
+        self.secciones = {}
+
+    def seccion(self, tipo):
+        texto = self.secciones.get(tipo)
+        if texto is None:
+            texto = self.secciones[tipo] = "\n".join(getattr(self, f"_seccion_{tipo}")())
+        return texto
+
+    def _seccion_resumen(self):
+        lineas = [f"\n🏪 Tienda: {self.nombre}"]
+        if self.productos:
+            lineas.append(f"  📦 Productos ({len(self.productos)}):")
+            for p in self.productos[:5]:  # Top 5
+                lineas.append(f"    - {p.nombre}: ${p.precio} (stock: {p.stock})")
+            if len(self.productos) > 5:
+                lineas.append(f"    ... y {len(self.productos) - 5} más")
+        if self.clientes:
+            deudas = [c.deuda for c in self.clientes if c.deuda > 0]
+            lineas.append(f"  👥 Clientes: {len(self.clientes)} (deudores: {len(deudas)}, deuda total: ${sum(deudas):.2f})")
+        return lineas
+
+    def _seccion_deudas(self):
+        # Ordenar por deuda descendente
+        deudores = sorted((c for c in self.clientes if c.deuda > 0), key=lambda c: c.deuda, reverse=True)
+        if not deudores:
+            return []
+        lineas = [f"🏪 {self.nombre}:"]
+        lineas += [f"  - {c.nombre}: ${c.deuda:.2f}" for c in deudores]
+        lineas.append(f"  TOTAL DEUDA: ${sum(c.deuda for c in deudores):.2f}")
+        return lineas
+
+    def _seccion_productos(self):
+        if not self.productos:
+            return []
+        # Ordenar por precio descendente
+        productos = sorted(self.productos, key=lambda p: p.precio, reverse=True)
+        lineas = [f"🏪 {self.nombre} - Productos:"]
+        lineas += [f"  - {p.nombre}: ${p.precio:.2f} (stock: {p.stock})" for p in productos[:10]]
+        if len(productos) > 10:
+            lineas.append(f"  ... y {len(productos) - 10} más")
+        return lineas
+
+    def _seccion_clientes(self):
+        if not self.clientes:
+            return []
+        lineas = [f"🏪 {self.nombre} - Clientes ({len(self.clientes)}):"]
+        for c in self.clientes[:10]:
+            estado = f"Debe: ${c.deuda:.2f}" if c.deuda > 0 else "Al día"
+            lineas.append(f"  - {c.nombre}: {estado}")
+        if len(self.clientes) > 10:
+            lineas.append(f"  ... y {len(self.clientes) - 10} más")
+        return lineas
+
+    def _seccion_stock(self):
+        bajo_stock = sorted((p for p in self.productos if p.stock < 10), key=lambda p: p.stock)
+        if not bajo_stock:
+            return [f"🏪 {self.nombre}: Todo el stock está bien."]
+        lineas = [f"🏪 {self.nombre} - Bajo Stock (<10 unidades):"]
+        lineas += [f"  - {p.nombre}: {p.stock} unidades (${p.precio:.2f})" for p in bajo_stock]
+        return lineas
+
+
+class ContextoIA:
+    def __init__(self, view_model, presupuesto_tokens=1200, ttl=300):
+        self.view_model = view_model
+        self.db = view_model.db
+        self.presupuesto_tokens = presupuesto_tokens
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._propietarios = {}  # tendero_id -> (version_locales, leido, [local_id])
+        self._tiendas = {}       # local_id -> _Tienda
+
+    def consulta(self, tendero_id, tipo):
+        """Datos de las tiendas del tendero para un tipo de consulta (ver `TIPOS`)."""
+        return self.consultas(tendero_id, (tipo,))
+
+    def consultas(self, tendero_id, tipos):
+        """Datos para varios tipos de consulta a la vez.
+
+        Cada tienda se obtiene una sola vez (del caché o de una lectura) y de
+        ella salen todas las secciones pedidas. Con más de un tipo, cada
+        bloque lleva un título.
+        """
+        try:
+            local_ids = self._locales(tendero_id)
+            if not local_ids:
+                return "No tienes locales registrados."
+            tiendas = [self._tienda(local_id) for local_id in local_ids]
+            secciones = []
+            for tipo in tipos:
+                bloque = [texto for texto in (t.seccion(tipo) for t in tiendas) if texto]
+                if bloque and len(tipos) > 1:
+                    bloque[0] = f"== {TITULOS[tipo]} ==\n" + bloque[0]
+                secciones += bloque
+            texto = self._recortar(secciones)
+            return texto or "No hay datos disponibles para esa consulta."
+        except Exception as e:
+            print(f"[AI CONTEXT] error: {e}")
+            return f"Error al consultar Firebase: {str(e)}"
+
+    def resumen(self, tendero_id):
+        """Resumen general del negocio (productos destacados y deudas por tienda)."""
+        texto = self.consulta(tendero_id, "resumen")
+        return "📊 CONTEXTO DE TU NEGOCIO:\n" + texto
+
+    def versiones(self, tendero_id):
+        """Versión de los datos del tendero: cambia si cambia cualquiera de sus tiendas."""
+        version = self.db.version_locales()
+        return version, tuple((local_id, self.db.version_local(local_id)) for local_id in self._locales(tendero_id))
+
+    def invalidar(self, tendero_id=None):
+        with self._lock:
+            if tendero_id is None:
+                self._propietarios.clear()
+                self._tiendas.clear()
+            else:
+                self._propietarios.pop(tendero_id, None)
+
+    # --- Cache ---
+    def _vigente(self, leido):
+        return time.monotonic() - leido < self.ttl
+
+    def _locales(self, tendero_id):
+        version = self.db.version_locales()
+        with self._lock:
+            entrada = self._propietarios.get(tendero_id)
+        if entrada and entrada[0] == version and self._vigente(entrada[1]):
+            return entrada[2]
+
+        # La versión se toma antes de leer: si algo cambia mientras tanto, la
+        # próxima consulta verá una versión distinta y volverá a leer
+        versiones = {}
+        locales = self.view_model.listar_locales_por_propietario(tendero_id) or {}
+        with self._lock:
+            for local_id, data in locales.items():
+                actual = self._tiendas.get(local_id)
+                versiones[local_id] = self.db.version_local(local_id)
+                if actual is None or actual.version != versiones[local_id] or not self._vigente(actual.leida):
+                    self._tiendas[local_id] = _Tienda(versiones[local_id], local_id, data)
+            self._propietarios[tendero_id] = (version, time.monotonic(), list(locales))
+        return list(locales)
+
+    def _tienda(self, local_id):
+        version = self.db.version_local(local_id)
+        with self._lock:
+            tienda = self._tiendas.get(local_id)
+        if tienda and tienda.version == version and self._vigente(tienda.leida):
+            return tienda
+        tienda = _Tienda(version, local_id, self.db.get_local(local_id))
+        with self._lock:
+            self._tiendas[local_id] = tienda
+        return tienda
+
+    def _recortar(self, secciones):
+        """Une las secciones sin pasar de `presupuesto_tokens` (corta por líneas)."""
+        lineas = []
+        usados = 0
+        for i, seccion in enumerate(secciones):
+            for linea in seccion.split("\n"):
+                costo = estimar_tokens(linea)
+                if usados + costo > self.presupuesto_tokens:
+                    restantes = len(secciones) - i - 1
+                    extra = f", {restantes} tiendas más sin incluir" if restantes else ""
+                    lineas.append(f"... (datos recortados{extra})")
+                    return "\n".join(lineas)
+                lineas.append(linea)
+                usados += costo
+        return "\n".join(lineas)
@@ -0,0 +1,89 @@
+"""Detección de intenciones del chat y plan de consulta para la IA.
+
+Un mensaje puede pedir varias cosas a la vez ("¿qué me falta en stock y
+quién me debe más?"). `detectar_intenciones` recorre el mensaje una sola vez:
+normaliza el texto (minúsculas, sin tildes), lo parte en palabras y busca cada
+palabra (y su singular) en un índice palabra → intención armado al importar
+el módulo. Retorna todas las intenciones encontradas, en el orden de `TIPOS`.
+
+`planificar` junta los datos de todas las intenciones con una sola lectura
+por tienda (ver `ContextoIA.consultas`).
+"""
+import re
+import unicodedata
+
+from ViewModel.ai_context import TIPOS
+
+PALABRAS_CLAVE = {
+    "deudas": ("deuda", "deudor", "debo", "debe", "deben", "debia", "pago", "pagar", "pagan",
+               "abono", "abonar", "acreedor", "fiado", "fiar", "saldo"),
+    "productos": ("producto", "precio", "caro", "barato", "inventario", "mercancia", "articulo"),
+    "clientes": ("cliente", "comprador", "usuario"),
+    "stock": ("stock", "cantidad", "falta", "faltan", "poco", "poca", "agotado", "agotada",
+              "existencia", "reabastecer", "surtir"),
+    "resumen": ("resumen", "panorama", "general"),
+}
+
+_PALABRA = re.compile(r"[a-z0-9ñ]+")
+_ESPACIOS = re.compile(r"\s+")
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes ("Mercancías" → "mercancias"); conserva la ñ."""
+    texto = (texto or "").lower().replace("ñ", "\0")
+    texto = unicodedata.normalize("NFD", texto)
+    texto = "".join(c for c in texto if unicodedata.category(c) != "Mn")
+    return texto.replace("\0", "ñ")
+
+
+def normalizar_mensaje(mensaje):
+    """Mensaje normalizado sin espacios ni signos sobrantes ("¿Quién me  DEBE?" → "quien me debe").
+
+    Conserva números y operadores: "12+5" y "12-5" siguen siendo distintos.
+    """
+    return _ESPACIOS.sub(" ", normalizar(mensaje)).strip(" ¿?¡!.,;")
+
+
+class DetectorIntenciones:
+    def __init__(self, palabras_clave):
+        self._indice = {}
+        for tipo, palabras in palabras_clave.items():
+            for palabra in palabras:
+                self._indice.setdefault(normalizar(palabra), set()).add(tipo)
+        self._orden = {tipo: i for i, tipo in enumerate(TIPOS)}
+
+    def _buscar(self, palabra):
+        # Forma tal cual, luego singular: "precios" → "precio", "deudores" → "deudor"
+        encontrados = self._indice.get(palabra)
+        if encontrados is None and palabra.endswith("s"):
+            encontrados = self._indice.get(palabra[:-1])
+            if encontrados is None and palabra.endswith("es"):
+                encontrados = self._indice.get(palabra[:-2])
+        return encontrados
+
+    def detectar(self, mensaje):
+        """Todas las intenciones del mensaje, sin repetir, en el orden de `TIPOS`."""
+        tipos = set()
+        for palabra in _PALABRA.findall(normalizar(mensaje)):
+            encontrados = self._buscar(palabra)
+            if encontrados:
+                tipos |= encontrados
+        return sorted(tipos, key=self._orden.__getitem__)
+
+
+_detector = DetectorIntenciones(PALABRAS_CLAVE)
+
+
+def detectar_intenciones(mensaje):
+    return _detector.detectar(mensaje)
+
+
+def planificar(contexto, tendero_id, mensaje):
+    """Retorna `(intenciones, datos)` para armar el prompt de la IA.
+
+    `datos` es "" si el mensaje no pide datos del negocio.
+    """
+    tipos = detectar_intenciones(mensaje)
+    if not tipos:
+        return tipos, ""
+    return tipos, contexto.consultas(tendero_id, tipos)
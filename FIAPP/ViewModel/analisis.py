@@ -0,0 +1,228 @@
+"""Análisis de inventario de todas las tiendas de un tendero (columnar, NumPy).
+
+Los productos de todos sus locales se cargan una vez en columnas (arrays):
+
+    local      índice en `TablaInventario.locales`
+    proveedor  índice en `TablaInventario.proveedores` (0 = sin proveedor)
+    precio     float64
+    costo      float64 (NaN si el producto no tiene costo cargado)
+    stock      int64
+
+y cada análisis es una agregación vectorizada (`np.bincount` por grupo,
+`np.histogram`, percentiles), sin recorrer productos en Python. Con cientos
+de miles de SKUs la carga es lo que más cuesta; la tabla se guarda por
+tendero y se reconstruye sólo cuando cambia la versión de alguna de sus
+tiendas (o después de `ttl` segundos, por escrituras de otros procesos).
+
+- valoración por tienda: SKUs, unidades, valor a precio de venta y a costo;
+- margen por proveedor: margen ponderado por unidades en stock, sólo con
+  los productos que tienen costo;
+- distribución de precios: histograma y percentiles;
+- cobertura de stock: SKUs sin stock, bajo el umbral y con stock suficiente
+  por tienda (no hay ventas registradas, así que no se estiman días).
+"""
+import threading
+import time
+
+import numpy as np
+
+from domain.coleccion import a_numero
+
+SIN_PROVEEDOR = "Sin proveedor"
+
+
+class TablaInventario:
+    """Productos de varias tiendas en columnas."""
+
+    def __init__(self, locales, proveedores, local, proveedor, precio, costo, stock):
+        self.locales = locales          # [(local_id, nombre)]
+        self.proveedores = proveedores  # [nombre]; el 0 es SIN_PROVEEDOR
+        self.local = local
+        self.proveedor = proveedor
+        self.precio = precio
+        self.costo = costo
+        self.stock = stock
+
+    def __len__(self):
+        return len(self.precio)
+
+    @classmethod
+    def desde_locales(cls, locales, nombres_proveedor=None):
+        """Arma la tabla desde `{local_id: datos del local}` tal como se leen de la base.
+
+        `nombres_proveedor` traduce el id guardado en el producto a un nombre.
+        """
+        nombres_proveedor = nombres_proveedor or {}
+        lista_locales = []
+        proveedores = [SIN_PROVEEDOR]
+        indice_proveedor = {}
+        col_local, col_proveedor, col_precio, col_costo, col_stock = [], [], [], [], []
+        nan = float("nan")
+        for local_id, datos in locales.items():
+            if not isinstance(datos, dict):
+                continue
+            i_local = len(lista_locales)
+            lista_locales.append((local_id, datos.get("nombre") or local_id))
+            productos = [p for p in (datos.get("productos") or {}).values() if isinstance(p, dict)]
+            for p in productos:
+                clave = p.get("proveedor") or None
+                i_proveedor = indice_proveedor.get(clave)
+                if i_proveedor is None:
+                    i_proveedor = 0 if clave is None else len(proveedores)
+                    if clave is not None:
+                        proveedores.append(nombres_proveedor.get(clave, clave))
+                    indice_proveedor[clave] = i_proveedor
+                col_proveedor.append(i_proveedor)
+                col_precio.append(a_numero(p.get("precio")))
+                costo = p.get("costo")
+                col_costo.append(nan if costo in (None, "") else a_numero(costo))
+                col_stock.append(a_numero(p.get("stock"), int))
+            col_local.extend([i_local] * len(productos))
+        return cls(
+            lista_locales,
+            proveedores,
+            np.array(col_local, dtype=np.int32),
+            np.array(col_proveedor, dtype=np.int32),
+            np.array(col_precio, dtype=np.float64),
+            np.array(col_costo, dtype=np.float64),
+            np.array(col_stock, dtype=np.int64),
+        )
+
+    # --- Agregados ---
+    def _suma(self, grupos, n, pesos=None):
+        return np.bincount(grupos, weights=pesos, minlength=n)
+
+    def valoracion(self):
+        """Por tienda y en total: SKUs, unidades, valor a precio de venta y a costo."""
+        n = len(self.locales)
+        stock = np.clip(self.stock, 0, None)
+        valor = self.precio * stock
+        con_costo = ~np.isnan(self.costo)
+        valor_costo = np.where(con_costo, self.costo, 0.0) * stock
+        skus = self._suma(self.local, n)
+        unidades = self._suma(self.local, n, stock)
+        valores = self._suma(self.local, n, valor)
+        costos = self._suma(self.local, n, valor_costo)
+        filas = [{
+            "local_id": local_id,
+            "nombre": nombre,
+            "skus": int(skus[i]),
+            "unidades": int(unidades[i]),
+            "valor_venta": round(float(valores[i]), 2),
+            "valor_costo": round(float(costos[i]), 2),
+        } for i, (local_id, nombre) in enumerate(self.locales)]
+        return {
+            "tiendas": filas,
+            "total": {
+                "skus": len(self),
+                "unidades": int(stock.sum()),
+                "valor_venta": round(float(valor.sum()), 2),
+                "valor_costo": round(float(valor_costo.sum()), 2),
+                "skus_sin_costo": int((~con_costo).sum()),
+            },
+        }
+
+    def margen_por_proveedor(self):
+        """Margen por proveedor (ponderado por unidades en stock), ordenado por valor."""
+        n = len(self.proveedores)
+        stock = np.clip(self.stock, 0, None).astype(np.float64)
+        con_costo = ~np.isnan(self.costo)
+        skus = self._suma(self.proveedor, n)
+        valor = self._suma(self.proveedor, n, self.precio * stock)
+        skus_costo = self._suma(self.proveedor[con_costo], n)
+        venta_costeada = self._suma(self.proveedor[con_costo], n, (self.precio * stock)[con_costo])
+        costo = self._suma(self.proveedor[con_costo], n, (self.costo * stock)[con_costo])
+        filas = []
+        for i, nombre in enumerate(self.proveedores):
+            if not skus[i]:
+                continue
+            margen = (venta_costeada[i] - costo[i]) / venta_costeada[i] if venta_costeada[i] > 0 else None
+            filas.append({
+                "proveedor": nombre,
+                "skus": int(skus[i]),
+                "skus_con_costo": int(skus_costo[i]),
+                "valor_venta": round(float(valor[i]), 2),
+                "margen_pct": round(float(margen) * 100, 1) if margen is not None else None,
+            })
+        filas.sort(key=lambda f: f["valor_venta"], reverse=True)
+        return filas
+
+    def distribucion_precios(self, intervalos=10):
+        """Histograma de precios y percentiles (p10, p25, p50, p75, p90)."""
+        if not len(self):
+            return {"intervalos": [], "percentiles": {}}
+        conteos, bordes = np.histogram(self.precio, bins=intervalos)
+        percentiles = np.percentile(self.precio, [10, 25, 50, 75, 90])
+        return {
+            "intervalos": [{"desde": round(float(bordes[i]), 2), "hasta": round(float(bordes[i + 1]), 2),
+                            "skus": int(conteos[i])} for i in range(len(conteos))],
+            "percentiles": {f"p{p}": round(float(v), 2) for p, v in zip((10, 25, 50, 75, 90), percentiles)},
+            "promedio": round(float(self.precio.mean()), 2),
+        }
+
+    def cobertura_stock(self, umbral=10):
+        """Por tienda: SKUs sin stock, con menos de `umbral` unidades y con stock suficiente."""
+        n = len(self.locales)
+        sin_stock = self._suma(self.local, n, (self.stock <= 0).astype(np.float64))
+        bajo = self._suma(self.local, n, ((self.stock > 0) & (self.stock < umbral)).astype(np.float64))
+        skus = self._suma(self.local, n)
+        filas = []
+        for i, (local_id, nombre) in enumerate(self.locales):
+            total = int(skus[i])
+            ok = total - int(sin_stock[i]) - int(bajo[i])
+            filas.append({
+                "local_id": local_id,
+                "nombre": nombre,
+                "sin_stock": int(sin_stock[i]),
+                "bajo_stock": int(bajo[i]),
+                "suficiente": ok,
+                "cobertura_pct": round(ok / total * 100, 1) if total else None,
+            })
+        return {"umbral": umbral, "tiendas": filas}
+
+    def resumen(self, umbral=10, intervalos=10):
+        return {
+            "valoracion": self.valoracion(),
+            "proveedores": self.margen_por_proveedor(),
+            "precios": self.distribucion_precios(intervalos),
+            "stock": self.cobertura_stock(umbral),
+        }
+
+
+class AnalisisInventario:
+    """Tabla por tendero, reconstruida cuando cambia alguna de sus tiendas."""
+
+    def __init__(self, view_model, ttl=120):
+        self.view_model = view_model
+        self.db = view_model.db
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tablas = {}  # tendero_id -> (versiones, creada, tabla)
+
+    def tabla(self, tendero_id):
+        entrada = self._tablas.get(tendero_id)
+        if entrada and time.monotonic() - entrada[1] < self.ttl and entrada[0] == self._versiones(entrada[2]):
+            return entrada[2]
+        # Qué tiendas son del tendero se sabe recién al leer: se marca el último
+        # evento antes de la lectura y, si alguna versión quedó después de la
+        # marca (una escritura durante la lectura), la tabla no se guarda
+        marca = self.db.ultima_version()
+        locales = self.view_model.listar_locales_por_propietario(tendero_id) or {}
+        proveedores = self.view_model.listar_proveedores(tendero_id) or {}
+        nombres = {pid: p.get("nombre", pid) for pid, p in proveedores.items() if isinstance(p, dict)}
+        versiones = (self.db.version_locales(), tuple(self.db.version_local(l) for l in locales))
+        tabla = TablaInventario.desde_locales(locales, nombres)
+        if max(versiones[0], *versiones[1]) <= marca:
+            with self._lock:
+                self._tablas[tendero_id] = (versiones, time.monotonic(), tabla)
+        return tabla
+
+    def resumen(self, tendero_id, umbral=10, intervalos=10):
+        inicio = time.perf_counter()
+        tabla = self.tabla(tendero_id)
+        resultado = tabla.resumen(umbral, intervalos)
+        resultado["ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+        return resultado
+
+    def _versiones(self, tabla):
+        return (self.db.version_locales(), tuple(self.db.version_local(l) for l, _ in tabla.locales))
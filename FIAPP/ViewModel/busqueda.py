@@ -0,0 +1,202 @@
+"""Búsqueda difusa de productos en todas las tiendas de un tendero.
+
+Índice en memoria por tienda, armado con `UseCases.listar_productos`:
+
+- los nombres se normalizan (minúsculas, sin acentos ni signos) y cada
+  palabra se parte en trigramas con relleno: "arroz" -> "  a", " ar", "arr",
+  "rro", "roz", "oz ". La última palabra de la consulta no lleva el relleno
+  final, así "arr" encuentra "Arroz" por prefijo; un error de tipeo ("aroz",
+  "arros") comparte casi todos los trigramas y también lo encuentra;
+- listas invertidas trigrama -> productos: cada consulta cuenta, por
+  producto, cuántos trigramas de la consulta tiene y ordena por esa
+  proporción, con bonificación si el nombre empieza con la consulta o la
+  contiene;
+- las escrituras de productos de este proceso se aplican al índice desde el
+  bus de eventos (`DBService.cambios_local`) sin releer la tienda; si se
+  perdieron eventos o pasaron `ttl` segundos (escrituras de otros
+  procesos), esa tienda se vuelve a leer.
+
+Los locales del tendero se recuerdan mientras no cambie
+`db.version_locales()`, como en el contexto del asistente IA.
+"""
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+from domain.producto import Producto
+
+_NO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos y con un solo espacio entre palabras: "Café  Molido!" -> "cafe molido"."""
+    texto = unicodedata.normalize("NFKD", str(texto or "").lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(" ", texto).strip()
+
+
+def trigramas(normalizado, prefijo=False):
+    """Trigramas de las palabras de un texto ya normalizado.
+
+    Con `prefijo`, la última palabra no se cierra (se está escribiendo).
+    """
+    palabras = normalizado.split()
+    resultado = set()
+    for i, palabra in enumerate(palabras):
+        relleno = f"  {palabra}" if prefijo and i == len(palabras) - 1 else f"  {palabra} "
+        resultado.update(relleno[j:j + 3] for j in range(len(relleno) - 2))
+    return resultado
+
+
+class IndiceTienda:
+    """Productos de una tienda con su índice de trigramas."""
+
+    def __init__(self, local_id, nombre, productos, version):
+        self.local_id = local_id
+        self.nombre = nombre
+        self.version = version
+        self.leido = time.monotonic()
+        self.productos = {}      # producto_id -> Producto
+        self.normalizados = {}   # producto_id -> nombre normalizado
+        self.listas = {}         # trigrama -> {producto_id}
+        for producto_id, producto in productos:
+            self.agregar(producto_id, producto)
+
+    def __len__(self):
+        return len(self.productos)
+
+    def agregar(self, producto_id, producto):
+        self.quitar(producto_id)
+        normalizado = normalizar(producto.nombre)
+        self.productos[producto_id] = producto
+        self.normalizados[producto_id] = normalizado
+        for trigrama in trigramas(normalizado):
+            self.listas.setdefault(trigrama, set()).add(producto_id)
+
+    def quitar(self, producto_id):
+        normalizado = self.normalizados.pop(producto_id, None)
+        self.productos.pop(producto_id, None)
+        if normalizado is None:
+            return
+        for trigrama in trigramas(normalizado):
+            lista = self.listas.get(trigrama)
+            if lista:
+                lista.discard(producto_id)
+                if not lista:
+                    del self.listas[trigrama]
+
+    def aplicar(self, eventos):
+        """Aplica los eventos `producto`/`producto_eliminado`; False si alguno no alcanza (hay que releer)."""
+        for evento in eventos:
+            producto_id = evento.data.get("producto_id")
+            if not producto_id:
+                continue
+            if evento.tipo == "producto_eliminado":
+                self.quitar(producto_id)
+            elif evento.tipo == "producto":
+                campos = {k: v for k, v in evento.data.items() if k not in ("local_id", "producto_id")}
+                actual = self.productos.get(producto_id)
+                if actual is not None:
+                    campos = {**actual.to_dict(), **campos}
+                elif not campos.get("nombre"):
+                    return False  # cambio parcial de un producto que no está en el índice
+                self.agregar(producto_id, Producto.from_dict(campos, producto_id))
+        return True
+
+    def buscar(self, consulta, grupos, umbral):
+        """[(puntaje, producto_id)] de los productos que pasan el `umbral`."""
+        conteo = Counter()
+        for trigrama in grupos:
+            conteo.update(self.listas.get(trigrama, ()))
+        resultado = []
+        total = len(grupos)
+        for producto_id, coincidencias in conteo.items():
+            puntaje = coincidencias / total
+            nombre = self.normalizados[producto_id]
+            if nombre.startswith(consulta):
+                puntaje += 0.5
+            elif consulta in nombre:
+                puntaje += 0.25
+            if puntaje >= umbral:
+                resultado.append((puntaje, producto_id))
+        return resultado
+
+
+class BuscadorProductos:
+    """Índices por tienda y la lista de tiendas de cada tendero."""
+
+    def __init__(self, view_model, ttl=300, umbral=0.45):
+        self.view_model = view_model
+        self.db = view_model.db
+        self.ttl = ttl
+        self.umbral = umbral
+        self._lock = threading.Lock()
+        self._tiendas = {}        # local_id -> IndiceTienda
+        self._propietarios = {}   # tendero_id -> (version_locales, leido, {local_id: nombre})
+
+    def _vigente(self, leido):
+        return time.monotonic() - leido < self.ttl
+
+    def _locales(self, tendero_id):
+        version = self.db.version_locales()
+        entrada = self._propietarios.get(tendero_id)
+        if entrada and entrada[0] == version and self._vigente(entrada[1]):
+            return entrada[2]
+        locales = self.view_model.listar_locales_por_propietario(tendero_id) or {}
+        nombres = {local_id: (data or {}).get("nombre", local_id) for local_id, data in locales.items()}
+        with self._lock:
+            self._propietarios[tendero_id] = (version, time.monotonic(), nombres)
+        return nombres
+
+    def tienda(self, local_id, nombre=None):
+        """Índice de una tienda al día con las escrituras de este proceso."""
+        version = self.db.version_local(local_id)
+        with self._lock:
+            indice = self._tiendas.get(local_id)
+            if indice is not None and self._vigente(indice.leido):
+                if indice.version == version:
+                    return indice
+                eventos = self.db.cambios_local(local_id, indice.version)
+                if eventos is not None and indice.aplicar(eventos):
+                    indice.version = version
+                    return indice
+        # La versión se toma antes de leer: un cambio durante la lectura se aplica en la próxima búsqueda
+        productos = self.view_model.listar_productos(local_id)
+        indice = IndiceTienda(local_id, nombre or local_id, productos.items(), version)
+        with self._lock:
+            self._tiendas[local_id] = indice
+        return indice
+
+    def buscar(self, tendero_id, texto, limite=20, local_id=None):
+        """Productos del tendero cuyo nombre se parece a `texto`, del más parecido al menos.
+
+        Retorna {"consulta", "resultados": [{"local_id", "local", "producto_id",
+        "nombre", "precio", "stock", "imagen_url", "puntaje"}], "ms"}.
+        """
+        inicio = time.perf_counter()
+        consulta = normalizar(texto)
+        resultados = []
+        if consulta:
+            grupos = trigramas(consulta, prefijo=True)
+            locales = self._locales(tendero_id)
+            if local_id is not None:
+                locales = {local_id: locales[local_id]} if local_id in locales else {}
+            indices = [self.tienda(lid, nombre) for lid, nombre in locales.items()]
+            encontrados = []
+            # Con el lock: otro hilo puede estar aplicando eventos a estos índices
+            with self._lock:
+                for indice in indices:
+                    encontrados.extend((puntaje, indice, pid) for puntaje, pid in
+                                       indice.buscar(consulta, grupos, self.umbral))
+                encontrados.sort(key=lambda r: (-r[0], len(r[1].normalizados[r[2]]), r[1].normalizados[r[2]]))
+                for puntaje, indice, producto_id in encontrados[:limite]:
+                    p = indice.productos[producto_id]
+                    resultados.append({
+                        "local_id": indice.local_id, "local": indice.nombre, "producto_id": producto_id,
+                        "nombre": p.nombre, "precio": p.precio, "stock": p.stock, "imagen_url": p.imagen_url,
+                        "puntaje": round(puntaje, 3),
+                    })
+        return {"consulta": texto, "resultados": resultados,
+                "ms": round((time.perf_counter() - inicio) * 1000, 2)}
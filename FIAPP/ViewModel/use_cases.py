@@ -1,22 +1,26 @@
+import time
+
 from domain.producto import Producto
 from database.db_service import DBService
+from domain.cliente import Cliente
+from domain.coleccion import Coleccion, a_monto
 from domain.local import Local
 from domain.proveedor import Proveedor
 
 
 class UseCases:
-    def __init__(self):
-        self.db = DBService()
+    def __init__(self, db=None):
+        self.db = db or DBService()
 
     # --- CRUD de Productos ---
-    def crear_producto(self, local_id, nombre, precio, stock, producto_id, imagen_url=None, proveedor=None):
-        producto = Producto(nombre, precio, stock, imagen_url, proveedor)
+    def crear_producto(self, local_id, nombre, precio, stock, producto_id, imagen_url=None, proveedor=None, costo=None):
+        producto = Producto(nombre, precio, stock, imagen_url, proveedor, costo=costo)
         key = self.db.add_producto(local_id, producto.to_dict(), producto_id)
         return {"success": True, "producto_id": key}
 
     def listar_productos(self, local_id):
-        productos = self.db.get_productos(local_id)
-        return productos or {}
+        """Productos de la tienda como `Coleccion` de `Producto` (precio y stock ya numéricos)."""
+        return Coleccion.desde_dict(Producto, self.db.get_productos(local_id))
 
     def actualizar_producto(self, local_id, producto_id, nombre=None, precio=None, stock=None):
         data = {}
@@ -33,26 +37,123 @@ class UseCases:
         self.db.delete_producto(local_id, producto_id)
         return {"success": True}
 
+    def obtener_producto(self, local_id, producto_id):
+        return self.db.get_producto(local_id, producto_id)
+
+    def listar_productos_pagina(self, local_id, limite=50, cursor=None):
+        """Retorna (productos, siguiente_cursor) leyendo sólo una página."""
+        return self.db.get_productos_pagina(local_id, limite, cursor)
+
+    def actualizar_productos_lote(self, local_id, cambios):
+        """Actualiza varios productos en una sola escritura.
+
+        `cambios` = {producto_id: {"nombre"?, "precio"?, "stock"?, "proveedor"?}}.
+        Valida todos los cambios antes de escribir: si alguno es inválido no se
+        escribe ninguno.
+        """
+        if not isinstance(cambios, dict) or not cambios:
+            return {"error": "No hay cambios"}
+        existentes = self.db.get_producto_ids(local_id)
+        limpios = {}
+        for producto_id, campos in cambios.items():
+            if producto_id not in existentes:
+                return {"error": f"Producto '{producto_id}' no encontrado"}
+            datos, error = self.validar_producto(campos, parcial=True)
+            if error:
+                return {"error": f"{producto_id}: {error}"}
+            if datos:
+                limpios[producto_id] = datos
+        self.db.update_productos_lote(local_id, limpios)
+        return {"success": True, "actualizados": len(limpios)}
+
+    @staticmethod
+    def validar_producto(campos, parcial=False):
+        """Normaliza los campos editables de un producto. Retorna (datos, error)."""
+        if not isinstance(campos, dict):
+            return None, "Formato inválido"
+        datos = {}
+        for campo in campos:
+            if campo not in ("nombre", "precio", "stock", "proveedor", "costo"):
+                return None, f"Campo no editable: {campo}"
+        if "nombre" in campos or not parcial:
+            nombre = str(campos.get("nombre") or "").strip()
+            if not nombre:
+                return None, "Nombre requerido"
+            datos["nombre"] = nombre
+        try:
+            if "precio" in campos or not parcial:
+                datos["precio"] = a_monto(campos.get("precio"))
+                if datos["precio"] < 0:
+                    return None, "El precio no puede ser negativo"
+            if "stock" in campos or not parcial:
+                datos["stock"] = int(campos.get("stock"))
+                if datos["stock"] < 0:
+                    return None, "El stock no puede ser negativo"
+        except (TypeError, ValueError):
+            return None, "Precio y stock deben ser números"
+        if "costo" in campos:
+            # Opcional: vacío borra el costo
+            costo = campos.get("costo")
+            try:
+                datos["costo"] = None if costo in (None, "") else a_monto(costo)
+            except (TypeError, ValueError):
+                return None, "El costo debe ser un número"
+            if datos["costo"] is not None and datos["costo"] < 0:
+                return None, "El costo no puede ser negativo"
+        if "proveedor" in campos:
+            datos["proveedor"] = campos.get("proveedor") or None
+        return datos, None
+
     # --- Clientes / Deudas ---
     def registrar_cliente(self, local_id, cliente_id, cliente_data):
         self.db.add_cliente_a_local(local_id, cliente_id, cliente_data)
         return {"success": True}
 
     def listar_clientes(self, local_id):
-        clientes = self.db.get_clientes(local_id)
-        return clientes or {}
+        """Clientes de la tienda como `Coleccion` de `Cliente` (con su historial)."""
+        return Coleccion.desde_dict(Cliente, self.db.get_clientes(local_id))
 
-    def registrar_deuda(self, local_id, cliente_id, monto, plazo_dias=None):
-        self.db.registrar_deuda(local_id, cliente_id, monto, plazo_dias)
+    def listar_clientes_pagina(self, local_id, limite=50, cursor=None):
+        """Retorna (clientes, siguiente_cursor) leyendo sólo una página."""
+        return self.db.get_clientes_pagina(local_id, limite, cursor)
+
+    def obtener_cliente(self, local_id, cliente_id):
+        return self.db.get_cliente(local_id, cliente_id)
+
+    def eliminar_cliente(self, local_id, cliente_id):
+        self.db.delete_cliente(local_id, cliente_id)
         return {"success": True}
 
+    def registrar_deuda(self, local_id, cliente_id, monto, plazo_dias=None):
+        """Suma `monto` a la deuda; retorna la nueva deuda y el movimiento registrado."""
+        nueva, movimiento = self.db.registrar_deuda(local_id, cliente_id, monto, plazo_dias)
+        return {"success": True, "deuda": nueva, "movimiento": self._movimiento(movimiento)}
+
+    def registrar_abono(self, local_id, cliente_id, monto):
+        """Resta un abono de la deuda del cliente (mínimo 0) y retorna la nueva deuda."""
+        try:
+            monto = a_monto(monto)
+            if monto <= 0:
+                return {"error": "El abono debe ser mayor que 0"}
+            resumen = self.db.get_cliente_resumen(local_id, cliente_id)
+            if not resumen:
+                return {"error": "Cliente no encontrado"}
+            # La lectura shallow ya dice si el cliente tiene vencimientos pendientes
+            nueva, movimiento = self.db.abonar_deuda(local_id, cliente_id, monto,
+                                                     con_vencimientos="vencimientos" in resumen)
+            return {"success": True, "deuda": nueva, "movimiento": self._movimiento(movimiento)}
+        except (TypeError, ValueError):
+            return {"error": "El abono debe ser un número"}
+        except Exception as e:
+            return {"error": str(e)}
+
     def actualizar_deuda(self, local_id, cliente_id, nueva_deuda):
         """Actualiza la deuda total de un cliente (ej: después de un abono/pago parcial)."""
         try:
-            nueva_deuda = float(nueva_deuda)
+            nueva_deuda = a_monto(nueva_deuda)
             if nueva_deuda < 0:
                 return {"error": "La deuda no puede ser negativa"}
-            self.db.ref.child(f"locales/{local_id}/clientes/{cliente_id}/deuda").set(nueva_deuda)
+            self.db.set_deuda(local_id, cliente_id, nueva_deuda)
             return {"success": True}
         except ValueError:
             return {"error": "La deuda debe ser un número"}
@@ -62,20 +163,121 @@ class UseCases:
     def cancelar_deuda(self, local_id, cliente_id):
         """Cancela completamente la deuda de un cliente (la pone en 0)."""
         try:
-            self.db.ref.child(f"locales/{local_id}/clientes/{cliente_id}/deuda").set(0)
-            return {"success": True}
+            nueva, movimiento = self.db.cancelar_deuda(local_id, cliente_id)
+            return {"success": True, "deuda": nueva, "movimiento": self._movimiento(movimiento)}
         except Exception as e:
             return {"error": str(e)}
 
+    @staticmethod
+    def _movimiento(movimiento):
+        """(clave, detalle) del historial -> {"id": clave, ...detalle}, o None."""
+        if not movimiento:
+            return None
+        clave, detalle = movimiento
+        return {"id": clave, **detalle}
+
     def obtener_historial_deudas(self, local_id, cliente_id):
         """Devuelve un diccionario con los registros de deudas de un cliente en un local.
 
-        Estructura retornada: { timestamp: {"monto": float, "timestamp": int, "plazo_dias": int?}, ... }
+        Estructura retornada: { clave: {"monto": float, "timestamp": int, "tipo": str?, "plazo_dias": int?}, ... }
+        (`monto` negativo para abonos y cancelaciones; ver `DBService`).
         """
         # Intentar obtener el nodo de deudas directamente
         detalles = self.db.ref.child(f"locales/{local_id}/clientes/{cliente_id}/deudas").get() or {}
         return detalles
   
+    # --- Vencimientos ---
+    TRAMOS_VENCIDAS = ((0, 30), (31, 60), (61, 90), (91, None))
+
+    def reporte_vencimientos(self, local_id, ahora=None, dias_por_vencer=30):
+        """Antigüedad de las deudas vencidas de un local y lo que vence pronto.
+
+        Usa dos consultas por rango sobre `vencimientos/{local_id}` (lo vencido
+        hasta `ahora` y lo que vence en los próximos `dias_por_vencer` días),
+        sin leer las cuentas de los clientes: el nombre viene en cada entrada
+        (las entradas anteriores a ese campo muestran el id hasta reindexar).
+        Retorna:
+            {"tramos": [{"tramo": "0-30", "monto", "cuentas", "clientes"}, ...],
+             "total_vencido", "por_vencer": {"dias", "monto", "cuentas"},
+             "clientes": [{"cliente_id", "nombre", "pendiente", "cuentas",
+                           "vence", "dias_vencida"}, ...]}  (más atrasados primero)
+        """
+        ahora = int(ahora or time.time())
+        vencidas = self.db.get_vencimientos(local_id, hasta=ahora)
+        proximas = self.db.get_vencimientos(local_id, desde=ahora + 1, hasta=ahora + dias_por_vencer * 86400)
+
+        tramos = [{"tramo": f"{a}-{b}" if b else f"{a - 1}+", "monto": 0.0, "cuentas": 0, "clientes": set()}
+                  for a, b in self.TRAMOS_VENCIDAS]
+        por_cliente = {}
+        for entrada in vencidas.values():
+            if not isinstance(entrada, dict):
+                continue
+            pendiente = float(entrada.get("pendiente") or 0)
+            cliente_id = entrada.get("cliente_id")
+            vence = int(entrada.get("vence") or 0)
+            dias = (ahora - vence) // 86400
+            tramo = next(t for t, (_, b) in zip(tramos, self.TRAMOS_VENCIDAS) if b is None or dias <= b)
+            tramo["monto"] += pendiente
+            tramo["cuentas"] += 1
+            tramo["clientes"].add(cliente_id)
+            # Las entradas llegan por vencimiento: la primera de cada cliente es la más antigua
+            cliente = por_cliente.setdefault(cliente_id, {
+                "cliente_id": cliente_id, "nombre": entrada.get("nombre") or cliente_id, "pendiente": 0.0,
+                "cuentas": 0, "vence": vence, "dias_vencida": dias,
+            })
+            cliente["pendiente"] += pendiente
+            cliente["cuentas"] += 1
+
+        for tramo in tramos:
+            tramo["monto"] = round(tramo["monto"], 2)
+            tramo["clientes"] = len(tramo["clientes"])
+        clientes = sorted(por_cliente.values(), key=lambda c: c["vence"])
+        for cliente in clientes:
+            cliente["pendiente"] = round(cliente["pendiente"], 2)
+        proximas = [e for e in proximas.values() if isinstance(e, dict)]
+        return {
+            "tramos": tramos,
+            "total_vencido": round(sum(t["monto"] for t in tramos), 2),
+            "por_vencer": {
+                "dias": dias_por_vencer,
+                "monto": round(sum((float(e.get("pendiente") or 0) for e in proximas), 0.0), 2),
+                "cuentas": len(proximas),
+            },
+            "clientes": clientes,
+        }
+
+    # --- Recorridos por páginas (exportaciones) ---
+    def iterar_productos(self, local_id, tam_pagina=500):
+        """Genera (producto_id, Producto) leyendo de a `tam_pagina` (memoria constante)."""
+        return self._iterar(self.db.get_productos_pagina, (local_id,), tam_pagina, Producto)
+
+    def iterar_clientes(self, local_id, tam_pagina=500):
+        """Genera (cliente_id, Cliente) con su historial, de a `tam_pagina` clientes."""
+        return self._iterar(self.db.get_clientes_pagina, (local_id,), tam_pagina, Cliente)
+
+    def iterar_movimientos(self, local_id, cliente_id, tam_pagina=500, detalle=False):
+        """Genera (clave, movimiento) del historial de un cliente en orden de clave (cronológico).
+
+        Con `detalle`, cada resumen de un mes compactado se reemplaza por los
+        movimientos archivados de ese mes (una lectura por mes).
+        """
+        for clave, movimiento in self._iterar(self.db.get_deudas_pagina, (local_id, cliente_id), tam_pagina):
+            if detalle and movimiento.get("tipo") == "resumen" and movimiento.get("mes"):
+                yield from sorted(self.db.get_archivo_deudas(local_id, cliente_id, movimiento["mes"]).items())
+            else:
+                yield clave, movimiento
+
+    @staticmethod
+    def _iterar(leer, args, tam_pagina, modelo=None):
+        cursor = None
+        while True:
+            datos, cursor = leer(*args, tam_pagina, cursor)
+            for clave, dato in datos.items():
+                if isinstance(dato, dict):
+                    yield clave, (modelo.from_dict(dato, clave) if modelo else dato)
+            if not cursor:
+                return
+
     # --- Locales ---
     def crear_local(self, nombre, propietario_id, local_id):
         local = Local(nombre, propietario_id)
@@ -83,15 +285,18 @@ class UseCases:
         return {"success": True, "local_id": local_id}
     
     def obtener_local(self, local_id):
-        local = self.db.get_local(local_id)
-        return local
+        """`Local` con sus metadatos; productos, clientes y deudas se leen al usarlos (None si no existe)."""
+        datos = self.db.get_local_meta(local_id)
+        if not datos:
+            return None
+        return Local.perezoso(local_id, datos, self)
     
     def actualizar_local(self, local_id, data):
         self.db.update_local(local_id, data)
         return {"success": True}
 
     def eliminar_local(self, local_id):
-        if not self.db.get_local(local_id):
+        if not self.db.get_local_meta(local_id):
             return {"error": "Local no encontrado"}
         self.db.delete_local(local_id)
         return {"success": True}
@@ -100,6 +305,10 @@ class UseCases:
         locales = self.db.ref.child("locales").get() or {}
         return locales
     
+    def es_propietario(self, local_id, propietario_id):
+        """True si el local existe y pertenece a `propietario_id` (lee un solo campo)."""
+        return bool(propietario_id) and self.db.get_propietario_local(local_id) == propietario_id
+
     def listar_locales_por_propietario(self, propietario_id):
         """Lista locales propiedad de un tendero."""
         todos_locales = self.db.ref.child("locales").get() or {}
@@ -114,12 +323,11 @@ class UseCases:
         todos_locales = self.db.ref.child("locales").get() or {}
         deudas = {}
         for local_id, local_data in todos_locales.items():
-            clientes = local_data.get("clientes", {})
-            if cliente_id in clientes:
-                deuda_total = clientes[cliente_id].get("deuda", 0)
+            cuenta = (local_data.get("clientes") or {}).get(cliente_id)
+            if isinstance(cuenta, dict):
                 deudas[local_id] = {
                     "nombre_local": local_data.get("nombre"),
-                    "deuda_total": deuda_total
+                    "deuda_total": Cliente.from_dict(cuenta, cliente_id, historial=False).deuda
                 }
         return deudas
 
@@ -2,8 +2,8 @@ from database.auth_service import AuthService
 
 
 class Administrador:
-    def __init__(self):
-        self.auth = AuthService()
+    def __init__(self, auth=None):
+        self.auth = auth or AuthService()
 
     def crear_usuario(self, email, password, user_id):
         """Crea usuario sin asignar tipo. El tipo se asigna después."""
@@ -0,0 +1,180 @@
+"""Control de admisión para el asistente IA.
+
+Cada llamada al proveedor puede ocupar un worker hasta el plazo de respuesta.
+Para que un tendero que insiste con el botón del chat no deje sin workers a
+las páginas de inventario y deudas del resto:
+
+- Token bucket por usuario: `rafaga` mensajes seguidos y luego `por_minuto`
+  por minuto. Sin fichas → 429 inmediato con `Retry-After`.
+- Máximo de llamadas al proveedor en curso en el proceso (`max_en_curso`) y
+  por usuario (`max_por_usuario`; pasado ese número → 429 inmediato).
+- Cola de espera acotada: si no hay lugar, hasta `max_en_cola` peticiones
+  esperan como mucho `espera_max` segundos; con la cola llena (o si se vence
+  la espera) → 429 inmediato.
+
+Configuración (variables de entorno):
+    FIAPP_AI_RAFAGA          mensajes seguidos por usuario (5)
+    FIAPP_AI_POR_MINUTO      mensajes por minuto por usuario (20)
+    FIAPP_AI_EN_CURSO        llamadas simultáneas al proveedor (4)
+    FIAPP_AI_POR_USUARIO     llamadas simultáneas por usuario (1)
+    FIAPP_AI_COLA            peticiones en espera (8)
+    FIAPP_AI_ESPERA          segundos máximos en la cola (5)
+"""
+import math
+import os
+import threading
+import time
+
+from app.metrics import metricas
+
+
+class Rechazado(Exception):
+    """La petición no se admite; `reintentar_en` son los segundos sugeridos."""
+
+    def __init__(self, mensaje, reintentar_en):
+        super().__init__(mensaje)
+        self.reintentar_en = max(1, math.ceil(reintentar_en))
+
+
+class TokenBucket:
+    """Fichas por clave: `capacidad` como máximo, se recargan `por_segundo`."""
+
+    def __init__(self, capacidad, por_segundo, max_claves=10000):
+        self.capacidad = capacidad
+        self.por_segundo = por_segundo
+        self.max_claves = max_claves
+        self._lock = threading.Lock()
+        self._cubetas = {}  # clave -> [fichas, actualizado]
+
+    def tomar(self, clave):
+        """Toma una ficha. Retorna 0 si se pudo, o los segundos hasta la próxima."""
+        ahora = time.monotonic()
+        with self._lock:
+            cubeta = self._cubetas.get(clave)
+            if cubeta is None:
+                if len(self._cubetas) >= self.max_claves:
+                    self._podar(ahora)
+                cubeta = self._cubetas[clave] = [self.capacidad, ahora]
+            else:
+                cubeta[0] = min(self.capacidad, cubeta[0] + (ahora - cubeta[1]) * self.por_segundo)
+                cubeta[1] = ahora
+            if cubeta[0] >= 1:
+                cubeta[0] -= 1
+                return 0
+            return (1 - cubeta[0]) / self.por_segundo
+
+    def _podar(self, ahora):
+        # Las cubetas que ya se recargaron por completo equivalen a una nueva
+        llenas = self.capacidad / self.por_segundo
+        for clave in [c for c, (_, actualizado) in self._cubetas.items() if ahora - actualizado >= llenas]:
+            del self._cubetas[clave]
+
+
+class Permiso:
+    """Lugar ocupado en el control de admisión; `liberar()` es idempotente."""
+
+    def __init__(self, control, usuario):
+        self._control = control
+        self._usuario = usuario
+        self._liberado = False
+
+    def liberar(self):
+        if not self._liberado:
+            self._liberado = True
+            self._control._liberar(self._usuario)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.liberar()
+
+
+class ControlAdmision:
+    def __init__(self, rafaga=5, por_minuto=20, max_en_curso=4, max_por_usuario=1,
+                 max_en_cola=8, espera_max=5.0):
+        self.bucket = TokenBucket(rafaga, por_minuto / 60.0)
+        self.max_en_curso = max_en_curso
+        self.max_por_usuario = max_por_usuario
+        self.max_en_cola = max_en_cola
+        self.espera_max = espera_max
+        self._cond = threading.Condition()
+        self._en_curso = 0
+        self._en_cola = 0
+        self._por_usuario = {}
+
+    @classmethod
+    def desde_entorno(cls):
+        return cls(
+            rafaga=int(os.getenv("FIAPP_AI_RAFAGA", "5")),
+            por_minuto=float(os.getenv("FIAPP_AI_POR_MINUTO", "20")),
+            max_en_curso=int(os.getenv("FIAPP_AI_EN_CURSO", "4")),
+            max_por_usuario=int(os.getenv("FIAPP_AI_POR_USUARIO", "1")),
+            max_en_cola=int(os.getenv("FIAPP_AI_COLA", "8")),
+            espera_max=float(os.getenv("FIAPP_AI_ESPERA", "5")),
+        )
+
+    def limitar(self, usuario):
+        """Consume una ficha del usuario. Lanza `Rechazado` si no le quedan."""
+        espera = self.bucket.tomar(usuario)
+        if espera:
+            metricas.incrementar("ai_admision_rechazos_frecuencia")
+            raise Rechazado("Demasiados mensajes seguidos, espera un momento", espera)
+
+    def admitir(self, usuario):
+        """Reserva un lugar para llamar al proveedor; retorna un `Permiso`.
+
+        Espera en la cola si está todo ocupado. Lanza `Rechazado` si el
+        usuario ya tiene `max_por_usuario` llamadas en curso, si la cola está
+        llena o si se vence `espera_max`.
+        """
+        with self._cond:
+            if self._hay_lugar(usuario):
+                return self._ocupar(usuario)
+            if self._por_usuario.get(usuario, 0) >= self.max_por_usuario:
+                # Sus respuestas anteriores siguen en curso: no ocupa la cola
+                metricas.incrementar("ai_admision_rechazos_usuario")
+                raise Rechazado("Ya hay una respuesta en curso, espera a que termine", 1)
+            if self._en_cola >= self.max_en_cola:
+                metricas.incrementar("ai_admision_rechazos_cola_llena")
+                raise Rechazado("El asistente está ocupado, intenta de nuevo", self.espera_max)
+            inicio = time.monotonic()
+            self._en_cola += 1
+            metricas.incrementar("ai_admision_encolados")
+            try:
+                admitido = self._cond.wait_for(lambda: self._hay_lugar(usuario), self.espera_max)
+            finally:
+                self._en_cola -= 1
+            metricas.observar("ai_admision_espera_ms", (time.monotonic() - inicio) * 1000)
+            if not admitido:
+                metricas.incrementar("ai_admision_rechazos_espera")
+                raise Rechazado("El asistente está ocupado, intenta de nuevo", self.espera_max)
+            return self._ocupar(usuario)
+
+    @property
+    def en_curso(self):
+        return self._en_curso
+
+    @property
+    def en_cola(self):
+        return self._en_cola
+
+    def _hay_lugar(self, usuario):
+        return (self._en_curso < self.max_en_curso
+                and self._por_usuario.get(usuario, 0) < self.max_por_usuario)
+
+    def _ocupar(self, usuario):
+        self._en_curso += 1
+        self._por_usuario[usuario] = self._por_usuario.get(usuario, 0) + 1
+        return Permiso(self, usuario)
+
+    def _liberar(self, usuario):
+        with self._cond:
+            self._en_curso -= 1
+            restantes = self._por_usuario.get(usuario, 1) - 1
+            if restantes:
+                self._por_usuario[usuario] = restantes
+            else:
+                self._por_usuario.pop(usuario, None)
+            # notify_all: el próximo con lugar puede ser de otro usuario
+            self._cond.notify_all()
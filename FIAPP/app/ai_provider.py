@@ -0,0 +1,240 @@
+"""Cliente del proveedor de IA (Groq) compartido por todo el proceso.
+
+- Un solo cliente `Groq` (pool httpx con keep-alive) creado la primera vez
+  que se usa; no se crea uno por mensaje ni se tocan variables de entorno.
+- Plazo total por respuesta (`deadline`): la conexión, cada lectura y el
+  stream completo están acotados, así un proveedor lento no retiene un
+  worker más de `deadline` segundos.
+- Circuit breaker: tras `umbral_fallos` fallos seguidos el circuito se abre
+  y durante `enfriamiento` segundos las peticiones no llegan al proveedor
+  (`ProveedorNoDisponible`); la ruta responde de inmediato con el motor
+  local. Pasado ese tiempo se deja pasar una sola petición de prueba.
+
+Configuración (variables de entorno):
+    QROQ_API_KEY / GROQ_API_KEY   llave del proveedor
+    FIAPP_AI_BASE_URL             URL base (p. ej. el proveedor falso de
+                                  `tools/fake_ai_provider.py`)
+    FIAPP_AI_DEADLINE             segundos por respuesta (20 por defecto)
+"""
+import os
+import threading
+import time
+
+from app.metrics import metricas
+
+MODELO = "openai/gpt-oss-20b"
+
+
+class ProveedorNoDisponible(Exception):
+    """El proveedor no está configurado o el circuito está abierto."""
+
+
+class CircuitBreaker:
+    CERRADO = "cerrado"
+    ABIERTO = "abierto"
+    SEMIABIERTO = "semiabierto"
+
+    def __init__(self, umbral_fallos=3, enfriamiento=30.0):
+        self.umbral_fallos = umbral_fallos
+        self.enfriamiento = enfriamiento
+        self._lock = threading.Lock()
+        self._fallos = 0
+        self._abierto_hasta = 0.0
+        self._prueba_en_curso = False
+        self.estado = self.CERRADO
+
+    def permitir(self):
+        """True si la petición puede ir al proveedor."""
+        with self._lock:
+            if self.estado == self.CERRADO:
+                return True
+            if self.estado == self.ABIERTO and time.monotonic() >= self._abierto_hasta:
+                self.estado = self.SEMIABIERTO
+            if self.estado == self.SEMIABIERTO and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True
+            return False
+
+    def exito(self):
+        with self._lock:
+            if self.estado != self.CERRADO:
+                print("[AI] circuito cerrado: el proveedor respondió")
+            self._fallos = 0
+            self._prueba_en_curso = False
+            self.estado = self.CERRADO
+
+    def fallo(self):
+        with self._lock:
+            self._fallos += 1
+            self._prueba_en_curso = False
+            if self.estado == self.SEMIABIERTO or self._fallos >= self.umbral_fallos:
+                if self.estado != self.ABIERTO:
+                    print(f"[AI] circuito abierto por {self.enfriamiento:.0f}s tras {self._fallos} fallos")
+                    metricas.incrementar("ai_circuito_aperturas")
+                self.estado = self.ABIERTO
+                self._abierto_hasta = time.monotonic() + self.enfriamiento
+
+    def liberar(self):
+        """La petición terminó sin éxito ni fallo del proveedor (p. ej. el navegador se fue)."""
+        with self._lock:
+            self._prueba_en_curso = False
+
+
+class RespuestaIA:
+    """
+    Respuesta en streaming del proveedor: se itera por fragmentos de texto.
+
+    Registra éxito/fallo en el circuit breaker al terminar y hace cumplir el
+    plazo total: al vencer, un temporizador cierra la conexión aunque el hilo
+    esté bloqueado esperando el siguiente fragmento. `close()` corta la
+    conexión con el proveedor (idempotente).
+    """
+
+    def __init__(self, proveedor, completion, limite):
+        self._proveedor = proveedor
+        self._completion = completion
+        self._terminada = False
+        self._vencida = False
+        self._vigilante = threading.Timer(max(0.0, limite - time.monotonic()), self._vencer)
+        self._vigilante.daemon = True
+        self._vigilante.start()
+
+    def _vencer(self):
+        self._vencida = True
+        self._cerrar_completion()
+
+    def __iter__(self):
+        breaker = self._proveedor.breaker
+        try:
+            for chunk in self._completion:
+                if self._vencida:
+                    break
+                try:
+                    piece = chunk.choices[0].delta.content
+                except (AttributeError, IndexError):
+                    continue  # Ignorar pedazos malformados
+                if piece:
+                    yield piece
+        except GeneratorExit:
+            breaker.liberar()
+            raise
+        except Exception as e:
+            breaker.fallo()
+            metricas.incrementar("ai_proveedor_fallos")
+            if self._vencida:
+                raise TimeoutError("El proveedor de AI superó el plazo de respuesta") from e
+            raise
+        else:
+            if self._vencida:
+                breaker.fallo()
+                metricas.incrementar("ai_proveedor_fallos")
+                raise TimeoutError("El proveedor de AI superó el plazo de respuesta")
+            breaker.exito()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._terminada:
+            return
+        self._terminada = True
+        self._vigilante.cancel()
+        self._proveedor.breaker.liberar()
+        self._cerrar_completion()
+
+    def _cerrar_completion(self):
+        try:
+            self._completion.close()
+        except Exception as e:
+            print(f"[AI] error cerrando stream: {e}")
+
+
+class ProveedorIA:
+    def __init__(self, api_key=None, base_url=None, modelo=MODELO, deadline=20.0,
+                 timeout_conexion=3.0, umbral_fallos=3, enfriamiento=30.0):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.modelo = modelo
+        self.deadline = deadline
+        self.timeout_conexion = timeout_conexion
+        self.breaker = CircuitBreaker(umbral_fallos, enfriamiento)
+        self._cliente = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def desde_entorno(cls):
+        return cls(
+            api_key=os.getenv("QROQ_API_KEY") or os.getenv("GROQ_API_KEY"),
+            base_url=os.getenv("FIAPP_AI_BASE_URL") or None,
+            deadline=float(os.getenv("FIAPP_AI_DEADLINE", "20")),
+        )
+
+    @property
+    def configurado(self):
+        return bool(self.api_key)
+
+    def cliente(self):
+        """Cliente Groq del proceso (se crea una vez; ImportError si falta la librería)."""
+        if self._cliente is None:
+            with self._lock:
+                if self._cliente is None:
+                    import httpx
+                    from groq import Groq
+                    self._cliente = Groq(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        # Reintentos los decide el circuit breaker, no el SDK
+                        max_retries=0,
+                        timeout=httpx.Timeout(self.deadline, connect=self.timeout_conexion),
+                    )
+        return self._cliente
+
+    def abrir(self, mensaje):
+        """Inicia una respuesta en streaming y retorna una `RespuestaIA`.
+
+        Lanza `ProveedorNoDisponible` sin contactar al proveedor si no hay
+        llave o el circuito está abierto, y la excepción del proveedor si la
+        petición falla.
+        """
+        if not self.configurado:
+            raise ProveedorNoDisponible("Proveedor de AI no configurado")
+        if not self.breaker.permitir():
+            metricas.incrementar("ai_circuito_rechazos")
+            raise ProveedorNoDisponible("Proveedor de AI no disponible (circuito abierto)")
+        limite = time.monotonic() + self.deadline
+        try:
+            completion = self.cliente().chat.completions.create(
+                model=self.modelo,
+                messages=[{"role": "user", "content": mensaje}],
+                temperature=1,
+                max_completion_tokens=1024,
+                top_p=1,
+                reasoning_effort="medium",
+                stream=True,
+                stop=None,
+            )
+        except ImportError:
+            self.breaker.liberar()
+            raise
+        except Exception:
+            self.breaker.fallo()
+            metricas.incrementar("ai_proveedor_fallos")
+            raise
+        return RespuestaIA(self, completion, limite)
+
+    def completar(self, mensaje):
+        """Respuesta completa como texto (mismas garantías que `abrir`)."""
+        return "".join(self.abrir(mensaje))
+
+
+_proveedor = None
+_proveedor_lock = threading.Lock()
+
+
+def proveedor_ia():
+    """Instancia compartida por el proceso (configurada desde el entorno)."""
+    global _proveedor
+    if _proveedor is None:
+        with _proveedor_lock:
+            if _proveedor is None:
+                _proveedor = ProveedorIA.desde_entorno()
+    return _proveedor
@@ -0,0 +1,240 @@
+"""API JSON versionada (`/api/v1`) sobre los casos de uso.
+
+Pensada para clientes que no necesitan HTML (un POS, scripts): cada
+mutación responde con el recurso actualizado, sin redirecciones ni
+recargas de la colección completa.
+
+- Autenticación: la misma cookie de sesión que la web (tendero).
+- Los recursos de un local sólo son visibles para su propietario (404 si no).
+- Listados paginados por clave: `?limit=50&cursor=<ultimo_id>`; la respuesta
+  trae `next_cursor` (None en la última página).
+- Proyección de campos: `?fields=nombre,precio` (el `id` siempre se incluye).
+- Lote: `PATCH /locales/<id>/productos` con `{"productos": {id: {campos}}}`
+  actualiza N productos en una sola escritura multi-ruta.
+"""
+import hashlib
+import os
+import time
+
+from flask import Blueprint, request, session
+
+from domain.coleccion import a_monto
+
+LIMITE_DEFECTO = 50
+LIMITE_MAX = 200
+# Campos públicos de un cliente: el historial y los nodos internos de la
+# cuenta (`vencimientos/`, ...) nunca salen por la API
+CAMPOS_CLIENTE = {"nombre", "email", "deuda"}
+
+
+def _campos_solicitados():
+    fields = request.args.get("fields", "").strip()
+    return {f.strip() for f in fields.split(",") if f.strip()} or None
+
+
+def _item(item_id, data, campos=None):
+    """Serializa un recurso como dict con `id`, aplicando la proyección de campos."""
+    data = data if isinstance(data, dict) else {}
+    if campos:
+        data = {k: v for k, v in data.items() if k in campos}
+    return {"id": item_id, **data}
+
+
+def _cliente(cliente_id, data):
+    """Serializa un cliente con sólo los `CAMPOS_CLIENTE` (los pedidos en `fields`, si hay)."""
+    campos = (_campos_solicitados() or CAMPOS_CLIENTE) & CAMPOS_CLIENTE
+    data = data if isinstance(data, dict) else {}
+    return {"id": cliente_id, **{k: v for k, v in data.items() if k in campos}}
+
+
+def _paginacion():
+    try:
+        limite = int(request.args.get("limit", LIMITE_DEFECTO))
+    except ValueError:
+        limite = LIMITE_DEFECTO
+    return max(1, min(limite, LIMITE_MAX)), request.args.get("cursor") or None
+
+
+def _resultado(res, status_ok=200, **extra):
+    """Convierte el dict {"success"|"error"} de los casos de uso en respuesta JSON."""
+    if res.get("error"):
+        return {"error": res["error"]}, 400
+    res = {k: v for k, v in res.items() if k != "success"}
+    res.update(extra)
+    return res, status_ok
+
+
+def crear_api_v1(view_model, image_service=None):
+    """Crea el blueprint de la API v1 usando los servicios de la app."""
+    api = Blueprint("api_v1", __name__, url_prefix="/api/v1")
+
+    @api.before_request
+    def _autorizar():
+        if session.get("tipo_usuario") != "tendero":
+            return {"error": "No autorizado"}, 401
+        local_id = (request.view_args or {}).get("local_id")
+        if local_id and not view_model.es_propietario(local_id, session.get("user")):
+            return {"error": "Local no encontrado"}, 404
+
+    @api.errorhandler(404)
+    def _no_encontrado(e):
+        return {"error": "No encontrado"}, 404
+
+    # --- Locales ---
+    @api.route("/locales")
+    def listar_locales():
+        locales = view_model.listar_locales_por_propietario(session.get("user"))
+        campos = _campos_solicitados() or {"nombre", "propietario_id"}
+        return {"data": [_item(lid, data, campos) for lid, data in locales.items()]}
+
+    # --- Productos ---
+    @api.route("/locales/<local_id>/productos")
+    def listar_productos(local_id):
+        limite, cursor = _paginacion()
+        productos, siguiente = view_model.listar_productos_pagina(local_id, limite, cursor)
+        campos = _campos_solicitados()
+        return {"data": [_item(pid, p, campos) for pid, p in productos.items()], "next_cursor": siguiente}
+
+    @api.route("/locales/<local_id>/productos", methods=["POST"])
+    def crear_producto(local_id):
+        body = request.get_json(silent=True) or {}
+        datos, error = view_model.use_cases.validar_producto(body)
+        if error:
+            return {"error": error}, 400
+        producto_id = f"prod_{int(time.time())}_{os.urandom(3).hex()}"
+        res = view_model.crear_producto(local_id, datos["nombre"], datos["precio"], datos["stock"],
+                                        producto_id, None, datos.get("proveedor"), datos.get("costo"))
+        if res.get("error"):
+            return {"error": res["error"]}, 400
+        return {"data": _item(producto_id, view_model.obtener_producto(local_id, producto_id))}, 201
+
+    @api.route("/locales/<local_id>/productos", methods=["PATCH"])
+    def actualizar_productos_lote(local_id):
+        body = request.get_json(silent=True) or {}
+        return _resultado(view_model.actualizar_productos_lote(local_id, body.get("productos")))
+
+    @api.route("/locales/<local_id>/productos/<producto_id>")
+    def obtener_producto(local_id, producto_id):
+        producto = view_model.obtener_producto(local_id, producto_id)
+        if not producto:
+            return {"error": "Producto no encontrado"}, 404
+        return {"data": _item(producto_id, producto, _campos_solicitados())}
+
+    @api.route("/locales/<local_id>/productos/<producto_id>", methods=["PATCH"])
+    def actualizar_producto(local_id, producto_id):
+        body = request.get_json(silent=True) or {}
+        res = view_model.actualizar_productos_lote(local_id, {producto_id: body})
+        if res.get("error"):
+            status = 404 if "no encontrado" in res["error"] else 400
+            return {"error": res["error"]}, status
+        return {"data": _item(producto_id, view_model.obtener_producto(local_id, producto_id))}
+
+    @api.route("/locales/<local_id>/productos/<producto_id>", methods=["DELETE"])
+    def eliminar_producto(local_id, producto_id):
+        imagen_url = view_model.db.get_imagen_producto(local_id, producto_id)
+        view_model.eliminar_producto(local_id, producto_id)
+        if imagen_url and image_service:
+            image_service.liberar(imagen_url, local_id, producto_id)
+        return "", 204
+
+    # --- Clientes ---
+    @api.route("/locales/<local_id>/clientes")
+    def listar_clientes(local_id):
+        limite, cursor = _paginacion()
+        clientes, siguiente = view_model.listar_clientes_pagina(local_id, limite, cursor)
+        # El historial se pide aparte (/deudas): no se incluye en el listado
+        return {"data": [_cliente(cid, c) for cid, c in clientes.items()], "next_cursor": siguiente}
+
+    @api.route("/locales/<local_id>/clientes", methods=["POST"])
+    def agregar_cliente(local_id):
+        body = request.get_json(silent=True) or {}
+        email = str(body.get("email") or "").strip()
+        try:
+            deuda_inicial = a_monto(body.get("deuda_inicial", 0) or 0)
+        except (TypeError, ValueError):
+            return {"error": "La deuda debe ser un número válido"}, 400
+        if not email:
+            return {"error": "Email requerido"}, 400
+        if deuda_inicial < 0:
+            return {"error": "La deuda no puede ser negativa"}, 400
+        email_key = hashlib.md5(email.lower().encode()).hexdigest()
+        user_data = view_model.db.ref.child(f"usuarios/{email_key}").get()
+        if not user_data or user_data.get("tipo_usuario") != "cliente":
+            return {"error": f"No existe un cliente con email '{email}'"}, 404
+        cliente_id = user_data.get("user_id")
+        if view_model.db.get_cliente_resumen(local_id, cliente_id):
+            return {"error": "Este cliente ya está registrado en esta tienda"}, 409
+        cliente_data = {"email": email, "nombre": user_data.get("email", email), "deuda": deuda_inicial}
+        view_model.registrar_cliente(local_id, cliente_id, cliente_data)
+        return {"data": _cliente(cliente_id, cliente_data)}, 201
+
+    @api.route("/locales/<local_id>/clientes/<cliente_id>")
+    def obtener_cliente(local_id, cliente_id):
+        cliente = view_model.db.get_cliente_resumen(local_id, cliente_id)
+        if not cliente:
+            return {"error": "Cliente no encontrado"}, 404
+        cliente.pop("deudas", None)
+        cliente.pop("vencimientos", None)
+        return {"data": _cliente(cliente_id, cliente)}
+
+    @api.route("/locales/<local_id>/clientes/<cliente_id>", methods=["DELETE"])
+    def eliminar_cliente(local_id, cliente_id):
+        view_model.eliminar_cliente(local_id, cliente_id)
+        return "", 204
+
+    # --- Deudas ---
+    @api.route("/locales/<local_id>/clientes/<cliente_id>/deudas")
+    def historial_deudas(local_id, cliente_id):
+        limite, cursor = _paginacion()
+        historial, siguiente = view_model.db.get_deudas_pagina(local_id, cliente_id, limite, cursor)
+        return {"data": [_item(ts, d) for ts, d in historial.items()], "next_cursor": siguiente}
+
+    @api.route("/locales/<local_id>/clientes/<cliente_id>/deudas/archivo")
+    def meses_archivados(local_id, cliente_id):
+        """Meses compactados del historial (su resumen sigue en /deudas)."""
+        return {"data": view_model.db.get_meses_archivados(local_id, cliente_id)}
+
+    @api.route("/locales/<local_id>/clientes/<cliente_id>/deudas/archivo/<mes>")
+    def archivo_deudas(local_id, cliente_id, mes):
+        """Movimientos archivados de un mes ("AAAA-MM")."""
+        movimientos = view_model.db.get_archivo_deudas(local_id, cliente_id, mes)
+        if not movimientos:
+            return {"error": "Mes no archivado"}, 404
+        return {"data": [_item(ts, d) for ts, d in sorted(movimientos.items())]}
+
+    @api.route("/locales/<local_id>/clientes/<cliente_id>/deudas", methods=["POST"])
+    def registrar_deuda(local_id, cliente_id):
+        body = request.get_json(silent=True) or {}
+        try:
+            monto = a_monto(body.get("monto"))
+        except (TypeError, ValueError):
+            return {"error": "El monto debe ser un número"}, 400
+        if monto <= 0:
+            return {"error": "El monto debe ser mayor que 0"}, 400
+        plazo_dias = body.get("plazo_dias")
+        if plazo_dias is not None:
+            # Entero o string de dígitos, como en el formulario
+            if isinstance(plazo_dias, str) and plazo_dias.strip().isdigit():
+                plazo_dias = int(plazo_dias)
+            if type(plazo_dias) is not int or plazo_dias <= 0:
+                return {"error": "El plazo debe ser un número de días mayor que 0"}, 400
+        if not view_model.db.get_cliente_resumen(local_id, cliente_id):
+            return {"error": "Cliente no encontrado"}, 404
+        res = view_model.registrar_deuda(local_id, cliente_id, monto, plazo_dias)
+        return _resultado(res, 201)
+
+    @api.route("/locales/<local_id>/clientes/<cliente_id>/abonos", methods=["POST"])
+    def registrar_abono(local_id, cliente_id):
+        body = request.get_json(silent=True) or {}
+        res = view_model.registrar_abono(local_id, cliente_id, body.get("monto"))
+        if res.get("error") == "Cliente no encontrado":
+            return {"error": res["error"]}, 404
+        return _resultado(res, 201)
+
+    @api.route("/locales/<local_id>/clientes/<cliente_id>/cancelar", methods=["POST"])
+    def cancelar_deuda(local_id, cliente_id):
+        if not view_model.db.get_cliente_resumen(local_id, cliente_id):
+            return {"error": "Cliente no encontrado"}, 404
+        return _resultado(view_model.cancelar_deuda(local_id, cliente_id))
+
+    return api
@@ -0,0 +1,273 @@
+"""Exportaciones en CSV y XLSX generadas mientras se envían.
+
+Las filas salen de generadores que leen la base de a páginas
+(`UseCases.iterar_productos`, `iterar_clientes`, `iterar_movimientos`), se
+serializan en bloques de `FILAS_POR_BLOQUE` y la respuesta no lleva
+`Content-Length` (transferencia chunked): la memoria usada depende del
+tamaño de página y del bloque, no del tamaño de la tienda.
+
+- CSV: UTF-8 con BOM para que Excel reconozca los acentos. Los textos que
+  empiezan con `=`, `+`, `-` o `@` se escriben con un `'` adelante para que
+  la planilla no los ejecute como fórmulas.
+- XLSX: el zip se escribe sobre un flujo sin `seek` (`zipfile` usa data
+  descriptors) y la hoja se comprime a medida que se agregan filas, sin
+  dependencias extra.
+- gzip: sólo para CSV (el XLSX ya va comprimido), con `Content-Encoding`.
+
+Las tiendas grandes también se pueden exportar en segundo plano (trabajo
+`exportar` de `app/trabajos.py`): el mismo cuerpo se escribe a un archivo
+con `guardar` y se descarga cuando el trabajo termina.
+"""
+import csv
+import io
+import os
+import re
+import zipfile
+import zlib
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from flask import Response
+
+from domain.coleccion import a_numero
+
+TAM_PAGINA = int(os.getenv("FIAPP_EXPORT_PAGINA", "500"))
+FILAS_POR_BLOQUE = 200
+FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+COLUMNAS_INVENTARIO = ["producto_id", "nombre", "proveedor", "precio", "costo", "stock", "valor_stock"]
+COLUMNAS_CLIENTES = ["cliente_id", "nombre", "email", "deuda", "movimientos", "ultimo_movimiento"]
+COLUMNAS_ESTADO = ["fecha", "movimiento_id", "tipo", "cargo", "abono", "saldo", "plazo_dias"]
+
+
+# --- Filas ---
+def _fecha(timestamp):
+    if not timestamp:
+        return None
+    try:
+        return datetime.fromtimestamp(int(timestamp)).strftime("%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def filas_inventario(productos, nombres_proveedor=None):
+    """`productos` = iterable de (producto_id, Producto)."""
+    nombres_proveedor = nombres_proveedor or {}
+    for producto_id, p in productos:
+        proveedor = nombres_proveedor.get(p.proveedor, p.proveedor) if p.proveedor else None
+        yield [producto_id, p.nombre, proveedor, p.precio, p.costo, p.stock, round(p.precio * max(p.stock, 0), 2)]
+
+
+def filas_clientes(clientes):
+    """`clientes` = iterable de (cliente_id, Cliente) con su historial."""
+    for cliente_id, c in clientes:
+        movimientos = c.movimientos or {}
+        ultimo = movimientos[max(movimientos)] if movimientos else None
+        fecha = _fecha(ultimo.get("timestamp")) if isinstance(ultimo, dict) else None
+        # Un resumen de mes compactado cuenta por los movimientos que agrupa
+        cantidad = sum(m.get("movimientos", 1) if m.get("tipo") == "resumen" else 1
+                       for m in movimientos.values() if isinstance(m, dict))
+        yield [cliente_id, c.nombre, c.email, c.deuda, cantidad, fecha]
+
+
+def filas_estado_cuenta(movimientos):
+    """Movimientos en orden con el saldo acumulado; `movimientos` = iterable de (clave, dict)."""
+    saldo = 0.0
+    for clave, m in movimientos:
+        monto = a_numero(m.get("monto"))
+        saldo = round(saldo + monto, 2)
+        if m.get("tipo") == "resumen":
+            # Mes compactado: cargos y abonos del mes en una fila
+            yield [_fecha(m.get("timestamp")), clave, f"resumen {m.get('mes', '')}".strip(),
+                   a_numero(m.get("cargos")) or None, a_numero(m.get("abonos")) or None, saldo, None]
+            continue
+        # Los registros antiguos no tienen 'tipo' y son cargos
+        tipo = m.get("tipo") or ("deuda" if monto >= 0 else "abono")
+        yield [_fecha(m.get("timestamp")), clave, tipo, monto if monto > 0 else None,
+               -monto if monto < 0 else None, saldo, m.get("plazo_dias")]
+
+
+def datos_exportacion(view_model, tipo, local_id, tendero_id):
+    """(columnas, filas, hoja) de la exportación `tipo` ("inventario" o "clientes") de un local."""
+    if tipo == "inventario":
+        proveedores = view_model.listar_proveedores(tendero_id) or {}
+        nombres = {pid: p.get("nombre", pid) for pid, p in proveedores.items() if isinstance(p, dict)}
+        filas = filas_inventario(view_model.iterar_productos(local_id, TAM_PAGINA), nombres)
+        return COLUMNAS_INVENTARIO, filas, "Inventario"
+    if tipo == "clientes":
+        return COLUMNAS_CLIENTES, filas_clientes(view_model.iterar_clientes(local_id, TAM_PAGINA)), "Clientes"
+    raise ValueError(f"Exportación desconocida: {tipo}")
+
+
+def _bloques(filas, tam=FILAS_POR_BLOQUE):
+    bloque = []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) >= tam:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+# --- CSV ---
+def _celda_csv(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, str) and valor[:1] in ("=", "+", "-", "@"):
+        return "'" + valor
+    return valor
+
+
+def _csv(columnas, filas):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+    yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+    for bloque in _bloques(filas):
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerows([_celda_csv(v) for v in fila] for fila in bloque)
+        yield buffer.getvalue().encode("utf-8")
+
+
+# --- XLSX ---
+_NS = "http://schemas.openxmlformats.org"
+_TIPOS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    f'<Types xmlns="{_NS}/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    f'<Relationships xmlns="{_NS}/package/2006/relationships">'
+    f'<Relationship Id="rId1" Type="{_NS}/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_LIBRO_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    f'<Relationships xmlns="{_NS}/package/2006/relationships">'
+    f'<Relationship Id="rId1" Type="{_NS}/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_HOJA_INICIO = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    f'<worksheet xmlns="{_NS}/spreadsheetml/2006/main"><sheetData>'
+).encode("utf-8")
+_HOJA_FIN = b"</sheetData></worksheet>"
+# Caracteres de control que XML 1.0 no admite
+_INVALIDOS_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _libro(hoja):
+    hoja = re.sub(r"[\[\]:*?/\\]", " ", hoja)[:31] or "Datos"
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<workbook xmlns="{_NS}/spreadsheetml/2006/main" '
+        f'xmlns:r="{_NS}/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(hoja, {chr(34): "&quot;"})}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    )
+
+
+def _celda_xml(valor):
+    if valor is None:
+        return "<c/>"
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f"<c><v>{valor!r}</v></c>"
+    texto = _INVALIDOS_XML.sub("", str(valor))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(texto)}</t></is></c>'
+
+
+def _fila_xml(fila):
+    return "<row>" + "".join(map(_celda_xml, fila)) + "</row>"
+
+
+class _Tubo:
+    """Destino del zip sin `seek`: guarda lo escrito hasta que se envía."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b"".join(self.partes)
+        self.partes.clear()
+        return datos
+
+
+def _xlsx(columnas, filas, hoja):
+    tubo = _Tubo()
+    with zipfile.ZipFile(tubo, "w", zipfile.ZIP_DEFLATED) as libro:
+        libro.writestr("[Content_Types].xml", _TIPOS)
+        libro.writestr("_rels/.rels", _RELS)
+        libro.writestr("xl/workbook.xml", _libro(hoja))
+        libro.writestr("xl/_rels/workbook.xml.rels", _LIBRO_RELS)
+        yield tubo.vaciar()
+        with libro.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as xml:
+            xml.write(_HOJA_INICIO)
+            xml.write(_fila_xml(columnas).encode("utf-8"))
+            for bloque in _bloques(filas):
+                xml.write("".join(map(_fila_xml, bloque)).encode("utf-8"))
+                datos = tubo.vaciar()
+                if datos:
+                    yield datos
+            xml.write(_HOJA_FIN)
+    yield tubo.vaciar()
+
+
+# --- gzip ---
+def _gzip(trozos, nivel=6):
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)  # 31 = cabecera gzip
+    for trozo in trozos:
+        datos = compresor.compress(trozo)
+        if datos:
+            yield datos
+    yield compresor.flush()
+
+
+def cuerpo(columnas, filas, formato="csv", hoja="Datos"):
+    """Generador de bytes del archivo completo."""
+    if formato == "xlsx":
+        return _xlsx(columnas, filas, hoja)
+    return _csv(columnas, filas)
+
+
+def guardar(ruta, columnas, filas, formato="csv", hoja="Datos"):
+    """Escribe la exportación en `ruta` (reemplazo atómico) y retorna su tamaño en bytes."""
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as archivo:
+        for trozo in cuerpo(columnas, filas, formato, hoja):
+            archivo.write(trozo)
+    os.replace(temporal, ruta)
+    return os.path.getsize(ruta)
+
+
+def respuesta_exportacion(nombre, columnas, filas, formato="csv", comprimir=False, hoja=None):
+    """Respuesta en streaming con `filas` en `formato` ("csv" o "xlsx") como adjunto."""
+    datos = cuerpo(columnas, filas, formato, hoja or nombre)
+    cabeceras = {
+        "Content-Disposition": f'attachment; filename="{nombre}.{formato}"',
+        "Cache-Control": "no-store",
+        "X-Accel-Buffering": "no",  # nginx: enviar cada bloque apenas se genera
+    }
+    if comprimir and formato == "csv":
+        datos = _gzip(datos)
+        cabeceras["Content-Encoding"] = "gzip"
+        cabeceras["Vary"] = "Accept-Encoding"
+    return Response(datos, content_type=FORMATOS[formato], headers=cabeceras)
@@ -1,12 +1,22 @@
-from flask import Flask, request, render_template, redirect, url_for, session
+from flask import Flask, Response, g, request, render_template, redirect, send_file, url_for, session
 import os
-import requests
 import time
+from decimal import Decimal
+from werkzeug.local import LocalProxy
 from werkzeug.utils import secure_filename
-from database.firebase_config import init_firebase
-from database.auth_service import AuthService
-from presentation.presentation import ViewModel
-import ast
+from database.image_service import ImageService
+from app import exportar, servicios
+from app.uploads import leer_formulario_con_imagen, descartar_pendientes, SubidaInvalida
+from app.admission import Rechazado
+from app.ai_provider import ProveedorNoDisponible, proveedor_ia
+from app.api_v1 import crear_api_v1
+from app.metrics import metricas
+from app.sse import CABECERAS_SSE, mensaje_sse, respuesta_sse
+from app.trabajos import EXPORTACIONES, a_publico as trabajos_publico
+from domain import calculadora
+from domain.coleccion import a_monto
+from domain.local import Local
+from ViewModel.ai_planner import detectar_intenciones, planificar
 import re
 
 
@@ -14,56 +24,95 @@ app = Flask(__name__, template_folder="../templates", static_folder="../static")
 app.secret_key = "dev-secret-fiapp-2025"
 
 # Configuración de uploads
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), '../static/productos')
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+UPLOAD_FOLDER = servicios.UPLOAD_FOLDER
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 
 # Crear carpeta de uploads si no existe
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+# El cuerpo completo puede traer, además de la imagen, los campos del formulario
+app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE + 64 * 1024
 
-def allowed_file(filename):
-    """Verifica que el archivo tenga extensión permitida."""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+def save_upload_file(subida):
+    """Confirma una imagen recibida en streaming y retorna su URL relativa.
 
-def save_upload_file(file):
-    """Guarda archivo subido y retorna nombre único + relativo."""
-    if not file or file.filename == '':
-        return None
-    if not allowed_file(file.filename):
+    El nombre es el sha256 del contenido (calculado mientras llegaban los
+    bytes), así que subir dos veces la misma imagen no duplica el archivo.
+    """
+    if not subida:
         return None
     try:
-        # Generar nombre único
-        ext = file.filename.rsplit('.', 1)[1].lower()
-        unique_name = f"producto_{int(time.time())}_{os.urandom(4).hex()}.{ext}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_name)
-        file.save(filepath)
-        # Retornar ruta relativa para guardar en BD
-        return f"/static/productos/{unique_name}"
+        return subida.confirmar()
     except Exception as e:
         print(f"[ERROR] al guardar archivo: {e}")
         return None
 
-# Inicializar Firebase (usa variables de entorno FIREBASE_CREDENTIALS_PATH y FIREBASE_DB_URL)
-init_firebase()
-
-# Control de uso de autenticación local vs Realtime DB
-# Para usar Realtime Database, asegúrate de tener las variables de entorno y
-# establece `USE_LOCAL_AUTH=false` (o no definirla). Para desarrollo rápido,
-# puedes poner `USE_LOCAL_AUTH=true`.
-use_local_auth = os.getenv("USE_LOCAL_AUTH", "false").lower() in ("1", "true", "yes")
-print(f"[CONFIG] USE_LOCAL_AUTH={use_local_auth}")
 
-auth_service = AuthService(use_local=use_local_auth)
-view_model = ViewModel(auth_service)
+def _programar_variantes(local_id, producto_id, imagen_url):
+    """Encola la generación de las variantes de la imagen; el trabajo las guarda en el producto."""
+    if not image_service.disponible:
+        return
+    trabajos.encolar("imagen.variantes",
+                     {"local_id": local_id, "producto_id": producto_id, "imagen_url": imagen_url},
+                     clave=f"variantes:{local_id}:{producto_id}:{imagen_url}", propietario=session.get("user"))
+
+
+def _recalcular_analisis():
+    """Si el análisis ya se usa en este proceso, lo deja recalculado en segundo plano tras un cambio."""
+    if not servicios.analisis.creado():
+        return
+    # Una sola reconstrucción por tendero cada 30 s: las ráfagas de cambios se agrupan
+    usuario = session.get("user")
+    trabajos.encolar("analisis.recalcular", {"tendero_id": usuario},
+                     clave=f"analisis:{usuario}:{int(time.time() // 30)}", propietario=usuario, retraso=2)
+
+
+@app.template_filter("srcset")
+def srcset_filter(imagenes):
+    """Convierte el mapa de variantes de un producto en el valor de `srcset`."""
+    if not imagenes:
+        return ""
+    partes = []
+    for nombre in ImageService.VARIANTES:
+        variante = imagenes.get(nombre)
+        if variante and variante.get("ancho"):
+            partes.append(f"{variante['url']} {variante['ancho']}w")
+    return ", ".join(partes)
+
+
+@app.template_filter("fecha")
+def fecha_filter(timestamp):
+    """Timestamp en segundos -> 'AAAA-MM-DD' (vacío si no hay)."""
+    if not timestamp:
+        return ""
+    return time.strftime("%Y-%m-%d", time.localtime(int(timestamp)))
+
+# Servicios compartidos: se crean en la primera petición que los usa (o en
+# /health/ready), no al importar el módulo. Los proxies permiten usarlos como
+# variables globales sin forzar su creación.
+auth_service = LocalProxy(servicios.auth_service)
+view_model = LocalProxy(servicios.view_model)
+image_service = LocalProxy(servicios.image_service)
+contexto_ia = LocalProxy(servicios.contexto_ia)
+cache_ia = LocalProxy(servicios.cache_ia)
+admision_ia = LocalProxy(servicios.admision_ia)
+perfilador = LocalProxy(servicios.perfilador)
+analisis = LocalProxy(servicios.analisis)
+trabajos = LocalProxy(servicios.trabajos)
+buscador = LocalProxy(servicios.buscador)
+
+# API JSON versionada (/api/v1)
+app.register_blueprint(crear_api_v1(view_model, image_service))
 
 
 @app.before_request
 def log_request_info():
     try:
         print(f"[REQ] {request.method} {request.path}", flush=True)
-        if request.method in ("POST", "PUT", "PATCH"):
+        if request.mimetype == "multipart/form-data":
+            # No tocar request.form: el cuerpo se lee en streaming en la ruta
+            print(f"[REQ] multipart, {request.content_length} bytes", flush=True)
+        elif request.method in ("POST", "PUT", "PATCH"):
             try:
                 form = request.form.to_dict()
                 print(f"[REQ] form: {form}", flush=True)
@@ -89,6 +138,51 @@ def set_csp(response):
     return response
 
 
+@app.teardown_request
+def limpiar_subidas(exc):
+    # Imágenes recibidas pero no confirmadas (validación fallida, error, etc.)
+    descartar_pendientes()
+
+
+@app.after_request
+def cache_imagenes(response):
+    # Las imágenes direccionadas por contenido nunca cambian: caché inmutable
+    # (sólo bajo /static: el resto de las respuestas no necesita crear el servicio)
+    if (response.status_code == 200 and request.path.startswith(app.static_url_path + '/')
+            and image_service.es_inmutable(request.path)):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@app.before_request
+def iniciar_perfil():
+    # Ver app/profiling.py: ?_perfil / X-FIAPP-Perfil (admins), usuarios armados y muestreo continuo
+    if request.path.startswith((app.static_url_path + '/', '/admin/perfiles', '/health/')):
+        return
+    usuario = session.get('user')
+    pedido = request.args.get('_perfil') or request.headers.get('X-FIAPP-Perfil')
+    modo = perfilador.modo_para(usuario, pedido)
+    if modo:
+        g.perfil = perfilador.iniciar(modo, request.method, request.path, usuario)
+
+
+@app.after_request
+def marcar_perfil(response):
+    perfil = g.get('perfil')
+    if perfil is not None:
+        g.perfil_status = response.status_code
+        response.headers['X-FIAPP-Perfil-Id'] = str(perfil.id)
+    return response
+
+
+@app.teardown_request
+def terminar_perfil(exc):
+    perfil = g.pop('perfil', None)
+    if perfil is not None:
+        status = g.pop('perfil_status', None) or (500 if exc else None)
+        perfilador.terminar(perfil, status)
+
+
 @app.route("/")
 def index():
     user = session.get("user")
@@ -246,20 +340,30 @@ def tendero_create_local():
     return render_template("tendero_create_local.html")
 
 
+def _local(local_id):
+    """Local de la ruta con sólo sus metadatos leídos; productos y clientes se leen al usarlos."""
+    return view_model.obtener_local(local_id) or Local(local_id, None, id=local_id)
+
+
 @app.route("/tendero/locales/<local_id>/inventario")
 def tendero_inventario(local_id):
-    """Tendero: ve inventario de una tienda."""
+    """Tendero: ve inventario de una tienda (`?q=` filtra con la búsqueda difusa, del más parecido al menos)."""
     if session.get("tipo_usuario") != "tendero":
         return redirect(url_for("login"))
-    productos = view_model.listar_productos(local_id)
-    local_data = view_model.db.ref.child(f"locales/{local_id}").get() or {}
-    local_name = local_data.get("nombre", local_id)
+    local = _local(local_id)
+    productos = local.productos
+    local_name = local.nombre
     
     # Obtener mapa de proveedores para resolver nombres
     owner = session.get('user')
     proveedores = view_model.listar_proveedores(owner) or {}
+
+    q = request.args.get("q", "").strip()
+    if q:
+        encontrados = buscador.buscar(owner, q, limite=len(productos) or 1, local_id=local_id)["resultados"]
+        productos = {r["producto_id"]: productos[r["producto_id"]] for r in encontrados if r["producto_id"] in productos}
     
-    return render_template("tendero_inventario.html", local_id=local_id, local_name=local_name, productos=productos, proveedores=proveedores)
+    return render_template("tendero_inventario.html", local_id=local_id, local_name=local_name, productos=productos, proveedores=proveedores, q=q)
 
 
 @app.route("/tendero/locales/<local_id>/productos/create", methods=["GET", "POST"])
@@ -268,9 +372,8 @@ def tendero_create_producto(local_id):
     if session.get("tipo_usuario") != "tendero":
         return redirect(url_for("login"))
     
-    # Obtener nombre del local
-    local_data = view_model.db.ref.child(f"locales/{local_id}").get() or {}
-    local_name = local_data.get("nombre", local_id)
+    # Obtener nombre del local (sin leer sus productos ni clientes)
+    local_name = _local(local_id).nombre
     
     # obtener proveedores para el formulario (solo del tendero actual)
     proveedores = {}
@@ -281,11 +384,16 @@ def tendero_create_producto(local_id):
         proveedores = {}
 
     if request.method == "POST":
-        nombre = request.form.get("nombre", "").strip()
-        precio = request.form.get("precio", "").strip()
-        stock = request.form.get("stock", "").strip()
-        proveedor = request.form.get("proveedor", "").strip()
-        file = request.files.get("imagen")
+        # El cuerpo se lee en streaming: la imagen se valida mientras llega
+        try:
+            form, subida = leer_formulario_con_imagen(request, image_service, "imagen", MAX_FILE_SIZE)
+        except SubidaInvalida as e:
+            return render_template("tendero_create_producto.html", local_id=local_id, local_name=local_name, error=str(e), proveedores=proveedores)
+        nombre = form.get("nombre", "").strip()
+        precio = form.get("precio", "").strip()
+        stock = form.get("stock", "").strip()
+        proveedor = form.get("proveedor", "").strip()
+        costo = form.get("costo", "").strip()
         
         # Validaciones
         if not nombre:
@@ -296,15 +404,16 @@ def tendero_create_producto(local_id):
             return render_template("tendero_create_producto.html", local_id=local_id, local_name=local_name, error="Stock requerido", proveedores=proveedores)
         
         try:
-            precio = float(precio)
+            precio = a_monto(precio)
             stock = int(stock)
+            costo = a_monto(costo) if costo else None
         except ValueError:
-            return render_template("tendero_create_producto.html", local_id=local_id, local_name=local_name, error="Precio y stock deben ser números", proveedores=proveedores)
+            return render_template("tendero_create_producto.html", local_id=local_id, local_name=local_name, error="Precio, stock y costo deben ser números", proveedores=proveedores)
         
         # Guardar imagen si se envió
         imagen_url = None
-        if file:
-            imagen_url = save_upload_file(file)
+        if subida:
+            imagen_url = save_upload_file(subida)
             if not imagen_url:
                 return render_template("tendero_create_producto.html", local_id=local_id, local_name=local_name, error="Imagen no válida (PNG, JPG, GIF, WebP; máx 5MB)", proveedores=proveedores)
         
@@ -312,8 +421,12 @@ def tendero_create_producto(local_id):
         producto_id = f"prod_{int(time.time())}_{os.urandom(3).hex()}"
         
         try:
-            res = view_model.crear_producto(local_id, nombre, precio, stock, producto_id, imagen_url, proveedor)
+            res = view_model.crear_producto(local_id, nombre, precio, stock, producto_id, imagen_url, proveedor, costo)
             if res.get("success"):
+                if imagen_url:
+                    image_service.retener(imagen_url, local_id, producto_id)
+                    _programar_variantes(local_id, producto_id, imagen_url)
+                _recalcular_analisis()
                 return redirect(url_for("tendero_inventario", local_id=local_id))
             else:
                 return render_template("tendero_create_producto.html", local_id=local_id, local_name=local_name, error=res.get("error"), proveedores=proveedores)
@@ -328,21 +441,110 @@ def tendero_clientes(local_id):
     """Tendero: ve clientes de una tienda y gestiona sus deudas."""
     if session.get("tipo_usuario") != "tendero":
         return redirect(url_for("login"))
-    clientes = view_model.listar_clientes(local_id)
-    local_data = view_model.db.ref.child(f"locales/{local_id}").get() or {}
-    local_name = local_data.get("nombre", local_id)
+    local = _local(local_id)
+    clientes = local.clientes
+    local_name = local.nombre
     return render_template("tendero_clientes.html", local_id=local_id, local_name=local_name, clientes=clientes)
 
 
+def _ultimo_evento_id():
+    # EventSource lo envía al reconectarse; el parámetro sirve para la primera conexión
+    return request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+
+
+@app.route("/tendero/locales/<local_id>/eventos")
+def tendero_eventos(local_id):
+    """Tendero: cambios de inventario, clientes y deudas de una tienda (SSE)."""
+    if session.get("tipo_usuario") != "tendero":
+        return {"error": "No autorizado"}, 401
+    if not view_model.es_propietario(local_id, session.get("user")):
+        return {"error": "Local no encontrado"}, 404
+    return respuesta_sse(view_model.db.eventos, f"local:{local_id}", _ultimo_evento_id())
+
+
+def _comprimir_exportacion():
+    # `?gzip=1` comprime el CSV al vuelo si el cliente acepta gzip
+    return request.args.get("gzip") in ("1", "true") and request.accept_encodings["gzip"] > 0
+
+
+@app.route("/tendero/locales/<local_id>/exportar/<tipo>.<formato>")
+def tendero_exportar(local_id, tipo, formato):
+    """Tendero: descarga el inventario o los saldos de clientes (CSV o XLSX, en streaming).
+
+    `?diferido=1` genera el archivo en segundo plano: responde 202 con la URL
+    de estado del trabajo y el archivo se descarga de `/api/trabajos/<id>/archivo`.
+    """
+    if session.get("tipo_usuario") != "tendero":
+        return redirect(url_for("login"))
+    if tipo not in ("inventario", "clientes") or formato not in exportar.FORMATOS:
+        return {"error": "Exportación no disponible"}, 404
+    if not view_model.es_propietario(local_id, session.get("user")):
+        return {"error": "Local no encontrado"}, 404
+    nombre = f"{tipo}_{local_id}_{time.strftime('%Y%m%d')}"
+    usuario = session.get("user")
+    if request.args.get("diferido") in ("1", "true"):
+        # Misma exportación pedida dos veces en el mismo minuto: el mismo trabajo
+        trabajo = trabajos.encolar("exportar", {"tipo": tipo, "local_id": local_id, "tendero_id": usuario,
+                                                "formato": formato, "nombre": nombre},
+                                   clave=f"exportar:{usuario}:{local_id}:{tipo}.{formato}:{int(time.time() // 60)}",
+                                   propietario=usuario)
+        return {"trabajo": trabajo["id"], "estado": trabajo["estado"],
+                "url": url_for("api_trabajo", trabajo_id=trabajo["id"])}, 202
+    columnas, filas, hoja = exportar.datos_exportacion(view_model, tipo, local_id, usuario)
+    return exportar.respuesta_exportacion(nombre, columnas, filas, formato, _comprimir_exportacion(), hoja=hoja)
+
+
+@app.route("/tendero/locales/<local_id>/clientes/<cliente_id>/estado.<formato>")
+def tendero_estado_cuenta(local_id, cliente_id, formato):
+    """Tendero: estado de cuenta de un cliente (movimientos con saldo acumulado).
+
+    Los meses compactados salen como una fila de resumen; `?detalle=1` los
+    reemplaza por sus movimientos archivados.
+    """
+    if session.get("tipo_usuario") != "tendero":
+        return redirect(url_for("login"))
+    if formato not in exportar.FORMATOS:
+        return {"error": "Exportación no disponible"}, 404
+    if not view_model.es_propietario(local_id, session.get("user")):
+        return {"error": "Local no encontrado"}, 404
+    if not view_model.db.get_cliente_resumen(local_id, cliente_id):
+        return {"error": "Cliente no encontrado"}, 404
+    detalle = request.args.get("detalle") in ("1", "true")
+    filas = exportar.filas_estado_cuenta(
+        view_model.iterar_movimientos(local_id, cliente_id, exportar.TAM_PAGINA, detalle))
+    nombre = f"estado_{cliente_id}_{local_id}_{time.strftime('%Y%m%d')}"
+    return exportar.respuesta_exportacion(nombre, exportar.COLUMNAS_ESTADO, filas, formato, _comprimir_exportacion(),
+                                          hoja="Estado de cuenta")
+
+
+@app.route("/tendero/locales/<local_id>/vencidas")
+def tendero_vencidas(local_id):
+    """Tendero: deudas vencidas por antigüedad y clientes atrasados (HTML o JSON)."""
+    if session.get("tipo_usuario") != "tendero":
+        if _quiere_json():
+            return {"error": "No autorizado"}, 401
+        return redirect(url_for("login"))
+    if not view_model.es_propietario(local_id, session.get("user")):
+        return {"error": "Local no encontrado"}, 404
+    try:
+        dias = min(max(int(request.args.get("dias", 30)), 1), 365)
+    except ValueError:
+        dias = 30
+    reporte = view_model.reporte_vencimientos(local_id, dias_por_vencer=dias)
+    if _quiere_json():
+        return reporte
+    return render_template("tendero_vencidas.html", local_id=local_id, local_name=_local(local_id).nombre,
+                           reporte=reporte)
+
+
 @app.route("/tendero/locales/<local_id>/clientes/agregar", methods=["GET", "POST"])
 def tendero_agregar_cliente(local_id):
     """Tendero: formulario para agregar un cliente existente con deuda inicial."""
     if session.get("tipo_usuario") != "tendero":
         return redirect(url_for("login"))
     
-    # Obtener nombre del local
-    local_data = view_model.db.ref.child(f"locales/{local_id}").get() or {}
-    local_name = local_data.get("nombre", local_id)
+    # Obtener nombre del local (sin leer sus productos ni clientes)
+    local_name = _local(local_id).nombre
     
     if request.method == "POST":
         email = request.form.get("email", "").strip()
@@ -369,7 +571,7 @@ def tendero_agregar_cliente(local_id):
             
             # Validar deuda
             try:
-                deuda_inicial = float(deuda_inicial)
+                deuda_inicial = a_monto(deuda_inicial)
                 if deuda_inicial < 0:
                     return render_template("tendero_agregar_cliente.html", local_id=local_id, local_name=local_name,
                                          error="La deuda no puede ser negativa")
@@ -404,56 +606,71 @@ def tendero_agregar_cliente(local_id):
     return render_template("tendero_agregar_cliente.html", local_id=local_id, local_name=local_name)
 
 
+def _quiere_json():
+    """True si el cliente pidió JSON (fetch desde script.js) en vez de la página completa."""
+    mejor = request.accept_mimetypes.best_match(["application/json", "text/html"])
+    return mejor == "application/json" and request.accept_mimetypes[mejor] > request.accept_mimetypes["text/html"]
+
+
+def _respuesta_deuda(local_id, cliente_id, result, status_ok=200):
+    """Respuesta de las acciones sobre deudas.
+
+    Con `Accept: application/json` retorna sólo la fila actualizada del
+    cliente (saldo y último movimiento); si no, redirige a la lista como
+    siempre (flujo sin JavaScript).
+    """
+    if not _quiere_json():
+        return redirect(url_for("tendero_clientes", local_id=local_id))
+    if result.get("error"):
+        status = 404 if result["error"] == "Cliente no encontrado" else 400
+        return {"error": result["error"]}, status
+    return {
+        "cliente_id": cliente_id,
+        "deuda": result.get("deuda", 0),
+        "ultimo_movimiento": result.get("movimiento"),
+    }, status_ok
+
+
+def _monto_formulario(campo):
+    """Lee un monto positivo del formulario. Retorna (monto, error)."""
+    valor = request.form.get(campo, "").strip()
+    if not valor:
+        return None, "El monto es requerido"
+    try:
+        monto = a_monto(valor)
+    except ValueError:
+        return None, "El monto debe ser un número"
+    if monto <= 0:
+        return None, "El monto debe ser mayor que 0"
+    return monto, None
+
+
 @app.route("/tendero/locales/<local_id>/cliente/<cliente_id>/abono", methods=["POST"])
 def tendero_registrar_abono(local_id, cliente_id):
     """Tendero: registra un abono/pago parcial a la deuda de un cliente."""
     if session.get("tipo_usuario") != "tendero":
         return redirect(url_for("login"))
-    
-    print(f"[ABONO] local_id={local_id}, cliente_id={cliente_id}")
-    monto_pago = request.form.get("monto_pago", "").strip()
-    print(f"[ABONO] monto_pago recibido: {monto_pago}")
-    
-    if not monto_pago:
-        print(f"[ABONO] monto_pago vacío, retornando")
-        return redirect(url_for("tendero_clientes", local_id=local_id))
-    
-    try:
-        monto_pago = float(monto_pago)
-        print(f"[ABONO] monto_pago convertido: {monto_pago}")
-        if monto_pago <= 0:
-            print(f"[ABONO] monto_pago es <= 0, retornando")
-            return redirect(url_for("tendero_clientes", local_id=local_id))
-    except ValueError as e:
-        print(f"[ABONO] Error al convertir monto_pago: {e}")
-        return redirect(url_for("tendero_clientes", local_id=local_id))
-    
+    if not view_model.es_propietario(local_id, session.get("user")):
+        return _respuesta_deuda(local_id, cliente_id, {"error": "Cliente no encontrado"})
+
+    monto_pago, error = _monto_formulario("monto_pago")
+    print(f"[ABONO] local_id={local_id}, cliente_id={cliente_id}, monto={monto_pago}")
+    if error:
+        return _respuesta_deuda(local_id, cliente_id, {"error": error})
+
     try:
-        # Obtener deuda actual
-        cliente = view_model.db.ref.child(f"locales/{local_id}/clientes/{cliente_id}").get()
-        print(f"[ABONO] cliente data: {cliente}")
-        if not cliente:
-            print(f"[ABONO] cliente no encontrado")
-            return redirect(url_for("tendero_clientes", local_id=local_id))
-        
-        deuda_actual = cliente.get("deuda", 0)
-        print(f"[ABONO] deuda_actual: {deuda_actual}")
-        nueva_deuda = max(0, deuda_actual - monto_pago)
-        print(f"[ABONO] nueva_deuda calculada: {nueva_deuda}")
-        
-        # Actualizar deuda
-        result = view_model.actualizar_deuda(local_id, cliente_id, nueva_deuda)
-        print(f"[ABONO] resultado de actualización: {result}")
-        if not result.get("success"):
-            print(f"[ERROR] al actualizar deuda: {result.get('error')}")
-        
-        print(f"[ABONO] ✓ Abono registrado correctamente")
-        return redirect(url_for("tendero_clientes", local_id=local_id))
+        # Resta en una transacción: no lee el cliente completo ni pisa abonos concurrentes
+        result = view_model.registrar_abono(local_id, cliente_id, monto_pago)
+        if result.get("error"):
+            print(f"[ERROR] al registrar abono: {result['error']}")
+        else:
+            print(f"[ABONO] ✓ nueva deuda: {result['deuda']}")
+        return _respuesta_deuda(local_id, cliente_id, result)
     except Exception as e:
         print(f"[ERROR] al registrar abono: {e}")
         import traceback
         traceback.print_exc()
-        return redirect(url_for("tendero_clientes", local_id=local_id))
+        return _respuesta_deuda(local_id, cliente_id, {"error": "No se pudo registrar el abono"})
 
 
 @app.route("/tendero/locales/<local_id>/cliente/<cliente_id>/cancelar", methods=["POST"])
@@ -461,20 +678,24 @@ def tendero_cancelar_deuda(local_id, cliente_id):
     """Tendero: cancela completamente la deuda de un cliente."""
     if session.get("tipo_usuario") != "tendero":
         return redirect(url_for("login"))
-    
+    if not view_model.es_propietario(local_id, session.get("user")):
+        return _respuesta_deuda(local_id, cliente_id, {"error": "Cliente no encontrado"})
+
     print(f"[CANCELAR] local_id={local_id}, cliente_id={cliente_id}")
     try:
+        if not view_model.db.get_cliente_resumen(local_id, cliente_id):
+            return _respuesta_deuda(local_id, cliente_id, {"error": "Cliente no encontrado"})
         result = view_model.cancelar_deuda(local_id, cliente_id)
-        print(f"[CANCELAR] resultado: {result}")
-        if not result.get("success"):
-            print(f"[ERROR] al cancelar deuda: {result.get('error')}")
-        print(f"[CANCELAR] ✓ Deuda cancelada correctamente")
-        return redirect(url_for("tendero_clientes", local_id=local_id))
+        if result.get("error"):
+            print(f"[ERROR] al cancelar deuda: {result['error']}")
+        else:
+            print(f"[CANCELAR] ✓ Deuda cancelada correctamente")
+        return _respuesta_deuda(local_id, cliente_id, result)
     except Exception as e:
         print(f"[ERROR] al cancelar deuda: {e}")
         import traceback
         traceback.print_exc()
-        return redirect(url_for("tendero_clientes", local_id=local_id))
+        return _respuesta_deuda(local_id, cliente_id, {"error": "No se pudo cancelar la deuda"})
 
 
 @app.route("/tendero/locales/<local_id>/cliente/<cliente_id>/sumar", methods=["POST"])
@@ -482,51 +703,31 @@ def tendero_sumar_deuda(local_id, cliente_id):
     """Tendero: suma/aumenta la deuda de un cliente."""
     if session.get("tipo_usuario") != "tendero":
         return redirect(url_for("login"))
-    
-    print(f"[SUMAR] local_id={local_id}, cliente_id={cliente_id}")
-    monto_sumar = request.form.get("monto_sumar", "").strip()
-    print(f"[SUMAR] monto_sumar recibido: {monto_sumar}")
-    
-    if not monto_sumar:
-        print(f"[SUMAR] monto_sumar vacío, retornando")
-        return redirect(url_for("tendero_clientes", local_id=local_id))
-    
-    try:
-        monto_sumar = float(monto_sumar)
-        print(f"[SUMAR] monto_sumar convertido: {monto_sumar}")
-        if monto_sumar <= 0:
-            print(f"[SUMAR] monto_sumar es <= 0, retornando")
-            return redirect(url_for("tendero_clientes", local_id=local_id))
-    except ValueError as e:
-        print(f"[SUMAR] Error al convertir monto_sumar: {e}")
-        return redirect(url_for("tendero_clientes", local_id=local_id))
-    
+    if not view_model.es_propietario(local_id, session.get("user")):
+        return _respuesta_deuda(local_id, cliente_id, {"error": "Cliente no encontrado"})
+
+    monto_sumar, error = _monto_formulario("monto_sumar")
+    print(f"[SUMAR] local_id={local_id}, cliente_id={cliente_id}, monto={monto_sumar}")
+    if error:
+        return _respuesta_deuda(local_id, cliente_id, {"error": error})
+    plazo_dias = request.form.get("plazo_dias", "").strip() or None
+    if plazo_dias is not None:
+        if not plazo_dias.isdigit() or int(plazo_dias) <= 0:
+            return _respuesta_deuda(local_id, cliente_id, {"error": "El plazo debe ser un número de días mayor que 0"})
+        plazo_dias = int(plazo_dias)
+
     try:
-        # Obtener deuda actual
-        cliente = view_model.db.ref.child(f"locales/{local_id}/clientes/{cliente_id}").get()
-        print(f"[SUMAR] cliente data: {cliente}")
-        if not cliente:
-            print(f"[SUMAR] cliente no encontrado")
-            return redirect(url_for("tendero_clientes", local_id=local_id))
-        
-        deuda_actual = cliente.get("deuda", 0)
-        print(f"[SUMAR] deuda_actual: {deuda_actual}")
-        nueva_deuda = deuda_actual + monto_sumar
-        print(f"[SUMAR] nueva_deuda calculada: {nueva_deuda}")
-        
-        # Actualizar deuda
-        result = view_model.actualizar_deuda(local_id, cliente_id, nueva_deuda)
-        print(f"[SUMAR] resultado de actualización: {result}")
-        if not result.get("success"):
-            print(f"[ERROR] al actualizar deuda: {result.get('error')}")
-        
-        print(f"[SUMAR] ✓ Deuda aumentada correctamente")
-        return redirect(url_for("tendero_clientes", local_id=local_id))
+        if not view_model.db.get_cliente_resumen(local_id, cliente_id):
+            return _respuesta_deuda(local_id, cliente_id, {"error": "Cliente no encontrado"})
+        # Suma en una transacción y deja el cargo en el historial
+        result = view_model.registrar_deuda(local_id, cliente_id, monto_sumar, plazo_dias)
+        print(f"[SUMAR] ✓ nueva deuda: {result.get('deuda')}")
+        return _respuesta_deuda(local_id, cliente_id, result)
     except Exception as e:
         print(f"[ERROR] al sumar deuda: {e}")
         import traceback
         traceback.print_exc()
-        return redirect(url_for("tendero_clientes", local_id=local_id))
+        return _respuesta_deuda(local_id, cliente_id, {"error": "No se pudo sumar la deuda"})
 
 
 @app.route("/tendero/locales/<local_id>/cliente/<cliente_id>/eliminar", methods=["POST"])
@@ -537,7 +738,7 @@ def tendero_eliminar_cliente(local_id, cliente_id):
     
     print(f"[ELIMINAR] local_id={local_id}, cliente_id={cliente_id}")
     try:
-        view_model.db.ref.child(f"locales/{local_id}/clientes/{cliente_id}").delete()
+        view_model.eliminar_cliente(local_id, cliente_id)
         print(f"[ELIMINAR] ✓ Cliente eliminado correctamente")
         return redirect(url_for("tendero_clientes", local_id=local_id))
     except Exception as e:
@@ -553,43 +754,56 @@ def tendero_editar_producto(local_id, producto_id):
     if session.get("tipo_usuario") != "tendero":
         return redirect(url_for("login"))
     
-    # Obtener nombre del local
-    local_data = view_model.db.ref.child(f"locales/{local_id}").get() or {}
-    local_name = local_data.get("nombre", local_id)
+    # Obtener nombre del local (sin leer sus productos ni clientes)
+    local_name = _local(local_id).nombre
     
     if request.method == "POST":
-        nombre = request.form.get("nombre", "").strip()
-        precio = request.form.get("precio", "").strip()
-        stock = request.form.get("stock", "").strip()
-        proveedor = request.form.get("proveedor", "").strip()
-        file = request.files.get("imagen")
+        try:
+            form, subida = leer_formulario_con_imagen(request, image_service, "imagen", MAX_FILE_SIZE)
+        except SubidaInvalida as e:
+            return render_template("tendero_editar_producto.html", local_id=local_id, local_name=local_name, producto_id=producto_id, error=str(e))
+        nombre = form.get("nombre", "").strip()
+        precio = form.get("precio", "").strip()
+        stock = form.get("stock", "").strip()
+        proveedor = form.get("proveedor", "").strip()
+        costo = form.get("costo", "").strip()
         
         if not nombre or not precio or not stock:
             return render_template("tendero_editar_producto.html", local_id=local_id, local_name=local_name, producto_id=producto_id, error="Todos los campos son requeridos")
         
         try:
-            precio = float(precio)
+            precio = a_monto(precio)
             stock = int(stock)
+            costo = a_monto(costo) if costo else None
         except ValueError:
-            return render_template("tendero_editar_producto.html", local_id=local_id, local_name=local_name, producto_id=producto_id, error="Precio y stock deben ser números")
+            return render_template("tendero_editar_producto.html", local_id=local_id, local_name=local_name, producto_id=producto_id, error="Precio, stock y costo deben ser números")
         
         # Preparar datos a actualizar
         update_data = {
             "nombre": nombre,
             "precio": precio,
             "stock": stock,
-            "proveedor": proveedor if proveedor else None
+            "proveedor": proveedor if proveedor else None,
+            "costo": costo
         }
         
         # Si se subió una nueva imagen
-        if file and file.filename != '':
-            imagen_url = save_upload_file(file)
+        if subida:
+            imagen_url = save_upload_file(subida)
             if not imagen_url:
                 return render_template("tendero_editar_producto.html", local_id=local_id, local_name=local_name, producto_id=producto_id, error="Imagen no válida (PNG, JPG, GIF, WebP; máx 5MB)")
             update_data["imagen_url"] = imagen_url
+            update_data["imagenes"] = None  # las variantes anteriores ya no aplican
         
         try:
+            imagen_anterior = view_model.db.get_imagen_producto(local_id, producto_id) if update_data.get("imagen_url") else None
             view_model.db.update_producto(local_id, producto_id, update_data)
+            if update_data.get("imagen_url"):
+                image_service.retener(update_data["imagen_url"], local_id, producto_id)
+                if imagen_anterior and imagen_anterior != update_data["imagen_url"]:
+                    image_service.liberar(imagen_anterior, local_id, producto_id)
+                _programar_variantes(local_id, producto_id, update_data["imagen_url"])
+            _recalcular_analisis()
             return redirect(url_for("tendero_inventario", local_id=local_id))
         except Exception as e:
             return render_template("tendero_editar_producto.html", local_id=local_id, local_name=local_name, producto_id=producto_id, error=str(e))
@@ -611,7 +825,11 @@ def tendero_eliminar_producto(local_id, producto_id):
         return redirect(url_for("login"))
     
     try:
+        imagen_url = view_model.db.get_imagen_producto(local_id, producto_id)
         view_model.eliminar_producto(local_id, producto_id)
+        if imagen_url:
+            image_service.liberar(imagen_url, local_id, producto_id)
+        _recalcular_analisis()
         return redirect(url_for("tendero_inventario", local_id=local_id))
     except Exception as e:
         print(f"[ERROR] al eliminar producto: {e}")
@@ -685,6 +903,60 @@ def api_get_proveedores():
         return {"error": str(e)}, 500
 
 
+def _parametros_analisis():
+    try:
+        umbral = int(request.args.get("umbral", 10))
+        intervalos = int(request.args.get("intervalos", 10))
+    except ValueError:
+        umbral, intervalos = 10, 10
+    return max(1, min(umbral, 10000)), max(1, min(intervalos, 50))
+
+
+@app.route("/tendero/analisis")
+def tendero_analisis():
+    """Tendero: valoración, margen por proveedor, precios y cobertura de stock de todas sus tiendas."""
+    if session.get("tipo_usuario") != "tendero":
+        return redirect(url_for("login"))
+    umbral, intervalos = _parametros_analisis()
+    try:
+        datos = analisis.resumen(session.get("user"), umbral, intervalos)
+    except ImportError:
+        return render_template("tendero_analisis.html", error="El análisis requiere NumPy (pip install numpy)"), 503
+    return render_template("tendero_analisis.html", datos=datos, umbral=umbral, intervalos=intervalos)
+
+
+@app.route("/api/analisis")
+def api_analisis():
+    """API: el mismo análisis que /tendero/analisis (`?umbral=10&intervalos=10`)."""
+    if session.get("tipo_usuario") != "tendero":
+        return {"error": "No autorizado"}, 401
+    umbral, intervalos = _parametros_analisis()
+    try:
+        return analisis.resumen(session.get("user"), umbral, intervalos)
+    except ImportError:
+        return {"error": "El análisis requiere NumPy"}, 503
+
+
+@app.route("/api/productos/buscar")
+def api_buscar_productos():
+    """API: búsqueda difusa de productos en las tiendas del tendero.
+
+    `?q=arroz&local_id=...&limite=20`; sin acentos ni mayúsculas y tolera
+    errores de tipeo. Resultados ordenados del más parecido al menos.
+    """
+    if session.get("tipo_usuario") != "tendero":
+        return {"error": "No autorizado"}, 401
+    usuario = session.get("user")
+    local_id = request.args.get("local_id") or None
+    if local_id and not view_model.es_propietario(local_id, usuario):
+        return {"error": "Local no encontrado"}, 404
+    try:
+        limite = max(1, min(int(request.args.get("limite", "20")), 100))
+    except ValueError:
+        limite = 20
+    return buscador.buscar(usuario, request.args.get("q", "")[:100], limite, local_id)
+
+
 @app.route("/cliente/deudas")
 def cliente_deudas():
     """Cliente: ve todas sus deudas."""
@@ -695,19 +967,12 @@ def cliente_deudas():
     return render_template("cliente_deudas.html", deudas=deudas)
 
 
-def _safe_eval(expr: str):
-    """Evalúa expresiones aritméticas simples de forma segura usando ast."""
-    # Sólo permitir dígitos, operadores y paréntesis
-    if not re.match(r'^[0-9\.\s\+\-\*\/\%\(\)]+$', expr):
-        raise ValueError('Expresión no permitida')
-    node = ast.parse(expr, mode='eval')
-    allowed = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Num, ast.Constant,
-               ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod, ast.Pow,
-               ast.USub, ast.UAdd, ast.Load)
-    for n in ast.walk(node):
-        if not isinstance(n, allowed):
-            raise ValueError('Operación no permitida')
-    return eval(compile(node, '<string>', 'eval'))
+@app.route("/cliente/eventos")
+def cliente_eventos():
+    """Cliente: cambios de su saldo en cualquier tienda (SSE)."""
+    if session.get("tipo_usuario") != "cliente":
+        return {"error": "No autorizado"}, 401
+    return respuesta_sse(view_model.db.eventos, f"cliente:{session.get('user')}", _ultimo_evento_id())
 
 
 def _handle_finance_message(message: str) -> str:
@@ -720,178 +985,82 @@ def _handle_finance_message(message: str) -> str:
     # Si parece una expresión aritmética, intentamos evaluarla
     if re.match(r'^[0-9\.\s\+\-\*\/\%\(\)]+$', expr):
         try:
-            val = _safe_eval(expr)
-            return f'El resultado es {val}'
-        except Exception:
-            pass
-
-    # Patrón: '3 unidades a 12.50' o '3 u a 12.50'
-    p = re.search(r'([0-9]+(?:\.[0-9]+)?)\s*(?:unidades|u|uds)?\s*(?:a|x|por)\s*\$?\s*([0-9]+(?:\.[0-9]+)?)', m)
-    if p:
-        qty = float(p.group(1))
-        price = float(p.group(2))
-        total = qty * price
-        qty_display = int(qty) if qty.is_integer() else qty
-        return f'{qty_display} × {price} = {total:.2f} (total)'
+            return f'El resultado es {calculadora.formatear(calculadora.evaluar(expr))}'
+        except calculadora.ErrorCalculo as e:
+            return f'No puedo calcular eso: {e}.'
+
+    # Patrón: '3 unidades a 12.50' o '3 u a 12.50' (puede haber varios en el mensaje)
+    items = re.findall(r'([0-9]+(?:\.[0-9]+)?)\s*(?:unidades|u|uds)?\s*(?:a|x|por)\s*\$?\s*([0-9]+(?:\.[0-9]+)?)', m)
+    if items:
+        totales = calculadora.evaluar_lote(f'{qty}*{price}' for qty, price in items)
+        lineas = []
+        suma = 0
+        for (qty, price), total in zip(items, totales):
+            if isinstance(total, calculadora.ErrorCalculo):
+                lineas.append(f'{qty} × {price}: {total}')
+                continue
+            suma += total
+            lineas.append(f'{calculadora.formatear(Decimal(qty))} × {price} = {calculadora.a_dinero(total)} (total)')
+        if len(items) > 1:
+            lineas.append(f'Total general: {calculadora.a_dinero(suma)}')
+        return '\n'.join(lineas)
 
     # Patrón: porcentaje '10% de 250'
     p2 = re.search(r'([0-9]+(?:\.[0-9]+)?)\s*%\s*(?:de)?\s*\$?\s*([0-9]+(?:\.[0-9]+)?)', m)
     if p2:
-        pct = float(p2.group(1))
-        base = float(p2.group(2))
-        value = base * pct / 100.0
-        return f'{pct}% de {base} = {value:.2f}'
+        pct, base = p2.groups()
+        (value,) = calculadora.evaluar_lote([f'{base}*{pct}/100'])
+        if isinstance(value, calculadora.ErrorCalculo):
+            return f'No puedo calcular eso: {value}.'
+        return f'{pct}% de {base} = {calculadora.a_dinero(value)}'
 
     # Fallback con ejemplos
     return ('Puedo ayudar con cálculos: ejemplos:\n- "3 unidades a 12.50"\n- "12.5*3+2"\n- "10% de 250"')
 
 
-def _build_ai_context(tendero_id: str) -> str:
-    """Construye contexto de negocio del tendero para la IA (locales, productos, clientes, deudas)."""
-    try:
-        locales = view_model.listar_locales(tendero_id) or {}
-        context_lines = ["📊 CONTEXTO DE TU NEGOCIO:\n"]
-        
-        if not locales:
-            context_lines.append("No tienes locales registrados aún.")
-            return '\n'.join(context_lines)
-        
-        for local_id, local_data in locales.items():
-            local_name = local_data.get('nombre', local_id)
-            context_lines.append(f"\n🏪 Tienda: {local_name}")
-            
-            # Productos
-            try:
-                productos = view_model.listar_productos(local_id) or {}
-                if productos:
-                    context_lines.append(f"  📦 Productos ({len(productos)}):")
-                    for pid, pdata in list(productos.items())[:5]:  # Top 5
-                        nombre = pdata.get('nombre', 'Sin nombre')
-                        precio = pdata.get('precio', 0)
-                        stock = pdata.get('stock', 0)
-                        context_lines.append(f"    - {nombre}: ${precio} (stock: {stock})")
-                    if len(productos) > 5:
-                        context_lines.append(f"    ... y {len(productos) - 5} más")
-            except Exception as e:
-                print(f"[AI CONTEXT] error productos: {e}")
-            
-            # Clientes y deudas
-            try:
-                clientes = view_model.listar_clientes(local_id) or {}
-                if clientes:
-                    total_deuda = 0
-                    clientes_deudores = 0
-                    for cid, cdata in clientes.items():
-                        deuda = float(cdata.get('deuda', 0))
-                        if deuda > 0:
-                            clientes_deudores += 1
-                            total_deuda += deuda
-                    context_lines.append(f"  👥 Clientes: {len(clientes)} (deudores: {clientes_deudores}, deuda total: ${total_deuda:.2f})")
-            except Exception as e:
-                print(f"[AI CONTEXT] error clientes: {e}")
-        
-        return '\n'.join(context_lines)
-    except Exception as e:
-        print(f"[AI CONTEXT] error building context: {e}")
-        return "Contexto no disponible."
+def _preparar_mensaje_ai(tendero_id, msg):
+    """Arma el prompt para la IA con los datos de Firebase relevantes a la pregunta."""
+    # Todas las intenciones del mensaje (deudas, stock, ...) en una pasada;
+    # los datos de cada tienda se leen una sola vez para todas
+    query_types, firebase_data = planificar(contexto_ia, tendero_id, msg)
+    if query_types:
+        print(f"[AI CHAT] Firebase query: {', '.join(query_types)}")
 
+    # Construir mensaje para la IA con datos reales de Firebase
+    return f"""Eres un asistente de negocios para tenderos. Responde preguntas sobre sus tiendas, productos, clientes y deudas.
 
-def _execute_firebase_query(tendero_id: str, query_type: str) -> str:
-    """Ejecuta consultas específicas en Firebase y devuelve datos formateados para la IA."""
-    try:
-        locales = view_model.listar_locales(tendero_id) or {}
-        if not locales:
-            return "No tienes locales registrados."
-        
-        results = []
-        
-        # Iterar sobre locales del tendero
-        for local_id, local_data in locales.items():
-            local_name = local_data.get('nombre', local_id)
-            
-            if query_type == 'deudas':
-                # Consultar clientes y sus deudas
-                clientes = view_model.listar_clientes(local_id) or {}
-                deudas_list = []
-                for cid, cdata in clientes.items():
-                    nombre = cdata.get('nombre', cdata.get('email', cid))
-                    deuda = float(cdata.get('deuda', 0))
-                    if deuda > 0:
-                        deudas_list.append({'nombre': nombre, 'deuda': deuda, 'cliente_id': cid})
-                
-                # Ordenar por deuda descendente
-                deudas_list.sort(key=lambda x: x['deuda'], reverse=True)
-                
-                if deudas_list:
-                    results.append(f"🏪 {local_name}:")
-                    for d in deudas_list:
-                        results.append(f"  - {d['nombre']}: ${d['deuda']:.2f}")
-                    total = sum(d['deuda'] for d in deudas_list)
-                    results.append(f"  TOTAL DEUDA: ${total:.2f}")
-            
-            elif query_type == 'productos':
-                # Consultar todos los productos
-                productos = view_model.listar_productos(local_id) or {}
-                if productos:
-                    results.append(f"🏪 {local_name} - Productos:")
-                    prods_list = []
-                    for pid, pdata in productos.items():
-                        prods_list.append({
-                            'nombre': pdata.get('nombre', 'Sin nombre'),
-                            'precio': float(pdata.get('precio', 0)),
-                            'stock': int(pdata.get('stock', 0))
-                        })
-                    
-                    # Ordenar por precio descendente
-                    prods_list.sort(key=lambda x: x['precio'], reverse=True)
-                    
-                    for p in prods_list[:10]:  # Top 10
-                        results.append(f"  - {p['nombre']}: ${p['precio']:.2f} (stock: {p['stock']})")
-                    
-                    if len(prods_list) > 10:
-                        results.append(f"  ... y {len(prods_list) - 10} más")
-            
-            elif query_type == 'clientes':
-                # Consultar clientes
-                clientes = view_model.listar_clientes(local_id) or {}
-                if clientes:
-                    results.append(f"🏪 {local_name} - Clientes ({len(clientes)}):")
-                    for cid, cdata in list(clientes.items())[:10]:
-                        nombre = cdata.get('nombre', cdata.get('email', cid))
-                        deuda = float(cdata.get('deuda', 0))
-                        estado = f"Debe: ${deuda:.2f}" if deuda > 0 else "Al día"
-                        results.append(f"  - {nombre}: {estado}")
-                    
-                    if len(clientes) > 10:
-                        results.append(f"  ... y {len(clientes) - 10} más")
-            
-            elif query_type == 'stock':
-                # Consultar productos con bajo stock
-                productos = view_model.listar_productos(local_id) or {}
-                bajo_stock = []
-                for pid, pdata in productos.items():
-                    stock = int(pdata.get('stock', 0))
-                    if stock < 10:
-                        bajo_stock.append({
-                            'nombre': pdata.get('nombre', 'Sin nombre'),
-                            'stock': stock,
-                            'precio': float(pdata.get('precio', 0))
-                        })
-                
-                bajo_stock.sort(key=lambda x: x['stock'])
-                
-                if bajo_stock:
-                    results.append(f"🏪 {local_name} - Bajo Stock (<10 unidades):")
-                    for p in bajo_stock:
-                        results.append(f"  - {p['nombre']}: {p['stock']} unidades (${p['precio']:.2f})")
-                else:
-                    results.append(f"🏪 {local_name}: Todo el stock está bien.")
-        
-        return '\n'.join(results) if results else "No hay datos disponibles para esa consulta."
-    
-    except Exception as e:
-        print(f"[FIREBASE QUERY] error: {e}")
-        return f"Error al consultar Firebase: {str(e)}"
+DATOS DE FIREBASE (actualizados en tiempo real):
+{firebase_data}
+
+Pregunta del usuario: {msg}
+
+Responde de forma concisa, útil y en español. Si pregunta sobre datos específicos, utiliza los datos de Firebase que se proporcionaron arriba."""
+
+
+def _rechazo_ai(e):
+    """429 con Retry-After para una petición que el control de admisión no aceptó."""
+    print(f"[AI] rechazado: {e}")
+    return {'error': str(e), 'reintentar_en': e.reintentar_en}, 429, {'Retry-After': str(e.reintentar_en)}
+
+
+def _clave_cache_ai(tendero_id, msg, data):
+    """Clave de `cache_ia` para el mensaje, o None si se pidió no usar el caché.
+
+    Se omite con `"sin_cache": true` en el JSON o `Cache-Control: no-cache`.
+    Las versiones se toman antes de leer los datos: si cambian mientras se
+    genera la respuesta, ésta queda guardada con la versión vieja y no se usa.
+    """
+    if data.get('sin_cache') or 'no-cache' in (request.headers.get('Cache-Control') or ''):
+        return None
+    return cache_ia.clave(tendero_id, msg, detectar_intenciones(msg), contexto_ia.versiones(tendero_id))
+
+
+def _respuesta_cacheada(clave):
+    if clave is None:
+        return None
+    reply = cache_ia.obtener(clave)
+    metricas.incrementar('ai_cache_aciertos' if reply is not None else 'ai_cache_fallos')
+    return reply
 
 
 @app.route('/api/ai_chat', methods=['POST'])
@@ -904,128 +1073,47 @@ def api_ai_chat():
     if not msg:
         return {'error': 'Mensaje vacío'}, 400
     
-    # Construir contexto del negocio del tendero para la IA
     tendero_id = session.get('user')
-    
-    # Determinar tipo de consulta basado en palabras clave
-    msg_lower = msg.lower()
-    query_type = None
-    
-    if any(word in msg_lower for word in ['deuda', 'debo', 'debe', 'pago', 'abono', 'acreedor']):
-        query_type = 'deudas'
-    elif any(word in msg_lower for word in ['producto', 'precio', 'caro', 'barato', 'inventario', 'mercancía']):
-        query_type = 'productos'
-    elif any(word in msg_lower for word in ['cliente', 'comprador', 'usuario']):
-        query_type = 'clientes'
-    elif any(word in msg_lower for word in ['stock', 'cantidad', 'falta', 'poco', 'agotado']):
-        query_type = 'stock'
-    
-    # Ejecutar consulta Firebase si se detectó tipo
-    firebase_data = ""
-    if query_type:
-        firebase_data = _execute_firebase_query(tendero_id, query_type)
-        print(f"[AI CHAT] Firebase query: {query_type}")
-    
-    # Construir mensaje para la IA con datos reales de Firebase
-    full_message = f"""Eres un asistente de negocios para tenderos. Responde preguntas sobre sus tiendas, productos, clientes y deudas.
-
-DATOS DE FIREBASE (actualizados en tiempo real):
-{firebase_data}
-
-Pregunta del usuario: {msg}
+    # Orden de lo más barato a lo más caro: caché, límites y recién entonces
+    # las lecturas del contexto
+    clave = _clave_cache_ai(tendero_id, msg, data)
+    reply = _respuesta_cacheada(clave)
+    if reply is not None:
+        print('[AI PROXY] respuesta desde caché')
+        return {'reply': reply, 'cache': True}, 200
+    try:
+        admision_ia.limitar(tendero_id)
+    except Rechazado as e:
+        return _rechazo_ai(e)
 
-Responde de forma concisa, útil y en español. Si pregunta sobre datos específicos, utiliza los datos de Firebase que se proporcionaron arriba."""
-    
     try:
-        # Si hay una llave de QROQ configurada, proxear la petición a la API externa.
-        # La llave debe estar en la variable de entorno QROQ_API_KEY.
-        qroq_key = os.environ.get('QROQ_API_KEY')
-        if qroq_key:
-            # Preferir usar la librería "groq" si está instalada y soporta streaming
+        # Proveedor compartido (llave en QROQ_API_KEY); con el circuito abierto
+        # no se le consulta y se responde con el motor local
+        proveedor = proveedor_ia()
+        if proveedor.configurado:
             try:
-                from groq import Groq
-                # Groq client puede leer la variable de entorno GROQ_API_KEY, así que la dejamos disponible
-                os.environ.setdefault('GROQ_API_KEY', qroq_key)
-                client = Groq()
-                # Construir la conversación mínima
-                completion = client.chat.completions.create(
-                    model="openai/gpt-oss-20b",
-                    messages=[{"role": "user", "content": full_message}],
-                    temperature=1,
-                    max_completion_tokens=1024,
-                    top_p=1,
-                    reasoning_effort="medium",
-                    stream=True,
-                    stop=None
-                )
-                # Si la API es de streaming, iteramos los chunks y los concatenamos
-                reply_parts = []
-                try:
-                    for chunk in completion:
-                        try:
-                            delta = chunk.choices[0].delta
-                            # delta puede tener 'content' o ser None
-                            piece = getattr(delta, 'content', None) if hasattr(delta, '__dict__') else (delta.get('content') if isinstance(delta, dict) else None)
-                            if piece:
-                                reply_parts.append(piece)
-                        except Exception:
-                            # Ignorar pedazos malformados
-                            continue
-                except TypeError:
-                    # Si completion no es iterable (no streaming), intentar obtener texto directamente
-                    try:
-                        text = getattr(completion, 'text', None) or getattr(completion, 'message', None) or str(completion)
-                        if text:
-                            reply_parts.append(text)
-                    except Exception:
-                        pass
-
-                reply = ''.join(reply_parts).strip()
+                permiso = admision_ia.admitir(tendero_id)
+            except Rechazado as e:
+                return _rechazo_ai(e)
+            try:
+                with permiso:
+                    # Construir contexto del negocio del tendero para la IA
+                    full_message = _preparar_mensaje_ai(tendero_id, msg)
+                    reply = proveedor.completar(full_message).strip()
                 if not reply:
                     reply = 'El proveedor external respondió sin contenido.'
                 print('[AI PROXY] used groq client')
+                if clave is not None:
+                    cache_ia.guardar(clave, reply)
                 return {'reply': reply}, 200
+            except ProveedorNoDisponible as e:
+                print(f"[AI PROXY] {e}")
             except ImportError:
-                print('[AI PROXY] groq library not installed, falling back to HTTP proxy')
+                print('[AI PROXY] groq library not installed, using local engine')
             except Exception as e:
                 print(f"[AI PROXY] groq error: {e}")
 
-            # Fallback HTTP attempt (en caso groq no esté disponible)
-            try:
-                headers = {
-                    'Authorization': f'Bearer {qroq_key}',
-                    'Content-Type': 'application/json'
-                }
-                payload = {'input': msg}
-                resp = requests.post('https://api.qroq.ai/v1/chat', json=payload, headers=headers, timeout=15)
-                if resp.status_code >= 400:
-                    print(f"[AI PROXY] provider error: {resp.status_code} {resp.text}")
-                    return {'error': 'Error desde el proveedor de AI'}, 502
-                data_resp = resp.json()
-                # Extraer respuesta de forma robusta
-                reply = None
-                if isinstance(data_resp, dict):
-                    reply = data_resp.get('reply') or data_resp.get('message')
-                    if not reply:
-                        choices = data_resp.get('choices') or data_resp.get('outputs')
-                        if isinstance(choices, list) and len(choices) > 0:
-                            first = choices[0]
-                            if isinstance(first, dict):
-                                reply = first.get('text') or first.get('message') or first.get('output')
-                            else:
-                                reply = str(first)
-                    if not reply:
-                        reply = data_resp.get('result')
-                if not reply:
-                    reply = str(data_resp)
-                print('[AI PROXY] used http fallback')
-                return {'reply': reply}, 200
-            except requests.RequestException as re:
-                print(f"[AI PROXY] request error: {re}")
-            except Exception as e:
-                print(f"[AI PROXY] unexpected error: {e}")
-
-        # Si no hay llave o las llamadas al proveedor fallaron, usar motor local como fallback
+        # Si no hay llave o el proveedor falló, usar motor local como fallback
         reply = _handle_finance_message(msg)
         return {'reply': reply}, 200
     except Exception as e:
@@ -1033,5 +1121,319 @@ Responde de forma concisa, útil y en español. Si pregunta sobre datos específ
         return {'error': str(e)}, 500
 
 
+@app.route('/api/ai_chat/stream', methods=['POST'])
+def api_ai_chat_stream():
+    """Como /api/ai_chat, pero envía la respuesta por SSE a medida que se genera.
+
+    Eventos: `delta` {"texto"} por cada fragmento, `done` {"ttft_ms", "total_ms"}
+    (y `"cache": true` si la respuesta salió de `cache_ia`) al terminar y `error` {"error"} si el proveedor falla a mitad de respuesta.
+    Si el navegador se desconecta se cierra el stream con el proveedor.
+    """
+    if session.get('tipo_usuario') != 'tendero':
+        return {'error': 'No autorizado'}, 401
+    data = request.get_json(silent=True) or {}
+    msg = (data.get('message') or '').strip()
+    if not msg:
+        return {'error': 'Mensaje vacío'}, 400
+
+    tendero_id = session.get('user')
+    inicio = time.perf_counter()
+    clave = _clave_cache_ai(tendero_id, msg, data)
+    reply = _respuesta_cacheada(clave)
+    if reply is not None:
+        def _desde_cache():
+            total_ms = round((time.perf_counter() - inicio) * 1000, 1)
+            yield mensaje_sse('delta', {'texto': reply})
+            yield mensaje_sse('done', {'ttft_ms': total_ms, 'total_ms': total_ms, 'cache': True})
+        return Response(_desde_cache(), mimetype='text/event-stream', headers=CABECERAS_SSE)
+    try:
+        admision_ia.limitar(tendero_id)
+    except Rechazado as e:
+        return _rechazo_ai(e)
+
+    proveedor = proveedor_ia()
+    # El lugar se reserva antes de responder para que el rechazo sea un 429
+    # real; se libera al terminar el stream o al cerrarse la respuesta
+    permiso = None
+    full_message = None
+    if proveedor.configurado:
+        try:
+            permiso = admision_ia.admitir(tendero_id)
+        except Rechazado as e:
+            return _rechazo_ai(e)
+        # El contexto sólo se lee con el lugar ya reservado (el motor local no lo usa)
+        try:
+            full_message = _preparar_mensaje_ai(tendero_id, msg)
+        except Exception:
+            permiso.liberar()
+            raise
+
+    def _eventos():
+        respuesta = None
+        ttft_ms = None
+        texto = []
+        try:
+            if proveedor.configurado:
+                try:
+                    respuesta = proveedor.abrir(full_message)
+                except ProveedorNoDisponible as e:
+                    print(f"[AI STREAM] {e}")
+                except ImportError:
+                    print('[AI STREAM] groq library not installed, using local engine')
+                except Exception as e:
+                    print(f"[AI STREAM] groq error: {e}")
+            # Sin proveedor: el motor local responde en un solo fragmento
+            fragmentos = respuesta if respuesta is not None else [_handle_finance_message(msg)]
+            try:
+                for piece in fragmentos:
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - inicio) * 1000
+                        metricas.observar('ai_ttft_ms', ttft_ms)
+                    if respuesta is not None:
+                        texto.append(piece)
+                    yield mensaje_sse('delta', {'texto': piece})
+            except Exception as e:
+                if ttft_ms is not None:
+                    raise
+                # Falló antes del primer fragmento: todavía se puede responder en local
+                print(f"[AI STREAM] groq error: {e}")
+                ttft_ms = (time.perf_counter() - inicio) * 1000
+                yield mensaje_sse('delta', {'texto': _handle_finance_message(msg)})
+            if texto and clave is not None:
+                cache_ia.guardar(clave, ''.join(texto))
+            total_ms = (time.perf_counter() - inicio) * 1000
+            metricas.observar('ai_stream_total_ms', total_ms)
+            print(f"[AI STREAM] ttft={ttft_ms or 0:.0f}ms total={total_ms:.0f}ms")
+            yield mensaje_sse('done', {'ttft_ms': round(ttft_ms or 0, 1), 'total_ms': round(total_ms, 1)})
+        except GeneratorExit:
+            # El navegador cerró la conexión (o canceló con AbortController)
+            print('[AI STREAM] cliente desconectado, se cancela el stream')
+            metricas.incrementar('ai_stream_cancelados')
+            raise
+        except Exception as e:
+            print(f"[AI STREAM] error: {e}")
+            metricas.incrementar('ai_stream_errores')
+            yield mensaje_sse('error', {'error': 'Error desde el proveedor de AI'})
+        finally:
+            if respuesta is not None:
+                respuesta.close()
+            if permiso is not None:
+                permiso.liberar()
+
+    response = Response(_eventos(), mimetype='text/event-stream', headers=CABECERAS_SSE)
+    if permiso is not None:
+        # Si el navegador se va antes de que empiece el stream, el generador
+        # nunca corre su finally
+        response.call_on_close(permiso.liberar)
+    return response
+
+
+@app.route('/api/metricas')
+def api_metricas():
+    """Métricas del proceso (tiempos del asistente IA, contadores)."""
+    if session.get('tipo_usuario') != 'tendero':
+        return {'error': 'No autorizado'}, 401
+    return metricas.resumen()
+
+
+
+def _es_admin():
+    return perfilador.es_admin(session.get('user'))
+
+
+def _trabajo_propio(trabajo_id):
+    trabajo = trabajos.obtener(trabajo_id)
+    if trabajo is None or (trabajo['propietario'] != session.get('user') and not _es_admin()):
+        return None
+    return trabajo
+
+
+@app.route('/api/trabajos')
+def api_trabajos():
+    """Últimos trabajos en segundo plano del usuario."""
+    if not session.get('user'):
+        return {'error': 'No autorizado'}, 401
+    return {'trabajos': [trabajos_publico(t) for t in trabajos.listar(session.get('user'))]}
+
+
+@app.route('/api/trabajos/<int:trabajo_id>')
+def api_trabajo(trabajo_id):
+    """Estado de un trabajo: pendiente, en_curso, hecho (con su resultado) o fallido (con el error)."""
+    if not session.get('user'):
+        return {'error': 'No autorizado'}, 401
+    trabajo = _trabajo_propio(trabajo_id)
+    if trabajo is None:
+        return {'error': 'Trabajo no encontrado'}, 404
+    publico = trabajos_publico(trabajo)
+    if trabajo['tipo'] == 'exportar' and trabajo['estado'] == 'hecho':
+        publico['descarga'] = url_for('api_trabajo_archivo', trabajo_id=trabajo_id)
+    return publico
+
+
+@app.route('/api/trabajos/<int:trabajo_id>/archivo')
+def api_trabajo_archivo(trabajo_id):
+    """Descarga el archivo de una exportación diferida ya terminada."""
+    if not session.get('user'):
+        return {'error': 'No autorizado'}, 401
+    trabajo = _trabajo_propio(trabajo_id)
+    if trabajo is None or trabajo['tipo'] != 'exportar':
+        return {'error': 'Trabajo no encontrado'}, 404
+    if trabajo['estado'] != 'hecho':
+        return {'error': 'La exportación todavía no está lista', 'estado': trabajo['estado']}, 409
+    resultado = trabajo['resultado']
+    ruta = os.path.join(EXPORTACIONES, os.path.basename(resultado['archivo']))
+    if not os.path.exists(ruta):
+        return {'error': 'El archivo ya no está disponible'}, 410
+    return send_file(ruta, as_attachment=True, download_name=resultado['nombre'])
+
+
+@app.route('/admin/trabajos', methods=['GET', 'POST'])
+def admin_trabajos():
+    """Estado de la cola de trabajos.
+
+    POST encola un mantenimiento (`tipo`): `vencimientos.indexar` (por defecto) o
+    `deudas.compactar` (`dias` = horizonte), de un `local` o de todos.
+    """
+    if not _es_admin():
+        return {'error': 'No autorizado'}, 401
+    if request.method == 'POST':
+        tipo = request.form.get('tipo', 'vencimientos.indexar')
+        local_id = (request.form.get('local') or '').strip() or None
+        args = {'local_id': local_id}
+        if tipo == 'deudas.compactar':
+            try:
+                args['dias'] = max(1, int(request.form['dias'])) if request.form.get('dias') else None
+            except ValueError:
+                return {'error': 'Los días deben ser un número'}, 400
+        elif tipo != 'vencimientos.indexar':
+            return {'error': 'Tipo de trabajo no permitido'}, 400
+        trabajo = trabajos.encolar(tipo, args, clave=f"{tipo}:{local_id or '*'}:{int(time.time() // 60)}",
+                                   propietario=session.get('user'))
+        return {'trabajo': trabajo['id'], 'url': url_for('api_trabajo', trabajo_id=trabajo['id'])}, 202
+    return {**trabajos.estadisticas(), 'recientes': [trabajos_publico(t) for t in trabajos.listar(limite=50)]}
+
+
+@app.route('/admin/perfiles', methods=['GET', 'POST'])
+def admin_perfiles():
+    """Perfiles capturados y usuarios armados; POST arma al usuario indicado."""
+    if not _es_admin():
+        return {'error': 'No autorizado'}, 401
+    error = None
+    if request.method == 'POST':
+        usuario = request.form.get('usuario', '').strip()
+        try:
+            peticiones = int(request.form.get('peticiones', '1'))
+            if not usuario:
+                raise ValueError('Falta el usuario')
+            perfilador.armar(usuario, peticiones, request.form.get('modo', 'determinista'))
+            return redirect(url_for('admin_perfiles'))
+        except ValueError as e:
+            error = str(e)
+    if _quiere_json():
+        return {'perfiles': perfilador.listar(), 'armados': perfilador.armados(), 'tasa': perfilador.tasa}
+    return render_template('admin_perfiles.html', perfiles=perfilador.listar(), armados=perfilador.armados(),
+                           tasa=perfilador.tasa, error=error)
+
+
+@app.route('/admin/perfiles/<int:perfil_id>')
+def admin_perfil(perfil_id):
+    """Detalle de un perfil: llamadas a la base, top-N y flamegraph.
+
+    `?formato=json` o `?formato=folded` (pilas para flamegraph.pl / speedscope).
+    """
+    if not _es_admin():
+        return {'error': 'No autorizado'}, 401
+    perfil = perfilador.obtener(perfil_id)
+    if perfil is None:
+        return {'error': 'Perfil no encontrado'}, 404
+    formato = request.args.get('formato')
+    if formato == 'folded':
+        return Response(perfil.plegado(), mimetype='text/plain')
+    if formato == 'json':
+        return perfil.a_dict()
+    return render_template('admin_perfil.html', perfil=perfil.a_dict(), flamegraph=perfil.flamegraph())
+
+
+@app.route('/health/live')
+def health_live():
+    """El proceso responde (no toca servicios ni la base)."""
+    return {'ok': True}
+
+
+def _calentar_servicios():
+    for obtener in (servicios.view_model, servicios.image_service, servicios.contexto_ia,
+                    servicios.cache_ia, servicios.admision_ia, servicios.perfilador, servicios.trabajos,
+                    servicios.buscador):
+        obtener()
+
+
+def _calentar_base():
+    # Lectura mínima: abre la conexión (y el token de Firebase) sin traer datos
+    view_model.db.ref.child('_health').get()
+
+
+def _calentar_ia():
+    proveedor = proveedor_ia()
+    if proveedor.configurado:
+        proveedor.cliente()
+
+
+def _calentar_plantillas():
+    for nombre in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(nombre)
+
+
+@app.route('/health/ready')
+def health_ready():
+    """Crea los servicios y calienta conexiones y cachés; 503 si algo falla.
+
+    Pensado como readiness probe: el balanceador no manda tráfico hasta que
+    responde 200, así la primera petición real no paga el arranque.
+    """
+    componentes = {}
+    listo = True
+    for nombre, paso in (('servicios', _calentar_servicios), ('base_datos', _calentar_base),
+                         ('ia', _calentar_ia), ('plantillas', _calentar_plantillas)):
+        inicio = time.perf_counter()
+        try:
+            paso()
+            componentes[nombre] = {'ok': True}
+        except Exception as e:
+            print(f"[HEALTH] {nombre} no está listo: {e}")
+            componentes[nombre] = {'ok': False, 'error': str(e)}
+            listo = False
+        componentes[nombre]['ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+    return {'listo': listo, 'componentes': componentes}, 200 if listo else 503
+
+
+def configurar_app(config=None):
+    """Aplica `config` a la app global del módulo y la retorna (no crea otra).
+
+    La app, sus rutas, el blueprint de la API y los hooks se arman al
+    importar `app.main`; esto sólo configura ese objeto:
+
+    - las claves `FIAPP_*`, `FIREBASE_*`, `USE_LOCAL_AUTH` y `GROQ_API_KEY` se
+      escriben en `os.environ`, del que leen los servicios al crearse. Quedan
+      ahí para todo el proceso (no se restauran) y, si algún servicio ya se
+      creó, se ignoran;
+    - el resto va a `app.config`.
+
+    No inicializa Firebase (eso ocurre en la primera petición que usa la base
+    o en `/health/ready`); el `.env` lo carga `database.firebase_config` al
+    importarse.
+
+        app = configurar_app({"FIAPP_DB_BACKEND": "local", "TESTING": True})
+    """
+    for clave, valor in (config or {}).items():
+        if clave.startswith(('FIAPP_', 'FIREBASE_')) or clave in ('USE_LOCAL_AUTH', 'GROQ_API_KEY'):
+            if servicios.creados():
+                print(f"[CONFIG] {clave} ignorada: los servicios ya se crearon")
+                continue
+            os.environ[clave] = str(valor)
+        else:
+            app.config[clave] = valor
+    return app
+
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    configurar_app().run(host="0.0.0.0", port=5000, debug=True)
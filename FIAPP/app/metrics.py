@@ -0,0 +1,77 @@
+"""Métricas simples en memoria (por proceso).
+
+- Contadores: `metricas.incrementar("ai_stream_cancelados")`.
+- Series de tiempos: `metricas.observar("ai_ttft_ms", 412.5)`; se guardan las
+  últimas `MUESTRAS` observaciones para calcular percentiles.
+- Medidores: `metricas.medidor("ai_en_curso", lambda: control.en_curso)`; el
+  valor se lee al pedir el resumen.
+
+`metricas.resumen()` es lo que expone `GET /api/metricas`.
+"""
+import math
+import threading
+from collections import deque
+
+MUESTRAS = 500
+
+
+def percentil(valores, p):
+    """Percentil `p` (0-100) por rango más cercano de una lista ya ordenada."""
+    if not valores:
+        return None
+    indice = min(len(valores) - 1, max(0, math.ceil(p / 100 * len(valores)) - 1))
+    return valores[indice]
+
+
+def _redondear(valor):
+    return round(valor, 2) if valor is not None else None
+
+
+class Metricas:
+    def __init__(self, muestras=MUESTRAS):
+        self._muestras = muestras
+        self._lock = threading.Lock()
+        self._contadores = {}
+        self._series = {}   # nombre -> [total, suma, deque(últimas)]
+        self._medidores = {}  # nombre -> función sin argumentos
+
+    def incrementar(self, nombre, n=1):
+        with self._lock:
+            self._contadores[nombre] = self._contadores.get(nombre, 0) + n
+
+    def observar(self, nombre, valor):
+        with self._lock:
+            serie = self._series.get(nombre)
+            if serie is None:
+                serie = self._series[nombre] = [0, 0.0, deque(maxlen=self._muestras)]
+            serie[0] += 1
+            serie[1] += valor
+            serie[2].append(valor)
+
+    def medidor(self, nombre, funcion):
+        with self._lock:
+            self._medidores[nombre] = funcion
+
+    def resumen(self):
+        with self._lock:
+            contadores = dict(self._contadores)
+            medidores = dict(self._medidores)
+            series = {nombre: (total, suma, sorted(ultimas)) for nombre, (total, suma, ultimas) in self._series.items()}
+        return {
+            "contadores": contadores,
+            "medidores": {nombre: funcion() for nombre, funcion in medidores.items()},
+            "series": {
+                nombre: {
+                    "n": total,
+                    "promedio": round(suma / total, 2) if total else None,
+                    "p50": _redondear(percentil(ultimas, 50)),
+                    "p95": _redondear(percentil(ultimas, 95)),
+                    "max": _redondear(ultimas[-1] if ultimas else None),
+                }
+                for nombre, (total, suma, ultimas) in series.items()
+            },
+        }
+
+
+# Instancia compartida por el proceso
+metricas = Metricas()
@@ -0,0 +1,342 @@
+"""Perfilado de peticiones bajo demanda.
+
+Sólo los administradores (ids de usuario en `FIAPP_ADMINS`) pueden pedirlo:
+
+- Su propia petición: `?_perfil=1` o la cabecera `X-FIAPP-Perfil: 1`
+  (determinista, con cProfile) o `muestreo` (pilas cada `intervalo_ms`).
+- Las próximas N peticiones de otro usuario, p. ej. el tendero que reporta
+  una página lenta: formulario "Armar" en `/admin/perfiles`.
+- Muestreo continuo: `FIAPP_PERFIL_TASA` es la proporción de peticiones que
+  se perfilan por muestreo (0 = apagado). Un hilo aparte lee la pila del
+  hilo de la petición, así que la petición casi no se frena.
+
+Cada perfil guarda ruta, duración, status, las llamadas a la base
+(operación, ruta y ms) y, según el modo, el top-N de funciones o las pilas
+plegadas para el flamegraph. Se guardan los últimos `max_perfiles` en
+memoria (por proceso); `/admin/perfiles/<id>?formato=folded` los exporta
+para flamegraph.pl o speedscope.
+
+Configuración (variables de entorno):
+    FIAPP_ADMINS                ids de usuario separados por comas
+    FIAPP_PERFIL_TASA           proporción de peticiones muestreadas (0)
+    FIAPP_PERFIL_INTERVALO_MS   intervalo del muestreo (5)
+    FIAPP_PERFIL_MAX            perfiles guardados (50)
+    FIAPP_PERFIL_TOP            funciones en el top-N (30)
+"""
+import contextvars
+import cProfile
+import functools
+import itertools
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from app.metrics import metricas
+
+MODOS = ("determinista", "muestreo")
+OPERACIONES_DB = ("get", "set", "update", "delete", "push", "transaction")
+
+_perfil_actual = contextvars.ContextVar("perfil_actual", default=None)
+_en_llamada_db = contextvars.ContextVar("en_llamada_db", default=False)
+_instrumentado = False
+_instrumentado_lock = threading.Lock()
+
+
+def _ruta_de(objeto):
+    ruta = getattr(objeto, "path", None)
+    if ruta is None:
+        # Query: la local guarda su Reference, la de Firebase la URL
+        ruta = getattr(getattr(objeto, "_ref", None), "path", None) or getattr(objeto, "_pathurl", "?")
+    return ruta
+
+
+def _envolver(cls, operacion):
+    original = getattr(cls, operacion)
+
+    @functools.wraps(original)
+    def envoltura(self, *args, **kwargs):
+        perfil = _perfil_actual.get()
+        # push() llama a set(): sólo se registra la operación de afuera
+        if perfil is None or _en_llamada_db.get():
+            return original(self, *args, **kwargs)
+        token = _en_llamada_db.set(True)
+        inicio = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            _en_llamada_db.reset(token)
+            perfil.llamada_db(operacion, _ruta_de(self), (time.perf_counter() - inicio) * 1000)
+
+    setattr(cls, operacion, envoltura)
+
+
+def instrumentar_db():
+    """Envuelve las operaciones de `Reference`/`Query` del backend en uso (una sola vez).
+
+    Se llama con el primer perfil, así el proceso no paga nada hasta que
+    alguien perfila; fuera de un perfil la envoltura sólo lee un ContextVar.
+    """
+    global _instrumentado
+    if _instrumentado:
+        return
+    with _instrumentado_lock:
+        if _instrumentado:
+            return
+        from database.firebase_config import usa_base_local
+        if usa_base_local():
+            from database import local_db as modulo
+        else:
+            from firebase_admin import db as modulo
+        for cls in (modulo.Reference, modulo.Query):
+            for operacion in OPERACIONES_DB:
+                if hasattr(cls, operacion):
+                    _envolver(cls, operacion)
+        _instrumentado = True
+
+
+class Muestreador:
+    """Lee la pila de un hilo cada `intervalo` segundos desde otro hilo."""
+
+    def __init__(self, hilo_id, intervalo, pilas):
+        self.hilo_id = hilo_id
+        self.intervalo = intervalo
+        self.pilas = pilas  # Counter: "mod.py:func;mod.py:func" -> muestras
+        self._fin = threading.Event()
+        self._hilo = threading.Thread(target=self._correr, name="perfil-muestreo", daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def detener(self):
+        self._fin.set()
+        self._hilo.join()
+
+    def _correr(self):
+        while not self._fin.wait(self.intervalo):
+            frame = sys._current_frames().get(self.hilo_id)
+            pila = []
+            while frame is not None:
+                codigo = frame.f_code
+                pila.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+                frame = frame.f_back
+            if pila:
+                self.pilas[";".join(reversed(pila))] += 1
+
+
+class Perfil:
+    def __init__(self, perfil_id, modo, metodo, ruta, usuario):
+        self.id = perfil_id
+        self.modo = modo
+        self.metodo = metodo
+        self.ruta = ruta
+        self.usuario = usuario
+        self.fecha = time.time()
+        self.duracion_ms = None
+        self.status = None
+        self.llamadas_db = []   # [(operación, ruta, ms)]
+        self.funciones = []     # top-N: [{funcion, llamadas, propio_ms, total_ms}]
+        self.pilas = Counter()  # sólo en modo muestreo
+        self._inicio = None
+        self._perfilador = None
+        self._muestreador = None
+        self._token = None
+
+    def llamada_db(self, operacion, ruta, ms):
+        self.llamadas_db.append((operacion, ruta, round(ms, 3)))
+
+    @property
+    def db_ms(self):
+        return round(sum(ms for _, _, ms in self.llamadas_db), 3)
+
+    def resumen(self):
+        return {
+            "id": self.id,
+            "modo": self.modo,
+            "metodo": self.metodo,
+            "ruta": self.ruta,
+            "usuario": self.usuario,
+            "fecha": self.fecha,
+            "duracion_ms": self.duracion_ms,
+            "status": self.status,
+            "llamadas_db": len(self.llamadas_db),
+            "db_ms": self.db_ms,
+        }
+
+    def a_dict(self):
+        datos = self.resumen()
+        datos["llamadas_db"] = [{"operacion": o, "ruta": r, "ms": ms} for o, r, ms in self.llamadas_db]
+        datos["funciones"] = self.funciones
+        datos["muestras"] = sum(self.pilas.values())
+        return datos
+
+    def plegado(self):
+        """Pilas en formato "folded" (una por línea: `a;b;c muestras`)."""
+        return "\n".join(f"{pila} {n}" for pila, n in self.pilas.most_common())
+
+    def flamegraph(self, minimo=0.005):
+        """Rectángulos del flamegraph: [{nombre, nivel, x, ancho, muestras}] con x/ancho en proporción.
+
+        Se omiten los marcos de menos de `minimo` del total (ilegibles).
+        """
+        total = sum(self.pilas.values())
+        if not total:
+            return []
+        arbol = {}
+        for pila, n in self.pilas.items():
+            nodo = arbol
+            for marco in pila.split(";"):
+                hijo = nodo.setdefault(marco, [0, {}])
+                hijo[0] += n
+                nodo = hijo[1]
+        rectangulos = []
+
+        def _recorrer(nodo, nivel, x):
+            for nombre, (muestras, hijos) in sorted(nodo.items()):
+                ancho = muestras / total
+                if ancho >= minimo:
+                    rectangulos.append({"nombre": nombre, "nivel": nivel, "x": x, "ancho": ancho,
+                                        "muestras": muestras})
+                    _recorrer(hijos, nivel + 1, x)
+                x += ancho
+
+        _recorrer(arbol, 0, 0.0)
+        return rectangulos
+
+
+class Perfilador:
+    def __init__(self, admins=(), tasa=0.0, intervalo_ms=5.0, max_perfiles=50, top=30):
+        self.admins = set(admins)
+        self.tasa = tasa
+        self.intervalo = intervalo_ms / 1000.0
+        self.max_perfiles = max_perfiles
+        self.top = top
+        self._lock = threading.Lock()
+        self._perfiles = OrderedDict()
+        self._armados = {}  # usuario -> [peticiones restantes, modo]
+        self._ids = itertools.count(1)
+
+    @classmethod
+    def desde_entorno(cls):
+        return cls(
+            admins=[a.strip() for a in os.getenv("FIAPP_ADMINS", "").split(",") if a.strip()],
+            tasa=float(os.getenv("FIAPP_PERFIL_TASA", "0")),
+            intervalo_ms=float(os.getenv("FIAPP_PERFIL_INTERVALO_MS", "5")),
+            max_perfiles=int(os.getenv("FIAPP_PERFIL_MAX", "50")),
+            top=int(os.getenv("FIAPP_PERFIL_TOP", "30")),
+        )
+
+    def es_admin(self, usuario):
+        return usuario in self.admins
+
+    # --- Qué peticiones se perfilan ---
+    def armar(self, usuario, peticiones=1, modo="determinista"):
+        """Perfila las próximas `peticiones` de `usuario`."""
+        if modo not in MODOS:
+            raise ValueError(f"Modo desconocido: {modo}")
+        with self._lock:
+            if peticiones > 0:
+                self._armados[usuario] = [peticiones, modo]
+            else:
+                self._armados.pop(usuario, None)
+
+    def armados(self):
+        with self._lock:
+            return {usuario: {"peticiones": n, "modo": modo} for usuario, (n, modo) in self._armados.items()}
+
+    def modo_para(self, usuario, pedido=None):
+        """Modo con el que se perfila la petición, o None.
+
+        `pedido` es el valor de `?_perfil` / `X-FIAPP-Perfil`; sólo cuenta si
+        el usuario es admin.
+        """
+        if pedido and self.es_admin(usuario):
+            return "muestreo" if pedido == "muestreo" else "determinista"
+        if usuario and self._armados:
+            with self._lock:
+                armado = self._armados.get(usuario)
+                if armado:
+                    armado[0] -= 1
+                    if armado[0] <= 0:
+                        del self._armados[usuario]
+                    return armado[1]
+        if self.tasa and random.random() < self.tasa:
+            return "muestreo"
+        return None
+
+    # --- Captura ---
+    def iniciar(self, modo, metodo, ruta, usuario):
+        instrumentar_db()
+        perfil = Perfil(next(self._ids), modo, metodo, ruta, usuario)
+        if modo == "determinista":
+            perfil._perfilador = cProfile.Profile()
+            try:
+                perfil._perfilador.enable()
+            except ValueError:
+                # Python 3.12+: un solo cProfile activo por proceso; se muestrea
+                perfil._perfilador = None
+                perfil.modo = "muestreo"
+        if perfil.modo == "muestreo":
+            perfil._muestreador = Muestreador(threading.get_ident(), self.intervalo, perfil.pilas)
+            perfil._muestreador.iniciar()
+        perfil._token = _perfil_actual.set(perfil)
+        perfil._inicio = time.perf_counter()
+        return perfil
+
+    def terminar(self, perfil, status=None):
+        perfil.duracion_ms = round((time.perf_counter() - perfil._inicio) * 1000, 3)
+        perfil.status = status
+        _perfil_actual.reset(perfil._token)
+        if perfil._perfilador is not None:
+            perfil._perfilador.disable()
+            perfil.funciones = self._top_determinista(perfil._perfilador)
+            perfil._perfilador = None
+        if perfil._muestreador is not None:
+            perfil._muestreador.detener()
+            perfil._muestreador = None
+            perfil.funciones = self._top_muestreo(perfil.pilas)
+        with self._lock:
+            self._perfiles[perfil.id] = perfil
+            while len(self._perfiles) > self.max_perfiles:
+                self._perfiles.popitem(last=False)
+        metricas.incrementar(f"perfiles_{perfil.modo}")
+        return perfil
+
+    def _top_determinista(self, perfilador):
+        estadisticas = pstats.Stats(perfilador).stats
+        filas = []
+        for (archivo, linea, funcion), (_, llamadas, propio, total, _) in estadisticas.items():
+            filas.append({
+                "funcion": f"{os.path.basename(archivo)}:{linea}:{funcion}" if linea else funcion,
+                "llamadas": llamadas,
+                "propio_ms": round(propio * 1000, 3),
+                "total_ms": round(total * 1000, 3),
+            })
+        filas.sort(key=lambda f: f["propio_ms"], reverse=True)
+        return filas[:self.top]
+
+    def _top_muestreo(self, pilas):
+        # Mismas columnas que el determinista; el tiempo se estima como muestras × intervalo
+        propio = Counter()
+        total = Counter()
+        for pila, n in pilas.items():
+            marcos = pila.split(";")
+            propio[marcos[-1]] += n
+            for marco in set(marcos):
+                total[marco] += n
+        ms = self.intervalo * 1000
+        return [{"funcion": funcion, "llamadas": None, "propio_ms": round(n * ms, 3),
+                 "total_ms": round(total[funcion] * ms, 3)}
+                for funcion, n in propio.most_common(self.top)]
+
+    # --- Consulta ---
+    def listar(self):
+        with self._lock:
+            return [p.resumen() for p in reversed(self._perfiles.values())]
+
+    def obtener(self, perfil_id):
+        with self._lock:
+            return self._perfiles.get(perfil_id)
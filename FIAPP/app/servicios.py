@@ -0,0 +1,128 @@
+"""Servicios compartidos de la app, creados la primera vez que se usan.
+
+Importar `app.main` no toca Firebase ni arma servicios: cada getter construye
+su singleton en la primera llamada (una sola vez aunque lleguen varios hilos
+a la vez) y los siguientes lo reutilizan. `/health/ready` los crea todos por
+adelantado para que la primera petición real no pague ese costo.
+
+    from app import servicios
+    servicios.view_model().db.get_local(local_id)
+"""
+import functools
+import os
+import threading
+import time
+
+from app.metrics import metricas
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), '../static/productos')
+
+_registrados = []
+
+
+def perezoso(fabrica):
+    """Decorador: `fabrica()` corre una sola vez y se recuerda su resultado."""
+    lock = threading.Lock()
+    valor = []
+
+    @functools.wraps(fabrica)
+    def obtener():
+        if not valor:
+            with lock:
+                if not valor:
+                    valor.append(fabrica())
+        return valor[0]
+
+    obtener.creado = lambda: bool(valor)
+    _registrados.append(obtener)
+    return obtener
+
+
+def creados():
+    """Nombres de los servicios que ya se construyeron."""
+    return [s.__name__ for s in _registrados if s.creado()]
+
+
+@perezoso
+def auth_service():
+    from database.auth_service import AuthService
+    # Control de uso de autenticación local vs Realtime DB
+    # Para usar Realtime Database, asegúrate de tener las variables de entorno y
+    # establece `USE_LOCAL_AUTH=false` (o no definirla). Para desarrollo rápido,
+    # puedes poner `USE_LOCAL_AUTH=true`.
+    use_local_auth = os.getenv("USE_LOCAL_AUTH", "false").lower() in ("1", "true", "yes")
+    print(f"[CONFIG] USE_LOCAL_AUTH={use_local_auth}")
+    return AuthService(use_local=use_local_auth)
+
+
+@perezoso
+def view_model():
+    # DBService inicializa Firebase (o la base local) al crearse
+    from presentation.presentation import ViewModel
+    return ViewModel(auth_service())
+
+
+@perezoso
+def image_service():
+    # Imágenes de productos: almacén por contenido + variantes WebP en segundo plano
+    from database.image_service import ImageService
+    return ImageService(UPLOAD_FOLDER, db=view_model().db, programar_borrado=_borrar_imagen_despues)
+
+
+def _borrar_imagen_despues(imagen_hash, vence):
+    # Una imagen liberada dentro de su ventana de gracia se borra con un trabajo
+    # diferido; la clave cambia si se vuelve a subir (nueva ventana)
+    trabajos().encolar("imagen.borrar", {"imagen_hash": imagen_hash},
+                       clave=f"imagen.borrar:{imagen_hash}:{int(vence)}", retraso=max(0.0, vence - time.time()) + 1)
+
+
+@perezoso
+def contexto_ia():
+    # Contexto de negocio para el asistente IA (cacheado por tienda)
+    from ViewModel.ai_context import ContextoIA
+    return ContextoIA(view_model())
+
+
+@perezoso
+def cache_ia():
+    # Respuestas del proveedor por pregunta + versión de los datos
+    from ViewModel.ai_cache import CacheRespuestas
+    return CacheRespuestas(ttl=int(os.getenv("FIAPP_AI_CACHE_TTL", "600")))
+
+
+@perezoso
+def admision_ia():
+    # Límite de mensajes por tendero y de llamadas simultáneas al proveedor
+    from app.admission import ControlAdmision
+    control = ControlAdmision.desde_entorno()
+    metricas.medidor('ai_en_curso', lambda: control.en_curso)
+    metricas.medidor('ai_en_cola', lambda: control.en_cola)
+    return control
+
+
+@perezoso
+def perfilador():
+    # Perfilado de peticiones bajo demanda (admins) y muestreo continuo
+    from app.profiling import Perfilador
+    return Perfilador.desde_entorno()
+
+
+@perezoso
+def analisis():
+    # Análisis columnar del inventario (requiere NumPy)
+    from ViewModel.analisis import AnalisisInventario
+    return AnalisisInventario(view_model())
+
+
+@perezoso
+def trabajos():
+    # Cola persistente de trabajos en segundo plano y sus hilos trabajadores
+    from app.trabajos import Trabajadores
+    return Trabajadores.desde_entorno().iniciar()
+
+
+@perezoso
+def buscador():
+    # Índice en memoria para la búsqueda difusa de productos por tendero
+    from ViewModel.busqueda import BuscadorProductos
+    return BuscadorProductos(view_model(), ttl=int(os.getenv("FIAPP_BUSQUEDA_TTL", "300")))
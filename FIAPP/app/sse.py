@@ -0,0 +1,77 @@
+"""Respuestas Server-Sent Events sobre el bus de eventos (`database/event_bus.py`).
+
+Formato de cada evento:
+
+    id: <instancia>-<n>
+    event: producto | producto_eliminado | cliente | cliente_eliminado | deuda | resync
+    data: {...json...}
+
+- Heartbeat: un comentario `: ping` cada `HEARTBEAT` segundos mantiene viva
+  la conexión a través de proxies y detecta navegadores desconectados (la
+  escritura falla y el generador se cierra).
+- Reconexión: `EventSource` reenvía `Last-Event-ID` y se reenvían los
+  eventos perdidos desde el buffer; si no es posible se envía `resync`.
+- Contrapresión: si la cola de un navegador se llena la conexión se corta
+  y el navegador se reconecta (ver `Suscripcion`).
+"""
+import json
+
+from flask import Response
+
+from database.event_bus import LimiteConexiones
+
+HEARTBEAT = 15
+RETRY_MS = 3000
+CABECERAS_SSE = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # nginx: no acumular la respuesta
+}
+
+
+def mensaje_sse(tipo, data, id=None):
+    """Serializa un evento SSE con `data` en JSON (una sola línea)."""
+    data = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    cabecera = f"id: {id}\n" if id is not None else ""
+    return f"{cabecera}event: {tipo}\ndata: {data}\n\n"
+
+
+def formatear_evento(evento):
+    return mensaje_sse(evento.tipo, evento.data, evento.id)
+
+
+def _stream(suscripcion, perdidos):
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        if perdidos is None:
+            yield "event: resync\ndata: {}\n\n"
+        else:
+            for evento in perdidos:
+                yield formatear_evento(evento)
+        while True:
+            evento = suscripcion.siguiente(HEARTBEAT)
+            if evento is not None:
+                yield formatear_evento(evento)
+            elif suscripcion.cerrada:
+                break
+            else:
+                yield ": ping\n\n"
+    finally:
+        # También al desconectarse el navegador (GeneratorExit)
+        suscripcion.cerrar()
+
+
+def respuesta_sse(bus, canal, ultimo_id=None):
+    """Abre una suscripción a `canal` y la retorna como respuesta `text/event-stream`.
+
+    Retorna 503 con `Retry-After` si el proceso ya tiene el máximo de conexiones.
+    """
+    try:
+        suscripcion, perdidos = bus.suscribir(canal, ultimo_id)
+    except LimiteConexiones:
+        print(f"[SSE] máximo de conexiones alcanzado ({bus.max_conexiones}), se rechaza {canal}")
+        return Response("Demasiadas conexiones\n", status=503, mimetype="text/plain",
+                        headers={"Retry-After": str(RETRY_MS // 1000)})
+    respuesta = Response(_stream(suscripcion, perdidos), mimetype="text/event-stream", headers=CABECERAS_SSE)
+    # Si el generador nunca llega a empezar, su `finally` no corre
+    respuesta.call_on_close(suscripcion.cerrar)
+    return respuesta
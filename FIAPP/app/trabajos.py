@@ -0,0 +1,284 @@
+"""Trabajos en segundo plano sobre la cola persistente (`database/cola_trabajos.py`).
+
+Las peticiones encolan y responden enseguida; el trabajo lo hacen hilos
+trabajadores del mismo proceso o un proceso aparte que comparte la cola:
+
+    servicios.trabajos().encolar("imagen.variantes", {...}, clave="...")
+    python -m app.trabajos            # proceso trabajador (desde la carpeta FIAPP)
+
+- Cada tipo se registra con `@tarea("tipo")`; recibe los args del trabajo
+  como parámetros y su resultado (JSON) queda guardado en la cola.
+- Los errores se reintentan con espera exponencial; `ErrorPermanente` marca
+  el trabajo `fallido` sin reintentar.
+- La misma `clave` de idempotencia devuelve el trabajo ya encolado (o
+  vuelve a encolar uno `fallido`).
+- Estado: `GET /api/trabajos/<id>` (dueño) y `/admin/trabajos` (admins).
+
+Configuración (variables de entorno):
+    FIAPP_TRABAJOS_DB       archivo SQLite de la cola (instance/trabajos.sqlite3)
+    FIAPP_TRABAJOS_HILOS    hilos trabajadores en el proceso web (2; 0 = ninguno)
+    FIAPP_TRABAJOS_PLAZO    segundos antes de retomar un trabajo abandonado (300)
+    FIAPP_TRABAJOS_SONDEO   segundos entre consultas a la cola cuando está vacía (1)
+    FIAPP_TRABAJOS_RETENER  días que se guardan los trabajos terminados y sus archivos (7)
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+from app.metrics import metricas
+from database.cola_trabajos import ColaTrabajos
+
+INSTANCIA = os.path.join(os.path.dirname(__file__), '../instance')
+EXPORTACIONES = os.path.join(INSTANCIA, 'exportaciones')
+
+_TAREAS = {}
+
+
+class ErrorPermanente(Exception):
+    """El trabajo no puede salir bien reintentando (datos que ya no existen, dependencia ausente)."""
+
+
+def tarea(tipo, max_intentos=5):
+    """Decorador: registra `funcion(**args)` como el manejador de `tipo`."""
+    def registrar(funcion):
+        funcion.max_intentos = max_intentos
+        _TAREAS[tipo] = funcion
+        return funcion
+    return registrar
+
+
+def tipos():
+    return sorted(_TAREAS)
+
+
+def a_publico(trabajo):
+    """Lo que ve el dueño del trabajo en la API de estado."""
+    return {campo: trabajo[campo] for campo in (
+        "id", "tipo", "estado", "intentos", "max_intentos", "error", "resultado", "creado", "actualizado",
+        "disponible_en")}
+
+
+class Trabajadores:
+    def __init__(self, cola, hilos=2, sondeo=1.0, retener_dias=7):
+        self.cola = cola
+        self.hilos = hilos
+        self.sondeo = sondeo
+        self.retener = retener_dias * 86400
+        self._aviso = threading.Event()
+        self._parar = threading.Event()
+        self._hilos = []
+        self._en_curso = 0
+        self._lock = threading.Lock()
+        metricas.medidor('trabajos_pendientes', lambda: self.cola.contar()['pendiente'])
+        metricas.medidor('trabajos_en_curso', lambda: self._en_curso)
+
+    @classmethod
+    def desde_entorno(cls):
+        ruta = os.getenv("FIAPP_TRABAJOS_DB") or os.path.join(INSTANCIA, 'trabajos.sqlite3')
+        cola = ColaTrabajos(ruta, plazo=int(os.getenv("FIAPP_TRABAJOS_PLAZO", "300")))
+        return cls(
+            cola,
+            hilos=int(os.getenv("FIAPP_TRABAJOS_HILOS", "2")),
+            sondeo=float(os.getenv("FIAPP_TRABAJOS_SONDEO", "1")),
+            retener_dias=float(os.getenv("FIAPP_TRABAJOS_RETENER", "7")),
+        )
+
+    # --- Productor ---
+    def encolar(self, tipo, args=None, clave=None, propietario=None, retraso=0):
+        """Encola `tipo` con `args` y retorna el trabajo (el existente si `clave` ya se usó)."""
+        if tipo not in _TAREAS:
+            raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+        trabajo, creado = self.cola.encolar(tipo, args, clave, propietario, _TAREAS[tipo].max_intentos, retraso)
+        if creado:
+            metricas.incrementar('trabajos_encolados')
+            self._aviso.set()
+        return trabajo
+
+    def obtener(self, trabajo_id):
+        return self.cola.obtener(trabajo_id)
+
+    def listar(self, propietario=None, limite=20):
+        return self.cola.listar(propietario, limite)
+
+    def estadisticas(self):
+        return {'estados': self.cola.contar(), 'hilos': len(self._hilos), 'en_curso_aqui': self._en_curso,
+                'tipos': tipos()}
+
+    # --- Hilos trabajadores ---
+    def iniciar(self):
+        """Arranca los hilos (idempotente); con `hilos=0` no hace nada."""
+        with self._lock:
+            if self._hilos:
+                return self
+            for i in range(self.hilos):
+                hilo = threading.Thread(target=self._bucle, args=(f"{os.getpid()}-{i}",),
+                                        name=f"fiapp-trabajos-{i}", daemon=True)
+                hilo.start()
+                self._hilos.append(hilo)
+        if self.hilos:
+            print(f"[TRABAJOS] {self.hilos} hilos trabajadores, cola en {self.cola.ruta}")
+        return self
+
+    def detener(self, espera=5):
+        self._parar.set()
+        self._aviso.set()
+        for hilo in self._hilos:
+            hilo.join(espera)
+
+    def _bucle(self, nombre):
+        ultima_limpieza = 0.0
+        while not self._parar.is_set():
+            try:
+                if time.monotonic() - ultima_limpieza > 3600:
+                    ultima_limpieza = time.monotonic()
+                    self.limpiar()
+                trabajo = self.cola.tomar(nombre)
+                proximo = self.cola.proximo() if trabajo is None else None
+            except sqlite3.Error as e:
+                print(f"[TRABAJOS] error leyendo la cola: {e}")
+                self._parar.wait(self.sondeo)
+                continue
+            if trabajo is None:
+                self._aviso.wait(self.sondeo if proximo is None else min(self.sondeo, proximo))
+                self._aviso.clear()
+                continue
+            try:
+                self.ejecutar(trabajo, nombre)
+            except sqlite3.Error as e:
+                # No se pudo registrar el resultado (p. ej. "database is locked"): el trabajo
+                # sigue en_curso y otro trabajador lo retoma al vencer su bloqueo
+                print(f"[TRABAJOS] #{trabajo['id']} {trabajo['tipo']}: error guardando el resultado en la cola: {e}")
+                metricas.incrementar('trabajos_errores_cola')
+                self._parar.wait(self.sondeo)
+
+    def ejecutar(self, trabajo, nombre):
+        """Corre un trabajo ya tomado y registra el resultado o el fallo en la cola."""
+        with self._lock:
+            self._en_curso += 1
+        inicio = time.perf_counter()
+        try:
+            funcion = _TAREAS.get(trabajo["tipo"])
+            if funcion is None:
+                raise ErrorPermanente(f"Tipo de trabajo desconocido: {trabajo['tipo']}")
+            resultado = funcion(**trabajo["args"])
+        except ErrorPermanente as e:
+            estado = self.cola.fallar(trabajo["id"], nombre, e, reintentar=False)
+        except Exception as e:
+            estado = self.cola.fallar(trabajo["id"], nombre, f"{type(e).__name__}: {e}")
+            if estado == "pendiente":
+                metricas.incrementar('trabajos_reintentos')
+        else:
+            estado = "hecho" if self.cola.completar(trabajo["id"], nombre, resultado) else None
+        finally:
+            with self._lock:
+                self._en_curso -= 1
+        ms = (time.perf_counter() - inicio) * 1000
+        metricas.observar('trabajo_ms', ms)
+        if estado in ("hecho", "fallido"):
+            metricas.incrementar(f'trabajos_{estado}s')
+        # None: el plazo venció y otro trabajador lo retomó; su resultado es el que cuenta
+        print(f"[TRABAJOS] #{trabajo['id']} {trabajo['tipo']} intento {trabajo['intentos']}: "
+              f"{estado or 'retomado por otro'} ({ms:.0f} ms)")
+        return estado
+
+    def limpiar(self):
+        borrados = self.cola.limpiar(self.retener)
+        limite = time.time() - self.retener
+        if os.path.isdir(EXPORTACIONES):
+            for archivo in os.scandir(EXPORTACIONES):
+                if archivo.is_file() and archivo.stat().st_mtime < limite:
+                    try:
+                        os.remove(archivo.path)
+                    except OSError:
+                        pass
+        if borrados:
+            print(f"[TRABAJOS] {borrados} trabajos terminados eliminados")
+        return borrados
+
+
+# --- Tareas ---
+@tarea("imagen.variantes")
+def generar_variantes(local_id, producto_id, imagen_url):
+    """Variantes WebP de la imagen de un producto, guardadas en el producto."""
+    from app import servicios
+    imagenes = servicios.image_service()
+    if not imagenes.disponible:
+        raise ErrorPermanente("Pillow no está instalado")
+    db = servicios.view_model().db
+    if db.get_imagen_producto(local_id, producto_id) != imagen_url:
+        # El producto cambió de imagen o se borró mientras esperaba
+        return {"omitido": True}
+    variantes = imagenes.generar_variantes(imagen_url)
+    if not variantes:
+        raise RuntimeError(f"No se pudieron generar las variantes de {imagen_url}")
+    db.update_producto(local_id, producto_id, {"imagenes": variantes})
+    return {"variantes": sorted(variantes)}
+
+
+@tarea("imagen.borrar", max_intentos=3)
+def borrar_imagen(imagen_hash):
+    """Borra una imagen liberada durante su ventana de gracia si nadie volvió a usarla."""
+    from app import servicios
+    imagenes = servicios.image_service()
+    if imagenes.db.imagen_referenciada(imagen_hash):
+        return {"omitido": True}
+    # Si se volvió a subir mientras esperaba, `borrar` programa otro trabajo para la nueva ventana
+    return {"borrado": imagenes.borrar(imagen_hash)}
+
+
+@tarea("analisis.recalcular", max_intentos=2)
+def recalcular_analisis(tendero_id):
+    """Reconstruye la tabla de análisis del tendero para que la próxima consulta no espere."""
+    from app import servicios
+    try:
+        tabla = servicios.analisis().tabla(tendero_id)
+    except ImportError:
+        raise ErrorPermanente("El análisis requiere NumPy")
+    return {"skus": len(tabla)}
+
+
+@tarea("vencimientos.indexar", max_intentos=3)
+def indexar_vencimientos(local_id=None):
+    """Reconstruye el índice de vencimientos de un local (o de todos)."""
+    from app import servicios
+    from tools.indexar_vencimientos import indexar
+    return indexar(servicios.view_model().db, local_id)
+
+
+@tarea("deudas.compactar", max_intentos=3)
+def compactar_deudas(local_id=None, dias=None):
+    """Archiva el historial de deudas anterior al horizonte en resúmenes mensuales."""
+    from app import servicios
+    from tools.compactar_deudas import HORIZONTE_DIAS, compactar
+    return compactar(servicios.view_model().db, local_id, dias or HORIZONTE_DIAS)
+
+
+@tarea("exportar", max_intentos=3)
+def exportar_archivo(tipo, local_id, tendero_id, formato, nombre):
+    """Genera una exportación en disco; se descarga con `/api/trabajos/<id>/archivo`."""
+    from app import exportar, servicios
+    columnas, filas, hoja = exportar.datos_exportacion(servicios.view_model(), tipo, local_id, tendero_id)
+    archivo = f"{nombre}_{os.urandom(4).hex()}.{formato}"
+    tam = exportar.guardar(os.path.join(EXPORTACIONES, archivo), columnas, filas, formato, hoja)
+    return {"archivo": archivo, "nombre": f"{nombre}.{formato}", "bytes": tam}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Proceso trabajador de la cola de trabajos de FIAPP")
+    parser.add_argument("--hilos", type=int, default=int(os.getenv("FIAPP_TRABAJOS_HILOS", "2")) or 2)
+    args = parser.parse_args()
+    os.environ["FIAPP_TRABAJOS_HILOS"] = str(args.hilos)
+    from app import servicios
+    servicios.view_model()  # inicializa Firebase (o la base local) antes del primer trabajo
+    trabajadores = servicios.trabajos()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        trabajadores.detener()
+
+
+if __name__ == "__main__":
+    main()
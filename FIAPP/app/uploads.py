@@ -0,0 +1,148 @@
+"""Lectura en streaming de formularios multipart con una imagen.
+
+En vez de dejar que Werkzeug reciba todo el cuerpo antes de validar, el
+cuerpo se lee en bloques de tamaño fijo con `MultipartDecoder`:
+
+- el tipo de la imagen se detecta por sus "magic bytes" en el primer bloque,
+- el límite de tamaño se aplica mientras llegan los bytes,
+- los datos se escriben (y hashean) directamente en un temporal,
+- el archivo sólo toma su nombre definitivo cuando la ruta llama a
+  `subida.confirmar()`; si no, `descartar_pendientes()` borra el temporal.
+
+La memoria usada por subida es constante (~1 bloque), sin importar el tamaño.
+"""
+from flask import g
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+CHUNK_SIZE = 64 * 1024
+MAX_CAMPO = 64 * 1024   # tamaño máximo de un campo de texto
+MAX_PARTES = 50
+
+# Firma -> extensión. WebP se reconoce aparte (RIFF....WEBP).
+_FIRMAS = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+_BYTES_FIRMA = 12
+
+
+class SubidaInvalida(ValueError):
+    """El formulario o la imagen subida no son válidos (tipo, tamaño o formato)."""
+
+
+def detectar_tipo(cabecera):
+    """Retorna la extensión ('png', 'jpg', 'gif', 'webp') según los primeros bytes, o None."""
+    for firma, ext in _FIRMAS:
+        if cabecera.startswith(firma):
+            return ext
+    if cabecera[:4] == b"RIFF" and cabecera[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def leer_formulario_con_imagen(request, image_service, campo="imagen", max_bytes=5 * 1024 * 1024):
+    """Lee el formulario de `request` en streaming.
+
+    Retorna `(form, subida)`: `form` es un dict con los campos de texto y
+    `subida` una `SubidaEnCurso` sin confirmar (o None si no se envió imagen).
+    Lanza `SubidaInvalida` en cuanto detecta un problema, sin leer el resto
+    del cuerpo.
+    """
+    boundary = request.mimetype_params.get("boundary")
+    if request.mimetype != "multipart/form-data" or not boundary:
+        # Formularios sin archivo (urlencoded): el parser normal basta
+        return request.form.to_dict(), None
+
+    decoder = MultipartDecoder(boundary.encode("latin-1"), max_parts=MAX_PARTES)
+    stream = request.stream
+    form = {}
+    subida = None
+    parte = None       # "campo" | "archivo" | None (parte ignorada)
+    nombre = None
+    buffer = bytearray()
+
+    try:
+        while True:
+            try:
+                event = decoder.next_event()
+            except ValueError:
+                raise SubidaInvalida("Formulario incompleto o mal formado")
+
+            if isinstance(event, NeedData):
+                chunk = stream.read(CHUNK_SIZE)
+                decoder.receive_data(chunk or None)
+            elif isinstance(event, Field):
+                parte, nombre = "campo", event.name
+                buffer = bytearray()
+            elif isinstance(event, File):
+                buffer = bytearray()
+                if event.name == campo and event.filename and subida is None:
+                    parte = "archivo"
+                    subida = image_service.nueva_subida()
+                    _registrar_pendiente(subida)
+                else:
+                    parte = None  # input de archivo vacío u otro campo de archivo
+            elif isinstance(event, Data):
+                if parte == "campo":
+                    buffer.extend(event.data)
+                    if len(buffer) > MAX_CAMPO:
+                        raise SubidaInvalida(f"El campo '{nombre}' es demasiado largo")
+                    if not event.more_data:
+                        form[nombre] = buffer.decode("utf-8", "replace")
+                elif parte == "archivo":
+                    _escribir_imagen(subida, buffer, event.data, max_bytes)
+                    if not event.more_data:
+                        if subida.ext is None:
+                            # Archivo más corto que la firma: se valida con lo que haya
+                            _validar_firma(subida, buffer)
+                        if subida.tamano == 0:
+                            raise SubidaInvalida("La imagen está vacía")
+            elif isinstance(event, Epilogue):
+                break
+    except SubidaInvalida:
+        if subida:
+            subida.descartar()
+        raise
+
+    return form, subida
+
+
+def _escribir_imagen(subida, cabecera, data, max_bytes):
+    """Valida la firma con el primer bloque y escribe `data` respetando `max_bytes`."""
+    if subida.ext is None:
+        # Acumular sólo hasta tener bytes suficientes para la firma
+        cabecera.extend(data)
+        if len(cabecera) < _BYTES_FIRMA:
+            return
+        _validar_firma(subida, cabecera)
+        data = bytes(cabecera)
+        cabecera.clear()
+    if subida.tamano + len(data) > max_bytes:
+        raise SubidaInvalida(f"La imagen supera el máximo de {max_bytes // (1024 * 1024)}MB")
+    subida.escribir(data)
+
+
+def _validar_firma(subida, cabecera):
+    ext = detectar_tipo(bytes(cabecera[:_BYTES_FIRMA]))
+    if ext is None:
+        raise SubidaInvalida("Imagen no válida (PNG, JPG, GIF, WebP; máx 5MB)")
+    subida.ext = ext
+    if cabecera and subida.tamano == 0 and len(cabecera) < _BYTES_FIRMA:
+        subida.escribir(bytes(cabecera))
+        cabecera.clear()
+
+
+def _registrar_pendiente(subida):
+    pendientes = g.setdefault("_subidas_pendientes", [])
+    pendientes.append(subida)
+
+
+def descartar_pendientes():
+    """Borra los temporales de las subidas de esta petición que no se confirmaron."""
+    for subida in g.pop("_subidas_pendientes", []):
+        try:
+            subida.descartar()
+        except Exception as e:
+            print(f"[UPLOAD] error descartando subida: {e}")
@@ -0,0 +1,101 @@
+"""Benchmark de arranque en frío.
+
+Lanza `procesos` intérpretes nuevos (base local, sin datos) y en cada uno mide:
+
+- proceso: desde lanzar el intérprete hasta que termina `/health/ready`;
+- import app.main: importar la app (debería no tocar la base ni la IA);
+- /health/ready: crear servicios, abrir la base y calentar cliente IA y plantillas;
+- primera petición: `GET /login` después de la readiness.
+
+`benchmarks/run.py` lo corre junto al resto (con el mismo formato de
+resultados y la misma comparación contra la línea base). Solo:
+    python -m benchmarks.arranque --procesos 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+FIAPP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FASES = ("proceso", "import app.main", "/health/ready", "primera petición")
+
+
+def _hijo():
+    """Corre dentro del proceso medido; imprime los tiempos como JSON en la última línea."""
+    import contextlib
+    inicio = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        import app.main as fiapp
+        importado = time.perf_counter()
+        app = fiapp.configurar_app({"TESTING": True})
+        cliente = app.test_client()
+        listo = cliente.get("/health/ready")
+        preparado = time.perf_counter()
+        primera = cliente.get("/login")
+        fin = time.perf_counter()
+    from database.firebase_config import base_local
+    print(json.dumps({
+        "import app.main": (importado - inicio) * 1000,
+        "/health/ready": (preparado - importado) * 1000,
+        "primera petición": (fin - preparado) * 1000,
+        "lecturas": base_local().stats["reads"],
+        "escrituras": base_local().stats["writes"],
+        "errores": int(listo.status_code != 200 or primera.status_code != 200),
+    }))
+
+
+def _lanzar():
+    entorno = dict(os.environ, FIAPP_DB_BACKEND="local")
+    entorno.pop("FIAPP_DB_LOCAL_PATH", None)
+    inicio = time.perf_counter()
+    salida = subprocess.run([sys.executable, "-m", "benchmarks.arranque", "--hijo"], cwd=FIAPP, env=entorno,
+                            capture_output=True, text=True, check=True)
+    total = (time.perf_counter() - inicio) * 1000
+    medicion = json.loads(salida.stdout.strip().splitlines()[-1])
+    # El proceso termina justo después de /login: se descuenta para medir hasta "listo"
+    medicion["proceso"] = total - medicion["primera petición"]
+    return medicion
+
+
+def medir(procesos=10, rondas=3):
+    """Resultados por fase con el formato de `benchmarks.run.Medicion`."""
+    from benchmarks.run import Medicion
+    from app.metrics import percentil
+    mediciones = {fase: Medicion(f"arranque: {fase}") for fase in FASES}
+    por_ronda = max(1, procesos // rondas)
+    for i in range(procesos):
+        corrida = _lanzar()
+        for fase, medicion in mediciones.items():
+            medicion.tiempos.append(corrida[fase])
+            if fase == "/health/ready":
+                medicion.lecturas += corrida["lecturas"]
+                medicion.escrituras += corrida["escrituras"]
+            medicion.errores += corrida["errores"] if fase == "primera petición" else 0
+        if (i + 1) % por_ronda == 0 or i + 1 == procesos:
+            for medicion in mediciones.values():
+                ronda = sorted(medicion.tiempos[-por_ronda:])
+                medicion.p50_rondas.append(percentil(ronda, 50))
+    return {m.nombre: m.resultado() for m in mediciones.values()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--procesos", type=int, default=10)
+    parser.add_argument("--rondas", type=int, default=3)
+    parser.add_argument("--hijo", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.hijo:
+        _hijo()
+        return 0
+    from benchmarks.run import imprimir
+    configuracion = {"rondas": args.rondas, "iteraciones": max(1, args.procesos // args.rondas)}
+    imprimir({"configuracion": configuracion, "escenario": "arranque en frío, base local vacía",
+              "resultados": medir(args.procesos, args.rondas)})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""Prueba de carga con usuarios virtuales sobre HTTP.
+
+Cada usuario virtual es un hilo con su propia sesión (`requests.Session`)
+que recorre un flujo real de la app:
+
+  tendero: register → select_type → create_local → locales → add_producto ×P
+           → add_cliente ×C → (sumar | abono) ×O
+  cliente: register → select_type → cliente_deudas cada `--espera` segundos
+           hasta que terminan los tenderos
+
+Los tenderos agregan a su tienda clientes ya registrados por los usuarios
+virtuales de tipo cliente; si todavía no hay, registran uno ellos mismos.
+
+Por defecto arranca la app en este proceso (servidor con hilos) sobre la
+base local (`FIAPP_DB_BACKEND=local`). Con `--url` se prueba un servidor ya
+levantado, por ejemplo en otra terminal:
+    FIAPP_DB_BACKEND=local python -m app.main
+
+Perfiles de arranque (`--perfil`):
+  constante  todos los usuarios a la vez
+  rampa      se agregan de forma pareja durante `--rampa` segundos
+  escalones  `--paso` usuarios cada `--rampa` segundos
+
+Uso (desde la carpeta FIAPP):
+    python -m benchmarks.carga --tenderos 20 --clientes 40 --perfil rampa --rampa 10
+    python -m benchmarks.carga --url http://127.0.0.1:5000 --tenderos 50
+
+Reporta por paso: peticiones, errores, throughput y latencia p50/p95/p99/max.
+"""
+import argparse
+import contextlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+import requests
+
+from app.metrics import percentil
+
+CLAVE = "carga1234"
+DOMINIO = "carga.fiapp"
+
+_ENLACE_LOCAL = re.compile(r'/tendero/locales/([^/"]+)/inventario')
+
+
+class Registro:
+    """Tiempos y errores por paso, compartido por todos los hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pasos = {}  # paso -> {"tiempos": [...], "errores": n}
+        self.inicio = None
+        self.fin = None
+
+    def anotar(self, paso, ms, ok):
+        with self._lock:
+            datos = self.pasos.setdefault(paso, {"tiempos": [], "errores": 0})
+            datos["tiempos"].append(ms)
+            if not ok:
+                datos["errores"] += 1
+
+    def resumen(self):
+        duracion = max(1e-9, (self.fin or time.perf_counter()) - self.inicio)
+        filas = {}
+        for paso, datos in self.pasos.items():
+            tiempos = sorted(datos["tiempos"])
+            n = len(tiempos)
+            filas[paso] = {
+                "n": n,
+                "errores": datos["errores"],
+                "tasa_error": round(datos["errores"] / n, 4),
+                "rps": round(n / duracion, 2),
+                "p50": round(percentil(tiempos, 50), 2),
+                "p95": round(percentil(tiempos, 95), 2),
+                "p99": round(percentil(tiempos, 99), 2),
+                "max": round(tiempos[-1], 2),
+            }
+        return {"duracion_s": round(duracion, 2), "pasos": filas}
+
+
+class Escenario:
+    """Estado compartido: clientes registrados y tenderos que siguen activos."""
+
+    def __init__(self, args, url, registro):
+        self.args = args
+        self.url = url.rstrip("/")
+        self.registro = registro
+        self.etiqueta = os.urandom(2).hex()  # ids únicos aunque el servidor ya tenga datos
+        self._lock = threading.Lock()
+        self._contador = 0
+        self.clientes_registrados = []
+        self.tenderos_activos = threading.Semaphore(0)
+        self.tenderos_terminados = threading.Event()
+
+    def nuevo_id(self, prefijo):
+        with self._lock:
+            self._contador += 1
+            return f"{prefijo}{self.etiqueta}{self._contador:05d}"
+
+
+class UsuarioVirtual:
+    def __init__(self, escenario):
+        self.escenario = escenario
+        self.http = requests.Session()
+
+    def paso(self, nombre, metodo, ruta, esperado, **kw):
+        """Hace una petición y la anota; retorna la respuesta (o None si falló la conexión)."""
+        inicio = time.perf_counter()
+        try:
+            r = self.http.request(metodo, self.escenario.url + ruta, allow_redirects=False,
+                                  timeout=self.escenario.args.timeout, **kw)
+            ok = r.status_code == esperado
+        except requests.RequestException:
+            r, ok = None, False
+        self.escenario.registro.anotar(nombre, (time.perf_counter() - inicio) * 1000, ok)
+        return r if ok else None
+
+    def registrarse(self, tipo, prefijo):
+        user_id = self.escenario.nuevo_id(prefijo)
+        email = f"{user_id}@{DOMINIO}"
+        datos = {"email": email, "password": CLAVE, "password_confirm": CLAVE, "user_id": user_id}
+        if not self.paso("register", "POST", "/register", 302, data=datos):
+            return None
+        if not self.paso("select_type", "POST", "/select-type", 302, data={"tipo_usuario": tipo}):
+            return None
+        return user_id, email
+
+
+class Tendero(UsuarioVirtual):
+    def correr(self):
+        args = self.escenario.args
+        try:
+            if not self.registrarse("tendero", "vt"):
+                return
+            if not self.paso("create_local", "POST", "/tendero/locales/create", 302,
+                             data={"nombre": f"Tienda de carga {self.escenario.etiqueta}"}):
+                return
+            r = self.paso("locales", "GET", "/tendero/locales", 200)
+            encontrado = _ENLACE_LOCAL.search(r.text) if r else None
+            if not encontrado:
+                return
+            local_id = encontrado.group(1)
+
+            for p in range(args.productos):
+                self.paso("add_producto", "POST", f"/tendero/locales/{local_id}/productos/create", 302,
+                          data={"nombre": f"Producto {p}", "precio": f"{1 + p % 40}.50", "stock": str(p % 120)})
+
+            clientes = []
+            for _ in range(args.clientes_por_tienda):
+                cliente_id, email = self._cliente_disponible(clientes)
+                if cliente_id and self.paso("add_cliente", "POST", f"/tendero/locales/{local_id}/clientes/agregar", 302,
+                             data={"email": email, "deuda_inicial": "100"}):
+                    clientes.append(cliente_id)
+            if not clientes:
+                return
+
+            json_ = {"Accept": "application/json"}
+            for o in range(args.operaciones):
+                cliente_id = clientes[o % len(clientes)]
+                base = f"/tendero/locales/{local_id}/cliente/{cliente_id}"
+                if o % 2 == 0:
+                    self.paso("sumar", "POST", f"{base}/sumar", 200, data={"monto_sumar": "15"}, headers=json_)
+                else:
+                    self.paso("abono", "POST", f"{base}/abono", 200, data={"monto_pago": "10"}, headers=json_)
+        finally:
+            self.escenario.tenderos_activos.release()
+
+    def _cliente_disponible(self, ya_agregados):
+        """Un cliente registrado que no esté en la tienda; si no hay, registra uno."""
+        with self.escenario._lock:
+            for cliente in self.escenario.clientes_registrados:
+                if cliente[0] not in ya_agregados:
+                    return cliente
+        otro = UsuarioVirtual(self.escenario)
+        cliente = otro.registrarse("cliente", "vc")
+        if cliente:
+            with self.escenario._lock:
+                self.escenario.clientes_registrados.append(cliente)
+            return cliente
+        return None, None
+
+
+class Cliente(UsuarioVirtual):
+    def correr(self):
+        cliente = self.registrarse("cliente", "vc")
+        if not cliente:
+            return
+        with self.escenario._lock:
+            self.escenario.clientes_registrados.append(cliente)
+        espera = self.escenario.args.espera
+        while not self.escenario.tenderos_terminados.is_set():
+            self.paso("cliente_deudas", "GET", "/cliente/deudas", 200)
+            self.escenario.tenderos_terminados.wait(espera)
+
+
+def retrasos(perfil, usuarios, rampa, paso):
+    """Segundos de espera antes de arrancar cada usuario virtual."""
+    if perfil == "constante" or usuarios <= 1:
+        return [0.0] * usuarios
+    if perfil == "rampa":
+        return [rampa * i / usuarios for i in range(usuarios)]
+    if perfil == "escalones":
+        return [rampa * (i // max(1, paso)) for i in range(usuarios)]
+    raise ValueError(f"Perfil desconocido: {perfil}")
+
+
+@contextlib.contextmanager
+def servidor_local(puerto=0):
+    """Levanta la app con la base local en un hilo; produce la URL base."""
+    os.environ["FIAPP_DB_BACKEND"] = "local"
+    os.environ.pop("FIAPP_DB_LOCAL_PATH", None)
+    from werkzeug.serving import make_server
+    # La app registra cada petición con print() y werkzeug con logging: se
+    # descartan mientras corre la prueba (el informe se imprime después)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        from app.main import app
+        servidor = make_server("127.0.0.1", puerto, app, threaded=True)
+        hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+        hilo.start()
+        try:
+            yield f"http://127.0.0.1:{servidor.server_port}"
+        finally:
+            servidor.shutdown()
+
+
+def _intercalar(clientes, tenderos):
+    """Mezcla ambas listas de forma pareja: la rampa agrega los dos tipos en la misma proporción."""
+    posiciones = [((i + 0.5) / len(clientes), 0, u) for i, u in enumerate(clientes)]
+    posiciones += [((i + 0.5) / len(tenderos), 1, u) for i, u in enumerate(tenderos)]
+    return [u for _, _, u in sorted(posiciones, key=lambda p: p[:2])]
+
+
+def correr(args, url):
+    registro = Registro()
+    escenario = Escenario(args, url, registro)
+    usuarios = _intercalar([Cliente(escenario) for _ in range(args.clientes)],
+                           [Tendero(escenario) for _ in range(args.tenderos)])
+
+    def _arrancar(usuario, retraso):
+        time.sleep(retraso)
+        usuario.correr()
+
+    hilos = [threading.Thread(target=_arrancar, args=(u, d), daemon=True)
+             for u, d in zip(usuarios, retrasos(args.perfil, len(usuarios), args.rampa, args.paso))]
+    registro.inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for _ in range(args.tenderos):
+        escenario.tenderos_activos.acquire()
+    escenario.tenderos_terminados.set()
+    for hilo in hilos:
+        hilo.join(args.timeout)
+    registro.fin = time.perf_counter()
+    return registro.resumen()
+
+
+def imprimir(resultado, args):
+    print(f"\n{args.tenderos} tenderos + {args.clientes} clientes, perfil {args.perfil}: "
+          f"{resultado['duracion_s']}s\n")
+    print(f"{'paso':<16} {'n':>6} {'err%':>6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    total = errores = 0
+    for paso, r in resultado["pasos"].items():
+        total += r["n"]
+        errores += r["errores"]
+        print(f"{paso:<16} {r['n']:>6} {r['tasa_error'] * 100:>6.1f} {r['rps']:>8.1f} "
+              f"{r['p50']:>8.1f} {r['p95']:>8.1f} {r['p99']:>8.1f} {r['max']:>8.1f}")
+    if total:
+        print(f"\nTotal: {total} peticiones, {total / resultado['duracion_s']:.1f} req/s, "
+              f"{errores / total * 100:.2f}% errores (tiempos en ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="servidor ya levantado (por defecto se arranca uno local)")
+    parser.add_argument("--tenderos", type=int, default=10)
+    parser.add_argument("--clientes", type=int, default=20)
+    parser.add_argument("--productos", type=int, default=10, help="productos que crea cada tendero")
+    parser.add_argument("--clientes-por-tienda", type=int, default=3)
+    parser.add_argument("--operaciones", type=int, default=20, help="sumar/abono por tendero")
+    parser.add_argument("--espera", type=float, default=1.0, help="segundos entre consultas de un cliente")
+    parser.add_argument("--perfil", choices=("constante", "rampa", "escalones"), default="rampa")
+    parser.add_argument("--rampa", type=float, default=5.0, help="segundos de rampa (o entre escalones)")
+    parser.add_argument("--paso", type=int, default=5, help="usuarios por escalón")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    if args.url:
+        resultado = correr(args, args.url)
+    else:
+        with servidor_local() as url:
+            resultado = correr(args, url)
+    imprimir(resultado, args)
+    errores = sum(r["errores"] for r in resultado["pasos"].values())
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
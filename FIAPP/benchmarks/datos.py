@@ -0,0 +1,150 @@
+"""Generador de datos sintéticos para benchmarks y pruebas de carga.
+
+Con la misma semilla y tamaños produce siempre el mismo árbol (mismas
+claves, montos e historiales), así dos corridas miden lo mismo.
+
+    escenario = generar(semilla=42, tenderos=5, locales=2, productos=50, clientes=20)
+    cargar(base_local(), escenario)
+
+El árbol tiene la misma forma que el de la app:
+  usuarios/{md5(email)}   tenderos y clientes (contraseña `CLAVE`)
+  locales/{local_id}      nombre, propietario_id, productos, clientes con
+                          `deuda` e historial `deudas/{ms}_{rand}`
+  proveedores/{id}        proveedores de cada tendero
+"""
+import hashlib
+import random
+
+CLAVE = "bench1234"
+DOMINIO = "bench.fiapp"
+
+_NOMBRES_PRODUCTO = ("Arroz", "Frijol", "Aceite", "Azúcar", "Café", "Leche", "Huevos", "Pan",
+                     "Jabón", "Sal", "Harina", "Atún", "Galletas", "Refresco", "Papel")
+_NOMBRES_CLIENTE = ("Ana", "Luis", "Marta", "Jorge", "Sofía", "Pedro", "Lucía", "Carlos",
+                    "Elena", "Diego", "Rosa", "Miguel")
+
+
+def email_key(email):
+    # Misma clave que usa AuthService
+    return hashlib.md5(email.lower().encode()).hexdigest()
+
+
+def _hash_clave(clave):
+    return hashlib.sha256(clave.encode()).hexdigest()
+
+
+class Escenario:
+    """Árbol generado más los ids que necesitan los benchmarks."""
+
+    def __init__(self, arbol, tenderos, clientes, locales):
+        self.arbol = arbol
+        self.tenderos = tenderos    # [(user_id, email)]
+        self.clientes = clientes    # [(user_id, email)]
+        self.locales = locales      # [(local_id, propietario_id, [cliente_id], [producto_id])]
+
+    def resumen(self):
+        productos = sum(len(l[3]) for l in self.locales)
+        relaciones = sum(len(l[2]) for l in self.locales)
+        return (f"{len(self.tenderos)} tenderos, {len(self.locales)} locales, {productos} productos, "
+                f"{len(self.clientes)} clientes ({relaciones} cuentas en tiendas)")
+
+
+def generar(semilla=42, tenderos=5, locales=2, productos=50, clientes=20, movimientos=10,
+            proveedores=3, inicio=1_700_000_000):
+    """Genera `tenderos` × `locales` tiendas con `productos` productos y `clientes` clientes cada una.
+
+    Los clientes salen de un grupo de `2 × clientes` usuarios compartido entre
+    tiendas, así un cliente tiene cuentas en varias (como en /cliente/deudas).
+    Cada cuenta trae hasta `movimientos` cargos y abonos, en orden cronológico.
+    """
+    rnd = random.Random(semilla)
+    usuarios = {}
+    lista_tenderos = []
+    lista_clientes = []
+
+    def _usuario(user_id, tipo):
+        email = f"{user_id}@{DOMINIO}"
+        usuarios[email_key(email)] = {
+            "email": email,
+            "password_hash": _hash_clave(CLAVE),
+            "user_id": user_id,
+            "tipo_usuario": tipo,
+        }
+        return user_id, email
+
+    for t in range(tenderos):
+        lista_tenderos.append(_usuario(f"tendero{t:03d}", "tendero"))
+    for c in range(max(clientes * 2, 1)):
+        lista_clientes.append(_usuario(f"cliente{c:04d}", "cliente"))
+
+    arbol_locales = {}
+    lista_locales = []
+    for tendero_id, _ in lista_tenderos:
+        for l in range(locales):
+            local_id = f"local_{tendero_id}_{l:02d}"
+            productos_local = {}
+            for p in range(productos):
+                producto_id = f"producto_{p:05d}"
+                productos_local[producto_id] = {
+                    "nombre": f"{rnd.choice(_NOMBRES_PRODUCTO)} {p}",
+                    "precio": round(rnd.uniform(0.5, 80), 2),
+                    "stock": rnd.randint(0, 200),
+                }
+            clientes_local = {}
+            for cliente_id, email in rnd.sample(lista_clientes, min(clientes, len(lista_clientes))):
+                historial, deuda = _historial(rnd, movimientos, inicio)
+                clientes_local[cliente_id] = {
+                    "email": email,
+                    "nombre": f"{rnd.choice(_NOMBRES_CLIENTE)} {cliente_id[-4:]}",
+                    "deuda": deuda,
+                    "deudas": historial,
+                }
+            arbol_locales[local_id] = {
+                "nombre": f"Tienda {l + 1} de {tendero_id}",
+                "propietario_id": tendero_id,
+                "productos": productos_local,
+                "clientes": clientes_local,
+            }
+            lista_locales.append((local_id, tendero_id, sorted(clientes_local), sorted(productos_local)))
+
+    arbol_proveedores = {}
+    for tendero_id, _ in lista_tenderos:
+        for p in range(proveedores):
+            proveedor_id = f"proveedor_{tendero_id}_{p:02d}"
+            arbol_proveedores[proveedor_id] = {
+                "id": proveedor_id,
+                "nombre": f"Distribuidora {p + 1}",
+                "contacto": f"55{rnd.randint(10000000, 99999999)}",
+                "email": f"{proveedor_id}@{DOMINIO}",
+                "propietario_id": tendero_id,
+            }
+
+    arbol = {"usuarios": usuarios, "locales": arbol_locales, "proveedores": arbol_proveedores}
+    return Escenario(arbol, lista_tenderos, lista_clientes, lista_locales)
+
+
+def _historial(rnd, movimientos, inicio):
+    """Movimientos con el formato de `DBService._registrar_movimiento`; retorna (historial, saldo)."""
+    historial = {}
+    saldo = 0.0
+    ts = inicio + rnd.randint(0, 30 * 86400)
+    for _ in range(rnd.randint(0, movimientos)):
+        ts += rnd.randint(3600, 7 * 86400)
+        if saldo > 0 and rnd.random() < 0.4:
+            monto = -round(min(saldo, rnd.uniform(1, 50)), 2)
+            tipo = "abono"
+        else:
+            monto = round(rnd.uniform(5, 150), 2)
+            tipo = "deuda"
+        saldo = round(saldo + monto, 2)
+        detalle = {"monto": monto, "timestamp": ts, "tipo": tipo}
+        if tipo == "deuda":
+            detalle["plazo_dias"] = rnd.choice((7, 15, 30))
+        historial[f"{ts * 1000}_{rnd.getrandbits(16):04x}"] = detalle
+    return historial, saldo
+
+
+def cargar(base, escenario):
+    """Reemplaza el contenido de una `LocalDatabase` por el árbol del escenario."""
+    base.reference("/").set(escenario.arbol)
+    base.stats["reads"] = base.stats["writes"] = 0
@@ -0,0 +1,130 @@
+"""Modelos tipados (`domain/`) contra dicts crudos de la base.
+
+Sobre los productos y clientes de una tienda sintética (`benchmarks/datos.py`)
+compara:
+
+- memoria por elemento: un dict por producto/cliente contra un objeto con
+  `__slots__` (los strings se comparten en ambos casos);
+- parseo: `Coleccion.desde_dict` (una vez por lectura);
+- recorridos típicos de las rutas y del contexto IA (valor del inventario,
+  bajo stock, deudores ordenados), con `float(...)`/`int(...)` en cada
+  vuelta para los dicts y atributos ya tipados para los objetos.
+
+Uso (desde la carpeta FIAPP):
+    python -m benchmarks.modelos --productos 5000 --clientes 2000
+"""
+import argparse
+import json
+import sys
+import timeit
+import tracemalloc
+
+from benchmarks.datos import generar
+from domain.cliente import Cliente
+from domain.coleccion import Coleccion
+from domain.producto import Producto
+
+
+def _num(valor, tipo=float):
+    # Lo que hacía cada recorrido sobre los dicts
+    try:
+        return tipo(valor or 0)
+    except (TypeError, ValueError):
+        return tipo(0)
+
+
+def _memoria(construir):
+    """Bytes que quedan asignados al construir (y mantener vivo) el resultado."""
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    resultado = construir()
+    despues = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return despues - antes, resultado
+
+
+def _mejor(funcion, repeticiones, numero):
+    return min(timeit.repeat(funcion, repeat=repeticiones, number=numero)) / numero * 1000
+
+
+def correr(args):
+    escenario = generar(semilla=args.semilla, tenderos=1, locales=1, productos=args.productos,
+                        clientes=args.clientes, movimientos=args.movimientos, proveedores=0)
+    local = next(iter(escenario.arbol["locales"].values()))
+    texto = json.dumps(local)
+
+    # Cada lado parte de su propia copia (como recién leída de la base)
+    mem_dicts, crudo = _memoria(lambda: json.loads(texto))
+    productos_d = crudo["productos"]
+    clientes_d = crudo["clientes"]
+    # Sin el historial: la memoria medida es la de los objetos, no la de los movimientos
+    mem_productos, productos = _memoria(lambda: Coleccion.desde_dict(Producto, productos_d))
+    mem_clientes, clientes = _memoria(lambda: Coleccion.desde_dict(Cliente, clientes_d, historial=False))
+    mem_dict_productos, _ = _memoria(lambda: [dict(p) for p in productos_d.values()])
+    mem_dict_clientes, _ = _memoria(lambda: [{k: v for k, v in c.items() if k != "deudas"} for c in clientes_d.values()])
+
+    recorridos = [
+        ("valor del inventario",
+         lambda: sum(_num(p.get("precio")) * _num(p.get("stock"), int) for p in productos_d.values()),
+         lambda: sum(p.precio * p.stock for p in productos.values())),
+        ("bajo stock (<10)",
+         lambda: sorted((p for p in productos_d.values() if _num(p.get("stock"), int) < 10),
+                        key=lambda p: _num(p.get("stock"), int)),
+         lambda: sorted(productos.filtrar(lambda p: p.stock < 10), key=lambda p: p.stock)),
+        ("deudores ordenados",
+         lambda: sorted(((c.get("nombre"), _num(c.get("deuda"))) for c in clientes_d.values()
+                         if _num(c.get("deuda")) > 0), key=lambda x: x[1], reverse=True),
+         lambda: sorted(clientes.filtrar(lambda c: c.deuda > 0), key=lambda c: c.deuda, reverse=True)),
+        ("top 10 por precio",
+         lambda: sorted(productos_d.values(), key=lambda p: _num(p.get("precio")), reverse=True)[:10],
+         lambda: productos.ordenados("precio", descendente=True)[:10]),
+    ]
+    filas = []
+    for nombre, con_dicts, tipado in recorridos:
+        filas.append((nombre, _mejor(con_dicts, args.repeticiones, args.numero),
+                      _mejor(tipado, args.repeticiones, args.numero)))
+    parseo = (_mejor(lambda: Coleccion.desde_dict(Producto, productos_d), args.repeticiones, args.numero)
+              + _mejor(lambda: Coleccion.desde_dict(Cliente, clientes_d, historial=False), args.repeticiones, args.numero))
+    return {
+        "productos": len(productos),
+        "clientes": len(clientes),
+        "bytes_dict_producto": mem_dict_productos / len(productos),
+        "bytes_producto": mem_productos / len(productos),
+        "bytes_dict_cliente": mem_dict_clientes / len(clientes),
+        "bytes_cliente": mem_clientes / len(clientes),
+        "bytes_tienda_json": mem_dicts,
+        "parseo_ms": parseo,
+        "recorridos": filas,
+    }
+
+
+def imprimir(r):
+    print(f"\nTienda: {r['productos']} productos, {r['clientes']} clientes\n")
+    print(f"{'memoria por elemento':<28} {'dict':>10} {'tipado':>10}")
+    print(f"{'producto':<28} {r['bytes_dict_producto']:>9.0f}B {r['bytes_producto']:>9.0f}B")
+    print(f"{'cliente (sin historial)':<28} {r['bytes_dict_cliente']:>9.0f}B {r['bytes_cliente']:>9.0f}B")
+    print(f"\nParseo a objetos (una vez por lectura): {r['parseo_ms']:.3f} ms\n")
+    print(f"{'recorrido':<28} {'dict ms':>10} {'tipado ms':>10} {'x':>6}")
+    for nombre, con_dicts, tipado in r["recorridos"]:
+        print(f"{nombre:<28} {con_dicts:>10.3f} {tipado:>10.3f} {con_dicts / tipado:>6.1f}")
+    total_d = sum(f[1] for f in r["recorridos"])
+    total_t = sum(f[2] for f in r["recorridos"])
+    print(f"{'todos':<28} {total_d:>10.3f} {total_t:>10.3f} {total_d / total_t:>6.1f}")
+    if total_d > total_t:
+        print(f"\nEl parseo se recupera después de ~{r['parseo_ms'] / (total_d - total_t):.1f} pasadas por todos los recorridos.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--productos", type=int, default=2000)
+    parser.add_argument("--clientes", type=int, default=1000)
+    parser.add_argument("--movimientos", type=int, default=10)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--numero", type=int, default=20, help="llamadas por repetición")
+    imprimir(correr(parser.parse_args()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
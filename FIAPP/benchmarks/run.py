@@ -0,0 +1,290 @@
+"""Benchmarks reproducibles de FIAPP.
+
+Carga datos sintéticos (`benchmarks/datos.py`) en la base local
+(`FIAPP_DB_BACKEND=local`), mide operaciones de `UseCases` y rutas de Flask
+con el test client, y compara contra `benchmarks/baseline.json`:
+
+- latencia: p50 / p95 / p99 / max en milisegundos; para comparar se usa el
+  p50 de la mejor de varias rondas, que es estable entre corridas;
+- round trips: lecturas y escrituras a la base por operación (lo que en
+  producción serían viajes a Firebase). No dependen de la máquina, así que
+  cualquier aumento cuenta como regresión.
+
+El asistente IA se mide contra `tools/fake_ai_provider.py` (sin red), y el
+arranque en frío con procesos nuevos (`benchmarks/arranque.py`).
+
+Uso (desde la carpeta FIAPP):
+    python -m benchmarks.run                      # compara contra la línea base
+    python -m benchmarks.run --guardar-base       # actualiza la línea base
+    python -m benchmarks.run --tenderos 20 --productos 200 --iteraciones 300
+    python -m benchmarks.run --salida resultados.json --tolerancia 0.5
+
+Sale con código 1 si hay regresiones.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Regresión de latencia: p50 más de `tolerancia` (proporción) por encima de la
+# base y al menos `MIN_MS` más lento (evita ruido en operaciones de microsegundos)
+TOLERANCIA = 0.25
+MIN_MS = 0.5
+
+
+def _configurar_entorno(fake_url):
+    """Variables que la app lee al importarse: base local, proveedor falso y sin límites del chat.
+
+    Sin hilos trabajadores: los trabajos que encolan las rutas (variantes,
+    análisis) correrían en el mismo proceso y competirían con las
+    mediciones. La cola va a un archivo temporal, no a `instance/`.
+    """
+    os.environ["FIAPP_DB_BACKEND"] = "local"
+    os.environ.pop("FIAPP_DB_LOCAL_PATH", None)
+    os.environ["FIAPP_TRABAJOS_HILOS"] = "0"
+    os.environ["FIAPP_TRABAJOS_DB"] = os.path.join(tempfile.mkdtemp(prefix="fiapp-bench-"), "trabajos.sqlite3")
+    os.environ["QROQ_API_KEY"] = "benchmark"
+    os.environ["FIAPP_AI_BASE_URL"] = fake_url
+    os.environ["FIAPP_AI_RAFAGA"] = "1000000"
+    os.environ["FIAPP_AI_POR_MINUTO"] = "1000000000"
+
+
+@contextlib.contextmanager
+def _silencio():
+    """La app registra con print(); durante las mediciones se descarta."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+class Medicion:
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.tiempos = []
+        self.p50_rondas = []
+        self.lecturas = 0
+        self.escrituras = 0
+        self.errores = 0
+
+    def resultado(self):
+        from app.metrics import percentil
+        tiempos = sorted(self.tiempos)
+        n = len(tiempos)
+        return {
+            "n": n,
+            "p50": round(percentil(tiempos, 50), 3),
+            "p95": round(percentil(tiempos, 95), 3),
+            "p99": round(percentil(tiempos, 99), 3),
+            "max": round(tiempos[-1], 3),
+            "p50_min": round(min(self.p50_rondas), 3),
+            "lecturas": round(self.lecturas / n, 2),
+            "escrituras": round(self.escrituras / n, 2),
+            "errores": self.errores,
+        }
+
+
+def medir(base, nombre, funcion, iteraciones, rondas=3, calentamiento=3):
+    """Corre `funcion(i)` en `rondas` de `iteraciones` y registra tiempo y round trips de cada llamada.
+
+    `funcion` retorna False (o un status HTTP >= 400) si la operación falló.
+    Además de los percentiles de todas las llamadas se guarda `p50_min`, el
+    menor p50 entre rondas (como `timeit`): es el que se compara con la línea
+    base porque es el menos afectado por otros procesos de la máquina.
+    """
+    from app.metrics import percentil
+    medicion = Medicion(nombre)
+    i = 0
+    with _silencio():
+        for _ in range(calentamiento):
+            funcion(i)
+            i += 1
+        for _ in range(rondas):
+            ronda = []
+            for _ in range(iteraciones):
+                lecturas, escrituras = base.stats["reads"], base.stats["writes"]
+                inicio = time.perf_counter()
+                resultado = funcion(i)
+                ronda.append((time.perf_counter() - inicio) * 1000)
+                medicion.lecturas += base.stats["reads"] - lecturas
+                medicion.escrituras += base.stats["writes"] - escrituras
+                if resultado is False or (isinstance(resultado, int) and resultado >= 400):
+                    medicion.errores += 1
+                i += 1
+            medicion.tiempos += ronda
+            medicion.p50_rondas.append(percentil(sorted(ronda), 50))
+    return medicion.resultado()
+
+
+def _login(app, email, clave):
+    cliente = app.test_client()
+    r = cliente.post("/login", data={"email": email, "password": clave})
+    if r.status_code != 302:
+        raise RuntimeError(f"No se pudo iniciar sesión como {email}")
+    return cliente
+
+
+def correr(args):
+    from tools.fake_ai_provider import iniciar
+    servidor, url = iniciar(primer_token=0.0, intervalo=0.0, tokens=args.tokens_ia)
+    _configurar_entorno(url)
+
+    from benchmarks.datos import CLAVE, cargar, generar
+    from database.firebase_config import base_local
+    with _silencio():
+        import app.main as fiapp
+
+    base = base_local()
+    escenario = generar(args.semilla, args.tenderos, args.locales, args.productos, args.clientes, args.movimientos)
+    cargar(base, escenario)
+
+    casos = escenario.locales
+    cuentas = [(local_id, cliente_id) for local_id, _, clientes, _ in casos for cliente_id in clientes]
+    uc = fiapp.view_model.use_cases
+    app = fiapp.app
+
+    def caso(i):
+        return casos[i % len(casos)]
+
+    def cuenta(i):
+        return cuentas[(i * 7919) % len(cuentas)]
+
+    with _silencio():
+        sesiones = {tendero_id: _login(app, email, CLAVE) for tendero_id, email in escenario.tenderos}
+        sesiones_clientes = [_login(app, email, CLAVE) for _, email in escenario.clientes[:20]]
+    propietario = {local_id: tendero_id for local_id, tendero_id, _, _ in casos}
+
+    def ruta_tendero(i, plantilla, **kw):
+        local_id, tendero_id, _, _ = caso(i)
+        return sesiones[tendero_id].get(plantilla.format(local_id=local_id), **kw).status_code
+
+    def abono_ruta(i):
+        local_id, cliente_id = cuenta(i)
+        r = sesiones[propietario[local_id]].post(
+            f"/tendero/locales/{local_id}/cliente/{cliente_id}/abono",
+            data={"monto_pago": "1"}, headers={"Accept": "application/json"})
+        return r.status_code
+
+    def ai_chat(i, sin_cache):
+        _, tendero_id, _, _ = caso(i)
+        r = sesiones[tendero_id].post("/api/ai_chat", json={"message": "¿Quién me debe más?", "sin_cache": sin_cache})
+        return r.status_code
+
+    n = args.iteraciones
+    operaciones = [
+        ("uc.listar_locales_por_propietario", lambda i: bool(uc.listar_locales_por_propietario(caso(i)[1]))),
+        ("uc.listar_productos", lambda i: bool(uc.listar_productos(caso(i)[0]))),
+        ("uc.listar_clientes", lambda i: bool(uc.listar_clientes(caso(i)[0]))),
+        ("uc.obtener_local", lambda i: bool(uc.obtener_local(caso(i)[0]).nombre)),
+        ("uc.get_deudas_cliente", lambda i: bool(uc.get_deudas_cliente(cuenta(i)[1]))),
+        ("uc.registrar_deuda", lambda i: bool(uc.registrar_deuda(*cuenta(i), 5).get("success"))),
+        ("uc.registrar_abono", lambda i: bool(uc.registrar_abono(*cuenta(i), 1).get("success"))),
+        ("POST /login", lambda i: app.test_client().post(
+            "/login", data={"email": escenario.tenderos[i % len(escenario.tenderos)][1], "password": CLAVE}).status_code),
+        ("GET inventario", lambda i: ruta_tendero(i, "/tendero/locales/{local_id}/inventario")),
+        ("GET clientes", lambda i: ruta_tendero(i, "/tendero/locales/{local_id}/clientes")),
+        ("GET formulario producto", lambda i: ruta_tendero(i, "/tendero/locales/{local_id}/productos/create")),
+        ("POST abono", abono_ruta),
+        ("GET /cliente/deudas", lambda i: sesiones_clientes[i % len(sesiones_clientes)].get("/cliente/deudas").status_code),
+        ("POST /api/ai_chat", lambda i: ai_chat(i, True)),
+        ("POST /api/ai_chat (caché)", lambda i: ai_chat(i, False)),
+    ]
+    resultados = {}
+    for nombre, funcion in operaciones:
+        if args.solo and args.solo not in nombre:
+            continue
+        resultados[nombre] = medir(base, nombre, funcion, n, args.rondas)
+        print(f"  {nombre:<36} listo", file=sys.stderr)
+    servidor.shutdown()
+    if args.arranques and (not args.solo or args.solo in "arranque"):
+        from benchmarks.arranque import medir as medir_arranque
+        resultados.update(medir_arranque(args.arranques, args.rondas))
+        print(f"  {'arranque':<36} listo", file=sys.stderr)
+
+    configuracion = {k: getattr(args, k) for k in
+                     ("semilla", "tenderos", "locales", "productos", "clientes", "movimientos", "iteraciones", "rondas")}
+    return {"configuracion": configuracion, "escenario": escenario.resumen(), "resultados": resultados}
+
+
+def imprimir(informe):
+    configuracion = informe["configuracion"]
+    print(f"\nEscenario: {informe['escenario']}  "
+          f"({configuracion['rondas']} rondas × {configuracion['iteraciones']} iteraciones)\n")
+    print(f"{'operación':<36} {'p50':>8} {'p50min':>8} {'p95':>8} {'p99':>8} {'max':>8} {'lect':>6} {'escr':>6} {'err':>4}")
+    for nombre, r in informe["resultados"].items():
+        print(f"{nombre:<36} {r['p50']:>8.3f} {r['p50_min']:>8.3f} {r['p95']:>8.3f} {r['p99']:>8.3f} {r['max']:>8.3f} "
+              f"{r['lecturas']:>6g} {r['escrituras']:>6g} {r['errores']:>4}")
+    print("(tiempos en ms; lect/escr = round trips promedio por operación)")
+
+
+def comparar(informe, base, tolerancia=TOLERANCIA, min_ms=MIN_MS):
+    """Lista de regresiones (texto) respecto de `base`."""
+    regresiones = []
+    if base.get("configuracion") != informe["configuracion"]:
+        print("\n⚠️  La configuración difiere de la línea base; las latencias no son comparables.")
+    for nombre, actual in informe["resultados"].items():
+        anterior = base.get("resultados", {}).get(nombre)
+        if not anterior:
+            print(f"⚠️  {nombre}: sin línea base, no se compara")
+            continue
+        for campo in ("lecturas", "escrituras"):
+            if actual[campo] > anterior[campo] + 0.01:
+                regresiones.append(f"{nombre}: {campo} {anterior[campo]:g} → {actual[campo]:g}")
+        if (actual["p50_min"] > anterior["p50_min"] * (1 + tolerancia)
+                and actual["p50_min"] - anterior["p50_min"] >= min_ms):
+            regresiones.append(f"{nombre}: p50 (mejor ronda) {anterior['p50_min']:.3f}ms → {actual['p50_min']:.3f}ms")
+        if actual["errores"] > anterior.get("errores", 0):
+            regresiones.append(f"{nombre}: errores {anterior.get('errores', 0)} → {actual['errores']}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--tenderos", type=int, default=5)
+    parser.add_argument("--locales", type=int, default=2, help="locales por tendero")
+    parser.add_argument("--productos", type=int, default=50, help="productos por local")
+    parser.add_argument("--clientes", type=int, default=20, help="clientes por local")
+    parser.add_argument("--movimientos", type=int, default=10, help="máximo de movimientos por cuenta")
+    parser.add_argument("--iteraciones", type=int, default=100, help="llamadas por ronda")
+    parser.add_argument("--rondas", type=int, default=3)
+    parser.add_argument("--tokens-ia", type=int, default=20, help="fragmentos por respuesta del proveedor falso")
+    parser.add_argument("--arranques", type=int, default=9, help="procesos nuevos para medir el arranque (0 = no medir)")
+    parser.add_argument("--solo", help="mide sólo las operaciones cuyo nombre contiene este texto")
+    parser.add_argument("--salida", help="guarda el informe en este archivo JSON")
+    parser.add_argument("--base", default=BASELINE, help="archivo de línea base")
+    parser.add_argument("--guardar-base", action="store_true", help="escribe el informe como nueva línea base")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA,
+                        help="aumento tolerado del p50 de la mejor ronda (proporción, 0.25 = 25%%)")
+    args = parser.parse_args()
+
+    informe = correr(args)
+    imprimir(informe)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as fh:
+            json.dump(informe, fh, indent=2, ensure_ascii=False)
+    if args.guardar_base:
+        with open(args.base, "w", encoding="utf-8") as fh:
+            json.dump(informe, fh, indent=2, ensure_ascii=False)
+            fh.write("\n")
+        print(f"\nLínea base guardada en {args.base}")
+        return 0
+    if not os.path.exists(args.base):
+        print(f"\nSin línea base ({args.base}); usa --guardar-base para crearla.")
+        return 0
+    with open(args.base, encoding="utf-8") as fh:
+        regresiones = comparar(informe, json.load(fh), args.tolerancia)
+    if regresiones:
+        print("\n❌ Regresiones respecto de la línea base:")
+        for regresion in regresiones:
+            print(f"  - {regresion}")
+        return 1
+    print("\n✅ Sin regresiones respecto de la línea base.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-from firebase_admin import db
+from database.firebase_config import db_reference
 import hashlib
 # from database import local_auth_db  # TODO: implementar si se necesita almacenamiento local
 
@@ -15,7 +15,7 @@ class AuthService:
     def user_id_exists(self, user_id):
         """Verifica si un user_id ya existe en la BD."""
         try:
-            usuarios = db.reference("usuarios").get() or {}
+            usuarios = db_reference("usuarios").get() or {}
             for email_key, user_data in usuarios.items():
                 if user_data.get("user_id") == user_id:
                     return True
@@ -35,7 +35,7 @@ class AuthService:
         print(f"[REGISTER] email_key: {email_key}")
 
         # Verificar si ya existe el email
-        existing = db.reference(f"usuarios/{email_key}").get()
+        existing = db_reference(f"usuarios/{email_key}").get()
 
         if existing:
             print(f"[REGISTER] Email ya existe")
@@ -56,7 +56,7 @@ class AuthService:
             "tipo_usuario": None  # Se asigna después
         }
         print(f"[REGISTER] Guardando: {data}")
-        db.reference(f"usuarios/{email_key}").set(data)
+        db_reference(f"usuarios/{email_key}").set(data)
 
         print(f"[REGISTER] ✓ Registro exitoso")
         return user_id
@@ -73,7 +73,7 @@ class AuthService:
             email_key = hashlib.md5(email.lower().encode()).hexdigest()
             print(f"[LOGIN] Buscando usuario: {email_key}")
 
-            user_data = db.reference(f"usuarios/{email_key}").get()
+            user_data = db_reference(f"usuarios/{email_key}").get()
 
             print(f"[LOGIN] user_data: {user_data}")
             
@@ -99,21 +99,21 @@ class AuthService:
     def get_user_by_email(self, email):
         """Obtiene usuario por email."""
         email_key = hashlib.md5(email.lower().encode()).hexdigest()
-        return db.reference(f"usuarios/{email_key}").get()
+        return db_reference(f"usuarios/{email_key}").get()
     
     def set_user_type(self, email, tipo_usuario):
         """Asigna el tipo de usuario (tendero/cliente) después del registro."""
         if tipo_usuario not in ('tendero', 'cliente'):
             raise ValueError("tipo_usuario debe ser 'tendero' o 'cliente'")
         email_key = hashlib.md5(email.lower().encode()).hexdigest()
-        db.reference(f"usuarios/{email_key}").update({"tipo_usuario": tipo_usuario})
+        db_reference(f"usuarios/{email_key}").update({"tipo_usuario": tipo_usuario})
         print(f"[AUTH] Tipo de usuario asignado: {email} -> {tipo_usuario}")
 
     def list_users(self):
         """Lista todos los usuarios."""
-        return db.reference("usuarios").get() or {}
+        return db_reference("usuarios").get() or {}
 
     def delete_user(self, email):
         """Elimina usuario."""
         email_key = hashlib.md5(email.lower().encode()).hexdigest()
-        db.reference(f"usuarios/{email_key}").delete()
+        db_reference(f"usuarios/{email_key}").delete()
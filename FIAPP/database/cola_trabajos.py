@@ -0,0 +1,198 @@
+"""Cola persistente de trabajos en segundo plano (SQLite, en disco local).
+
+Cada trabajo es una fila de `trabajos`:
+
+    id, tipo, clave (idempotencia, única), args (JSON), propietario,
+    estado: pendiente | en_curso | hecho | fallido,
+    intentos, max_intentos, disponible_en (no antes de), bloqueado_hasta,
+    trabajador, error, resultado (JSON), creado, actualizado
+
+- Tomar un trabajo es atómico (`BEGIN IMMEDIATE`): varios hilos o procesos
+  pueden compartir el archivo sin tomar dos veces el mismo.
+- Un trabajo `en_curso` queda bloqueado por `plazo` segundos; si el
+  trabajador muere sin terminarlo, otro lo retoma cuando vence el bloqueo.
+- Los fallos se reintentan con espera exponencial (con jitter) hasta
+  `max_intentos`; después el trabajo queda `fallido` con su último error.
+- `encolar` con una `clave` ya usada devuelve el trabajo existente en vez
+  de crear otro; si ese trabajo quedó `fallido`, lo vuelve a encolar.
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+ESTADOS = ("pendiente", "en_curso", "hecho", "fallido")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tipo TEXT NOT NULL,
+    clave TEXT UNIQUE,
+    args TEXT NOT NULL,
+    propietario TEXT,
+    estado TEXT NOT NULL DEFAULT 'pendiente',
+    intentos INTEGER NOT NULL DEFAULT 0,
+    max_intentos INTEGER NOT NULL,
+    disponible_en REAL NOT NULL,
+    bloqueado_hasta REAL,
+    trabajador TEXT,
+    error TEXT,
+    resultado TEXT,
+    creado REAL NOT NULL,
+    actualizado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trabajos_listos ON trabajos (estado, disponible_en);
+CREATE INDEX IF NOT EXISTS trabajos_propietario ON trabajos (propietario, id);
+"""
+
+
+def _fila(fila):
+    if fila is None:
+        return None
+    trabajo = dict(fila)
+    trabajo["args"] = json.loads(trabajo["args"])
+    trabajo["resultado"] = json.loads(trabajo["resultado"]) if trabajo["resultado"] else None
+    return trabajo
+
+
+class ColaTrabajos:
+    def __init__(self, ruta, plazo=300, espera_base=2.0, espera_max=600.0):
+        self.ruta = ruta
+        self.plazo = plazo
+        self.espera_base = espera_base
+        self.espera_max = espera_max
+        self._local = threading.local()
+        if ruta != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        self._conexion().executescript(_ESQUEMA)
+
+    def _conexion(self):
+        # Una conexión por hilo (sqlite3 no comparte conexiones entre hilos)
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            conexion.row_factory = sqlite3.Row
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    @contextmanager
+    def _transaccion(self):
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            yield conexion
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        conexion.execute("COMMIT")
+
+    # --- Productor ---
+    def encolar(self, tipo, args=None, clave=None, propietario=None, max_intentos=5, retraso=0):
+        """Agrega un trabajo. Retorna (trabajo, creado); con `clave` repetida, el que ya existía.
+
+        Un trabajo `fallido` con la misma clave vuelve a `pendiente` con los
+        nuevos `args` y los intentos en cero (cuenta como creado).
+        """
+        ahora = time.time()
+        with self._transaccion() as c:
+            if clave is not None:
+                existente = c.execute("SELECT * FROM trabajos WHERE clave = ?", (clave,)).fetchone()
+                if existente is not None and existente["estado"] != "fallido":
+                    return _fila(existente), False
+                if existente is not None:
+                    c.execute(
+                        "UPDATE trabajos SET estado = 'pendiente', args = ?, propietario = COALESCE(?, propietario), intentos = 0,"
+                        " max_intentos = ?, disponible_en = ?, bloqueado_hasta = NULL, trabajador = NULL,"
+                        " error = NULL, resultado = NULL, actualizado = ? WHERE id = ?",
+                        (json.dumps(args or {}), propietario, max_intentos, ahora + retraso, ahora, existente["id"]))
+                    return _fila(c.execute("SELECT * FROM trabajos WHERE id = ?", (existente["id"],)).fetchone()), True
+            cursor = c.execute(
+                "INSERT INTO trabajos (tipo, clave, args, propietario, max_intentos, disponible_en, creado, actualizado)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (tipo, clave, json.dumps(args or {}), propietario, max_intentos, ahora + retraso, ahora, ahora))
+            return _fila(c.execute("SELECT * FROM trabajos WHERE id = ?", (cursor.lastrowid,)).fetchone()), True
+
+    # --- Consumidor ---
+    def tomar(self, trabajador):
+        """Toma el próximo trabajo listo (o uno cuyo bloqueo venció) y lo marca `en_curso`."""
+        ahora = time.time()
+        with self._transaccion() as c:
+            fila = c.execute(
+                "SELECT id FROM trabajos WHERE estado = 'pendiente' AND disponible_en <= ?"
+                " ORDER BY disponible_en, id LIMIT 1", (ahora,)).fetchone()
+            if fila is None:
+                fila = c.execute(
+                    "SELECT id FROM trabajos WHERE estado = 'en_curso' AND bloqueado_hasta < ?"
+                    " ORDER BY bloqueado_hasta LIMIT 1", (ahora,)).fetchone()
+            if fila is None:
+                return None
+            c.execute(
+                "UPDATE trabajos SET estado = 'en_curso', intentos = intentos + 1, bloqueado_hasta = ?,"
+                " trabajador = ?, actualizado = ? WHERE id = ?",
+                (ahora + self.plazo, trabajador, ahora, fila["id"]))
+            return _fila(c.execute("SELECT * FROM trabajos WHERE id = ?", (fila["id"],)).fetchone())
+
+    def completar(self, trabajo_id, trabajador, resultado=None):
+        """Marca el trabajo `hecho` (sólo si sigue en manos de `trabajador`)."""
+        with self._transaccion() as c:
+            return c.execute(
+                "UPDATE trabajos SET estado = 'hecho', resultado = ?, error = NULL, bloqueado_hasta = NULL,"
+                " actualizado = ? WHERE id = ? AND trabajador = ? AND estado = 'en_curso'",
+                (json.dumps(resultado), time.time(), trabajo_id, trabajador)).rowcount == 1
+
+    def fallar(self, trabajo_id, trabajador, error, reintentar=True):
+        """Registra un fallo: vuelve a `pendiente` con espera exponencial o queda `fallido`.
+
+        Retorna el nuevo estado (None si el trabajo ya no era de `trabajador`).
+        """
+        ahora = time.time()
+        with self._transaccion() as c:
+            fila = c.execute("SELECT intentos, max_intentos FROM trabajos WHERE id = ? AND trabajador = ?"
+                             " AND estado = 'en_curso'", (trabajo_id, trabajador)).fetchone()
+            if fila is None:
+                return None
+            if reintentar and fila["intentos"] < fila["max_intentos"]:
+                espera = min(self.espera_max, self.espera_base * 2 ** (fila["intentos"] - 1))
+                estado, disponible = "pendiente", ahora + espera * random.uniform(0.5, 1.0)
+            else:
+                estado, disponible = "fallido", ahora
+            c.execute("UPDATE trabajos SET estado = ?, error = ?, disponible_en = ?, bloqueado_hasta = NULL,"
+                      " actualizado = ? WHERE id = ?", (estado, str(error)[:2000], disponible, ahora, trabajo_id))
+            return estado
+
+    # --- Consultas ---
+    def obtener(self, trabajo_id):
+        return _fila(self._conexion().execute("SELECT * FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone())
+
+    def listar(self, propietario=None, limite=20):
+        """Últimos trabajos (de un propietario, o de todos)."""
+        if propietario is None:
+            filas = self._conexion().execute("SELECT * FROM trabajos ORDER BY id DESC LIMIT ?", (limite,))
+        else:
+            filas = self._conexion().execute(
+                "SELECT * FROM trabajos WHERE propietario = ? ORDER BY id DESC LIMIT ?", (propietario, limite))
+        return [_fila(f) for f in filas.fetchall()]
+
+    def contar(self):
+        """{estado: cantidad} para todos los estados."""
+        conteo = dict.fromkeys(ESTADOS, 0)
+        for fila in self._conexion().execute("SELECT estado, COUNT(*) AS n FROM trabajos GROUP BY estado"):
+            conteo[fila["estado"]] = fila["n"]
+        return conteo
+
+    def proximo(self):
+        """Segundos hasta el próximo trabajo pendiente (None si no hay)."""
+        fila = self._conexion().execute(
+            "SELECT MIN(disponible_en) AS t FROM trabajos WHERE estado = 'pendiente'").fetchone()
+        return None if fila["t"] is None else max(0.0, fila["t"] - time.time())
+
+    def limpiar(self, antiguedad=7 * 86400):
+        """Borra los trabajos terminados hace más de `antiguedad` segundos (libera sus claves)."""
+        with self._transaccion() as c:
+            return c.execute("DELETE FROM trabajos WHERE estado IN ('hecho', 'fallido') AND actualizado < ?",
+                             (time.time() - antiguedad,)).rowcount
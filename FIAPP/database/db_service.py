@@ -1,13 +1,22 @@
-from firebase_admin import db
+import os
+import time
+
+from database import event_bus
+from database.firebase_config import db_reference
 
 
 class DBService:
     """
     CRUD general para locales, productos, clientes y deudas.
+
+    Cada escritura de productos, clientes o deudas publica un evento en
+    `eventos` (canales `local:{local_id}` y `cliente:{cliente_id}`) que las
+    páginas abiertas reciben por SSE.
     """
 
-    def __init__(self):
-        self.ref = db.reference("/")
+    def __init__(self, eventos=None):
+        self.ref = db_reference("/")
+        self.eventos = eventos or event_bus.bus
     @property
     def key(self):
         return self.ref.key
@@ -19,20 +28,79 @@ class DBService:
         # Crear referencia directamente con el ID proporcionado
         new_ref = self.ref.child(f"locales/{local_id}/productos/{producto_id}")
         new_ref.set(producto_data)
+        self._publicar_local(local_id, "producto", {"producto_id": producto_id, **producto_data})
         return producto_id
 
     def get_productos(self, local_id):
         return self.ref.child(f"locales/{local_id}/productos").get() or {}
 
+    def get_producto(self, local_id, producto_id):
+        return self.ref.child(f"locales/{local_id}/productos/{producto_id}").get()
+
+    def get_productos_pagina(self, local_id, limite, cursor=None):
+        return self._pagina(f"locales/{local_id}/productos", limite, cursor)
+
+    def get_producto_ids(self, local_id):
+        """Sólo las claves de los productos (lectura `shallow`, sin los datos)."""
+        return set((self.ref.child(f"locales/{local_id}/productos").get(shallow=True) or {}).keys())
+
+    def update_productos_lote(self, local_id, cambios):
+        """Actualiza varios productos en una sola escritura multi-ruta.
+
+        `cambios` = {producto_id: {campo: valor}}; un valor None borra el campo.
+        """
+        data = {}
+        for producto_id, campos in cambios.items():
+            for campo, valor in campos.items():
+                data[f"{producto_id}/{campo}"] = valor
+        if data:
+            self.ref.child(f"locales/{local_id}/productos").update(data)
+            for producto_id, campos in cambios.items():
+                self._publicar_local(local_id, "producto", {"producto_id": producto_id, **campos})
+
     def update_producto(self, local_id, producto_id, data):
         self.ref.child(f"locales/{local_id}/productos/{producto_id}").update(data)
+        self._publicar_local(local_id, "producto", {"producto_id": producto_id, **data})
 
     def delete_producto(self, local_id, producto_id):
         self.ref.child(f"locales/{local_id}/productos/{producto_id}").delete()
+        self._publicar_local(local_id, "producto_eliminado", {"producto_id": producto_id})
+
+    def get_imagen_producto(self, local_id, producto_id):
+        """Lee sólo el `imagen_url` de un producto (sin traer el resto del nodo)."""
+        return self.ref.child(f"locales/{local_id}/productos/{producto_id}/imagen_url").get()
+
+    # --- Imágenes (conteo de referencias por contenido) ---
+    def retener_imagen(self, imagen_hash, local_id, producto_id):
+        self.ref.child(f"imagenes_refs/{imagen_hash}/{local_id}/{producto_id}").set(True)
+
+    def liberar_imagen(self, imagen_hash, local_id, producto_id):
+        """Quita la referencia de un producto y retorna cuántas quedan para esa imagen."""
+        def _quitar(refs):
+            refs = refs or {}
+            productos = refs.get(local_id) or {}
+            productos.pop(producto_id, None)
+            if productos:
+                refs[local_id] = productos
+            else:
+                refs.pop(local_id, None)
+            return refs or None
+
+        restantes = self.ref.child(f"imagenes_refs/{imagen_hash}").transaction(_quitar) or {}
+        return sum(len(productos) for productos in restantes.values())
+
+    def imagen_referenciada(self, imagen_hash):
+        """True si algún producto usa la imagen (lectura shallow: sólo los locales)."""
+        return bool(self.ref.child(f"imagenes_refs/{imagen_hash}").get(shallow=True))
+
+    def get_imagenes_refs(self):
+        return self.ref.child("imagenes_refs").get() or {}
 
     # --- Clientes ---
     def add_cliente_a_local(self, local_id, cliente_id, cliente_data):
         self.ref.child(f"locales/{local_id}/clientes/{cliente_id}").set(cliente_data)
+        resumen = {k: v for k, v in cliente_data.items() if k != "deudas"}
+        self._publicar_cliente(local_id, cliente_id, "cliente", resumen)
 
     def get_clientes(self, local_id):
         return self.ref.child(f"locales/{local_id}/clientes").get() or {}
@@ -40,48 +108,302 @@ class DBService:
     def get_cliente(self, local_id, cliente_id):
         return self.ref.child(f"locales/{local_id}/clientes/{cliente_id}").get()
 
+    def get_cliente_resumen(self, local_id, cliente_id):
+        """Campos simples del cliente sin su historial (`deudas` llega como True)."""
+        return self.ref.child(f"locales/{local_id}/clientes/{cliente_id}").get(shallow=True)
+
+    def get_clientes_pagina(self, local_id, limite, cursor=None):
+        return self._pagina(f"locales/{local_id}/clientes", limite, cursor)
+
+    def delete_cliente(self, local_id, cliente_id):
+        pendientes = self.ref.child(f"locales/{local_id}/clientes/{cliente_id}/vencimientos").get(shallow=True) or {}
+        # La cuenta, su archivo y sus entradas en el índice de vencimientos, en una sola escritura
+        rutas = {f"vencimientos/{local_id}/{clave}": None for clave in pendientes}
+        rutas[f"locales/{local_id}/clientes/{cliente_id}"] = None
+        rutas[f"archivo_deudas/{local_id}/{cliente_id}"] = None
+        self.ref.update(rutas)
+        self._publicar_cliente(local_id, cliente_id, "cliente_eliminado", {})
+
     # --- Deudas ---
+    # Cada cambio del saldo deja un movimiento en 'deudas/<timestamp_ms>_<rand>':
+    #   {"monto": +cargo / -pago, "timestamp": int, "tipo": "deuda"|"abono"|"cancelacion", "plazo_dias"?}
+    # (los registros antiguos no tienen 'tipo' y son cargos; los meses compactados
+    # quedan como un movimiento "resumen", ver Archivo de movimientos).
+    # Las deudas con plazo además entran al índice de vencimientos (ver abajo).
     def registrar_deuda(self, local_id, cliente_id, monto, plazo_dias=None):
         """Registra una deuda para un cliente.
 
-        - Actualiza el acumulado numérico en 'deuda'.
-        - Añade un registro individual bajo 'deudas/<timestamp>' con monto y plazo (si se proporciona).
+        - Suma `monto` al acumulado numérico en 'deuda' (en una transacción).
+        - Añade un movimiento con monto y plazo (si se proporciona) y, con
+          plazo, su entrada en `vencimientos/` (en la misma escritura).
+        Retorna (nueva_deuda, (clave, movimiento)).
+        """
+        def _sumar(actual):
+            try:
+                return float(actual or 0) + float(monto)
+            except (TypeError, ValueError):
+                # Fallback si hay datos corruptos
+                return float(monto)
+
+        # `plazo_dias` ya validado por quien llama (entero > 0); se convierte antes de tocar la deuda
+        extra = {} if plazo_dias is None else {"plazo_dias": int(plazo_dias)}
+        nueva_total = self.ref.child(f"locales/{local_id}/clientes/{cliente_id}/deuda").transaction(_sumar)
+        movimiento = self._registrar_movimiento(local_id, cliente_id, float(monto), "deuda", **extra)
+        self._publicar_deuda(local_id, cliente_id, nueva_total, movimiento)
+        return nueva_total, movimiento
+
+    def abonar_deuda(self, local_id, cliente_id, monto, con_vencimientos=True):
+        """Resta `monto` de la deuda en una transacción (nunca queda negativa).
+
+        El movimiento registra lo realmente descontado, que también se descuenta
+        de sus vencimientos pendientes (`con_vencimientos=False` cuando ya se
+        sabe que el cliente no tiene y se evita esa lectura).
+        Retorna (nueva_deuda, (clave, movimiento)).
         """
-        # Actualizar suma total de deuda
-        deuda_ref = self.ref.child(f"locales/{local_id}/clientes/{cliente_id}/deuda")
-        deuda_actual = deuda_ref.get() or 0
-        try:
-            nueva_total = float(deuda_actual) + float(monto)
-        except Exception:
-            # Fallback si hay datos corruptos
-            nueva_total = float(monto)
-        deuda_ref.set(nueva_total)
-
-        # Agregar registro detallado de la deuda
-        import time
-        timestamp = str(int(time.time()))
-        detalle = {"monto": float(monto), "timestamp": int(timestamp)}
-        if plazo_dias is not None:
+        anterior = {}
+
+        def _restar(actual):
             try:
-                detalle["plazo_dias"] = int(plazo_dias)
-            except Exception:
-                detalle["plazo_dias"] = plazo_dias
+                actual = float(actual or 0)
+            except (TypeError, ValueError):
+                actual = 0.0
+            anterior["deuda"] = actual
+            return max(0.0, actual - float(monto))
+
+        nueva = self.ref.child(f"locales/{local_id}/clientes/{cliente_id}/deuda").transaction(_restar)
+        aplicado = round(anterior.get("deuda", 0.0) - nueva, 2)
+        movimiento = self._registrar_movimiento(local_id, cliente_id, -aplicado, "abono") if aplicado else None
+        if aplicado and con_vencimientos:
+            self._liquidar_vencimientos(local_id, cliente_id, pago=aplicado)
+        self._publicar_deuda(local_id, cliente_id, nueva, movimiento)
+        return nueva, movimiento
+
+    def cancelar_deuda(self, local_id, cliente_id):
+        """Pone la deuda en 0 y registra la cancelación. Retorna (0, (clave, movimiento))."""
+        anterior = {}
+
+        def _cancelar(actual):
+            try:
+                anterior["deuda"] = float(actual or 0)
+            except (TypeError, ValueError):
+                anterior["deuda"] = 0.0
+            return 0
+
+        self.ref.child(f"locales/{local_id}/clientes/{cliente_id}/deuda").transaction(_cancelar)
+        saldo = anterior.get("deuda", 0.0)
+        movimiento = self._registrar_movimiento(local_id, cliente_id, -saldo, "cancelacion") if saldo else None
+        self._liquidar_vencimientos(local_id, cliente_id, saldo=0)
+        self._publicar_deuda(local_id, cliente_id, 0, movimiento)
+        return 0, movimiento
+
+    def set_deuda(self, local_id, cliente_id, deuda):
+        """Fija el total de la deuda (sin registrar movimiento)."""
+        self.ref.child(f"locales/{local_id}/clientes/{cliente_id}/deuda").set(deuda)
+        # Lo que ya no se debe se descuenta de lo que vence primero
+        self._liquidar_vencimientos(local_id, cliente_id, saldo=float(deuda))
+        self._publicar_deuda(local_id, cliente_id, deuda, None)
+
+    def _registrar_movimiento(self, local_id, cliente_id, monto, tipo, **extra):
+        # Clave en milisegundos (ordena después de las claves antiguas en segundos)
+        # con sufijo aleatorio: dos movimientos simultáneos no se pisan
+        ahora = time.time()
+        clave = f"{int(ahora * 1000)}_{os.urandom(2).hex()}"
+        detalle = {"monto": monto, "timestamp": int(ahora), "tipo": tipo, **extra}
+        rutas = {f"locales/{local_id}/clientes/{cliente_id}/deudas/{clave}": detalle}
+        plazo = extra.get("plazo_dias")
+        if tipo == "deuda" and monto > 0 and isinstance(plazo, int) and plazo > 0:
+            vence = int(ahora) + plazo * 86400
+            indice = self.clave_vencimiento(vence, cliente_id, clave)
+            rutas[f"vencimientos/{local_id}/{indice}"] = {
+                "cliente_id": cliente_id, "nombre": self.get_nombre_cliente(local_id, cliente_id),
+                "movimiento": clave, "monto": monto, "pendiente": monto, "vence": vence,
+            }
+            rutas[f"locales/{local_id}/clientes/{cliente_id}/vencimientos/{indice}"] = monto
+        self.ref.update(rutas)
+        return clave, detalle
+
+    def get_nombre_cliente(self, local_id, cliente_id):
+        """Nombre (o email) del cliente leyendo sólo esas hojas, no la cuenta."""
+        cliente = f"locales/{local_id}/clientes/{cliente_id}"
+        return self.ref.child(f"{cliente}/nombre").get() or self.ref.child(f"{cliente}/email").get() or cliente_id
+
+    def get_deudas(self, local_id, cliente_id):
+        return self.ref.child(f"locales/{local_id}/clientes/{cliente_id}/deudas").get() or {}
+
+    def get_deudas_pagina(self, local_id, cliente_id, limite, cursor=None):
+        return self._pagina(f"locales/{local_id}/clientes/{cliente_id}/deudas", limite, cursor)
+
+    # --- Archivo de movimientos ---
+    # La compactación (`tools/compactar_deudas.py`) saca del historial los
+    # movimientos de los meses anteriores al horizonte y los guarda en
+    #   archivo_deudas/{local_id}/{cliente_id}/{AAAA-MM}/{clave}: movimiento
+    # En `deudas/` queda un resumen por mes con el mismo neto:
+    #   {inicio_mes_ms}_resumen: {"monto": cargos - abonos, "timestamp": inicio_mes, "tipo": "resumen",
+    #                             "mes": "AAAA-MM", "cargos", "abonos", "movimientos"}
+    # así la suma de `monto` del historial (el saldo) no cambia.
+    def get_meses_archivados(self, local_id, cliente_id):
+        """Meses ("AAAA-MM") con movimientos archivados, en orden."""
+        return sorted(self.ref.child(f"archivo_deudas/{local_id}/{cliente_id}").get(shallow=True) or {})
+
+    def get_archivo_deudas(self, local_id, cliente_id, mes):
+        return self.ref.child(f"archivo_deudas/{local_id}/{cliente_id}/{mes}").get() or {}
+
+    def archivar_movimientos(self, local_id, cliente_id, archivados, resumenes):
+        """Mueve `archivados` ({mes: {clave: movimiento}}) al archivo y guarda los `resumenes`
+        ({clave: resumen}) en el historial, en una sola escritura."""
+        historial = f"locales/{local_id}/clientes/{cliente_id}/deudas"
+        rutas = {}
+        for mes, movimientos in archivados.items():
+            for clave, movimiento in movimientos.items():
+                rutas[f"archivo_deudas/{local_id}/{cliente_id}/{mes}/{clave}"] = movimiento
+                rutas[f"{historial}/{clave}"] = None
+        for clave, resumen in resumenes.items():
+            rutas[f"{historial}/{clave}"] = resumen
+        if rutas:
+            self.ref.update(rutas)
+
+    # --- Vencimientos ---
+    # Índice de las deudas con plazo de cada local, ordenado por vencimiento:
+    #   vencimientos/{local_id}/{vence:010d}_{cliente_id}_{rand}:
+    #       {"cliente_id", "nombre", "movimiento", "monto", "pendiente", "vence"}
+    # (el nombre del cliente va copiado para que el reporte no lea cada cuenta).
+    # La cuenta del cliente guarda `vencimientos/{clave}: pendiente` para
+    # liquidar sin recorrer el índice. Los abonos descuentan primero lo que
+    # vence antes; una entrada saldada se borra. Las deudas sin plazo no vencen.
+    @staticmethod
+    def clave_vencimiento(vence, cliente_id, movimiento):
+        return f"{int(vence):010d}_{cliente_id}_{movimiento.rsplit('_', 1)[-1]}"
+
+    @staticmethod
+    def repartir_pago(pendientes, monto):
+        """Descuenta `monto` de `pendientes` ({clave: pendiente}) en orden de vencimiento.
+
+        Retorna {clave: nuevo_pendiente} de las entradas que cambian (0 = saldada).
+        """
+        cambios = {}
+        restante = round(float(monto), 2)
+        for clave in sorted(pendientes):
+            if restante <= 0:
+                break
+            actual = float(pendientes[clave] or 0)
+            pagado = min(actual, restante)
+            cambios[clave] = round(actual - pagado, 2)
+            restante = round(restante - pagado, 2)
+        return cambios
+
+    def rutas_vencimientos(self, local_id, cliente_id, cambios):
+        """Escrituras (multi-ruta) que dejan el índice y la cuenta con los pendientes de `cambios`."""
+        rutas = {}
+        for clave, pendiente in cambios.items():
+            cuenta = f"locales/{local_id}/clientes/{cliente_id}/vencimientos/{clave}"
+            if pendiente > 0:
+                rutas[f"vencimientos/{local_id}/{clave}/pendiente"] = pendiente
+                rutas[cuenta] = pendiente
+            else:
+                rutas[f"vencimientos/{local_id}/{clave}"] = None
+                rutas[cuenta] = None
+        return rutas
+
+    def _liquidar_vencimientos(self, local_id, cliente_id, pago=None, saldo=None):
+        """Descuenta un `pago` de los vencimientos del cliente, o los ajusta a un `saldo` total."""
+        pendientes = self.ref.child(f"locales/{local_id}/clientes/{cliente_id}/vencimientos").get() or {}
+        if not pendientes:
+            return
+        if saldo is not None:
+            pago = sum(float(v or 0) for v in pendientes.values()) - saldo
+        if not pago or pago <= 0:
+            return
+        cambios = self.repartir_pago(pendientes, pago)
+        if cambios:
+            self.ref.update(self.rutas_vencimientos(local_id, cliente_id, cambios))
+
+    def get_vencimientos(self, local_id, desde=None, hasta=None):
+        """Entradas del índice que vencen entre `desde` y `hasta` (timestamps, inclusive), en orden."""
+        query = self.ref.child(f"vencimientos/{local_id}").order_by_key()
+        if desde is not None:
+            query = query.start_at(f"{int(desde):010d}")
+        if hasta is not None:
+            query = query.end_at(f"{int(hasta):010d}\uf8ff")
+        return query.get() or {}
+
+    # --- Eventos ---
+    def version_local(self, local_id):
+        """Versión en memoria de los datos de un local (cambia con cada escritura de este proceso)."""
+        return self.eventos.version(f"local:{local_id}")
+
+    def cambios_local(self, local_id, version):
+        """Eventos del local posteriores a `version` (None si ya no se pueden reponer)."""
+        return self.eventos.eventos_desde(f"local:{local_id}", version)
+
+    def version_locales(self):
+        """Versión del conjunto de locales (cambia al crear, renombrar o borrar uno)."""
+        return self.eventos.version("locales")
+
+    def ultima_version(self):
+        """Número del último evento de este proceso: marca para saber si algo cambió después."""
+        return self.eventos.ultima_version()
+
+    def _publicar_local(self, local_id, tipo, data):
+        self.eventos.publicar(f"local:{local_id}", tipo, {"local_id": local_id, **data})
+        if tipo.startswith("local"):
+            self.eventos.publicar("locales", tipo, {"local_id": local_id, **data})
+
+    def _publicar_cliente(self, local_id, cliente_id, tipo, data):
+        """Publica en el canal de la tienda y en el del propio cliente."""
+        data = {"local_id": local_id, "cliente_id": cliente_id, **data}
+        self.eventos.publicar(f"local:{local_id}", tipo, data)
+        self.eventos.publicar(f"cliente:{cliente_id}", tipo, data)
+
+    def _publicar_deuda(self, local_id, cliente_id, deuda, movimiento):
+        ultimo = None
+        if movimiento:
+            clave, detalle = movimiento
+            ultimo = {"id": clave, **detalle}
+        self._publicar_cliente(local_id, cliente_id, "deuda", {"deuda": deuda, "ultimo_movimiento": ultimo})
 
-        detalles_ref = self.ref.child(f"locales/{local_id}/clientes/{cliente_id}/deudas")
-        detalles_ref.child(timestamp).set(detalle)
-   
     # --- Locales ---
     def add_local(self, local_id, local_data):
         self.ref.child(f"locales/{local_id}").set(local_data)
+        self._publicar_local(local_id, "local", dict(local_data))
     
     def get_local(self, local_id):
         return self.ref.child(f"locales/{local_id}").get()
+
+    def get_local_meta(self, local_id):
+        """Sólo los campos simples del local (nombre, propietario_id), sin productos ni clientes."""
+        datos = self.ref.child(f"locales/{local_id}").get(shallow=True)
+        if not isinstance(datos, dict):
+            return None
+        # En una lectura shallow los nodos hijos llegan como `True`
+        return {k: v for k, v in datos.items() if k not in ("productos", "clientes")}
     
     def update_local(self, local_id, data):
         self.ref.child(f"locales/{local_id}").update(data)
+        self._publicar_local(local_id, "local", dict(data))
 
     def delete_local(self, local_id):
-        self.ref.child(f"locales/{local_id}").delete()
+        self.ref.update({f"locales/{local_id}": None, f"vencimientos/{local_id}": None,
+                         f"archivo_deudas/{local_id}": None})
+        self._publicar_local(local_id, "local_eliminado", {})
+
+    def get_propietario_local(self, local_id):
+        """Lee sólo el `propietario_id` del local (para verificar permisos)."""
+        return self.ref.child(f"locales/{local_id}/propietario_id").get()
+
+    # --- Paginación ---
+    def _pagina(self, path, limite, cursor=None):
+        """Lee hasta `limite` hijos de `path` ordenados por clave, después de `cursor`.
+
+        Retorna (items, siguiente_cursor); siguiente_cursor es None en la última página.
+        """
+        query = self.ref.child(path).order_by_key()
+        if cursor:
+            query = query.start_at(cursor)
+        # +1 para saber si hay más (y +1 si el cursor mismo viene incluido)
+        datos = query.limit_to_first(limite + (2 if cursor else 1)).get() or {}
+        items = [(k, v) for k, v in datos.items() if k != cursor]
+        siguiente = items[limite - 1][0] if len(items) > limite else None
+        return dict(items[:limite]), siguiente
 
     # --- Proveedores ---
     def add_proveedor(self, proveedor_id, proveedor_data):
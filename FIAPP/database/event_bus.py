@@ -0,0 +1,193 @@
+"""Bus de eventos en memoria para empujar cambios a los navegadores (SSE).
+
+`DBService` publica un evento por cada escritura en un canal:
+  - `local:{local_id}`     → productos y clientes/deudas de una tienda,
+  - `cliente:{cliente_id}` → saldo de un cliente en cualquier tienda,
+  - `locales`              → locales creados, renombrados o eliminados.
+
+`version(canal)` cambia con cada evento y sirve para invalidar cachés en
+memoria (p. ej. el contexto del asistente IA).
+
+Cada canal guarda los últimos eventos en un buffer circular para que un
+navegador que se reconecta (`Last-Event-ID`) reciba lo que se perdió. Si el
+id es demasiado antiguo (o de otro proceso) recibe un evento `resync` y
+recarga la página.
+
+El bus es por proceso: con varios workers cada uno tiene el suyo, y un
+cliente sólo ve los cambios hechos en su worker (suficiente para el
+servidor de desarrollo / un worker con hilos).
+"""
+import itertools
+import os
+import threading
+from collections import deque
+
+
+class LimiteConexiones(Exception):
+    """Se alcanzó el máximo de suscripciones abiertas en este proceso."""
+
+
+class Evento:
+    __slots__ = ("id", "tipo", "data")
+
+    def __init__(self, id, tipo, data):
+        self.id = id
+        self.tipo = tipo
+        self.data = data
+
+
+class Suscripcion:
+    """
+    Cola de eventos pendientes de un navegador conectado.
+
+    La cola es acotada: si el navegador no consume al ritmo que se publican
+    eventos (conexión lenta), la suscripción se cierra en vez de acumular
+    memoria; el navegador se reconecta y recupera lo perdido del buffer.
+    """
+
+    def __init__(self, bus, canal, max_pendientes):
+        self._bus = bus
+        self.canal = canal
+        self._max = max_pendientes
+        self._pendientes = deque()
+        self._cond = threading.Condition()
+        self.cerrada = False
+        self.desbordada = False
+
+    def _entregar(self, evento):
+        with self._cond:
+            if self.cerrada:
+                return
+            if len(self._pendientes) >= self._max:
+                self._pendientes.clear()
+                self.desbordada = True
+                self.cerrada = True
+            else:
+                self._pendientes.append(evento)
+            self._cond.notify()
+
+    def siguiente(self, timeout):
+        """Retorna el próximo evento, o None si pasó `timeout` sin eventos o se cerró."""
+        with self._cond:
+            if not self._pendientes and not self.cerrada:
+                self._cond.wait(timeout)
+            if self._pendientes:
+                return self._pendientes.popleft()
+            return None
+
+    def cerrar(self):
+        with self._cond:
+            self.cerrada = True
+            self._cond.notify()
+        self._bus._quitar(self)
+
+
+class EventBus:
+    def __init__(self, tamano_buffer=200, max_conexiones=100, max_pendientes=50):
+        self.tamano_buffer = tamano_buffer
+        self.max_conexiones = max_conexiones
+        self.max_pendientes = max_pendientes
+        # Prefijo de los ids: un Last-Event-ID de otro proceso (o de antes de
+        # reiniciar) no se confunde con uno de este
+        self._instancia = os.urandom(3).hex()
+        self._contador = itertools.count(1)
+        self._lock = threading.Lock()
+        self._buffers = {}       # canal -> deque[Evento]
+        self._descartados = {}   # canal -> último número que salió del buffer
+        self._suscripciones = {}  # canal -> set[Suscripcion]
+        self._versiones = {}     # canal -> número del último evento publicado
+        self._ultimo = 0         # número del último evento de cualquier canal
+        self._conexiones = 0
+
+    @property
+    def conexiones(self):
+        return self._conexiones
+
+    def publicar(self, canal, tipo, data):
+        """Guarda el evento en el buffer del canal y lo entrega a los suscriptores."""
+        with self._lock:
+            numero = next(self._contador)
+            evento = Evento(f"{self._instancia}-{numero}", tipo, data)
+            self._versiones[canal] = numero
+            self._ultimo = numero
+            buffer = self._buffers.get(canal)
+            if buffer is None:
+                buffer = self._buffers[canal] = deque(maxlen=self.tamano_buffer)
+            if len(buffer) == buffer.maxlen:
+                self._descartados[canal] = self._numero(buffer[0].id)
+            buffer.append(evento)
+            suscripciones = list(self._suscripciones.get(canal, ()))
+        for suscripcion in suscripciones:
+            suscripcion._entregar(evento)
+        return evento.id
+
+    def version(self, canal):
+        """Número del último evento publicado en `canal` (0 si ninguno).
+
+        Cambia con cada escritura hecha en este proceso: sirve como versión
+        de los datos del canal para invalidar cachés.
+        """
+        return self._versiones.get(canal, 0)
+
+    def ultima_version(self):
+        """Número del último evento publicado en cualquier canal (los números son globales).
+
+        Una versión de canal mayor que un valor tomado antes significa que el
+        canal cambió después.
+        """
+        return self._ultimo
+
+    def eventos_desde(self, canal, version):
+        """Eventos de `canal` posteriores a `version` (ver `version`), o None si
+        alguno ya salió del buffer."""
+        with self._lock:
+            if version < self._descartados.get(canal, 0):
+                return None
+            return [e for e in self._buffers.get(canal, ()) if self._numero(e.id) > version]
+
+    def suscribir(self, canal, ultimo_id=None):
+        """Abre una suscripción al canal.
+
+        Retorna `(suscripcion, perdidos)`: `perdidos` son los eventos del
+        buffer posteriores a `ultimo_id`, o None si no se pueden recuperar
+        (el navegador debe recargar). Lanza `LimiteConexiones` si se alcanzó
+        `max_conexiones`.
+        """
+        with self._lock:
+            if self._conexiones >= self.max_conexiones:
+                raise LimiteConexiones()
+            suscripcion = Suscripcion(self, canal, self.max_pendientes)
+            self._suscripciones.setdefault(canal, set()).add(suscripcion)
+            self._conexiones += 1
+            # Se calcula con el lock tomado: ningún evento queda entre el
+            # buffer y la suscripción
+            perdidos = self._perdidos(canal, ultimo_id) if ultimo_id else []
+        return suscripcion, perdidos
+
+    def _perdidos(self, canal, ultimo_id):
+        instancia, _, numero = ultimo_id.partition("-")
+        if instancia != self._instancia or not numero.isdigit():
+            return None
+        numero = int(numero)
+        if numero < self._descartados.get(canal, 0):
+            return None
+        return [e for e in self._buffers.get(canal, ()) if self._numero(e.id) > numero]
+
+    @staticmethod
+    def _numero(evento_id):
+        return int(evento_id.rsplit("-", 1)[1])
+
+    def _quitar(self, suscripcion):
+        with self._lock:
+            suscripciones = self._suscripciones.get(suscripcion.canal)
+            if suscripciones and suscripcion in suscripciones:
+                suscripciones.discard(suscripcion)
+                self._conexiones -= 1
+                if not suscripciones:
+                    del self._suscripciones[suscripcion.canal]
+
+
+# Instancia compartida por el proceso (DBService publica aquí)
+bus = EventBus(
+    max_conexiones=int(os.getenv("FIAPP_SSE_MAX_CONEXIONES", "100")),
+)
@@ -1,17 +1,67 @@
 import os
-import firebase_admin
-from firebase_admin import credentials , db
+import threading
+
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# firebase_admin (y google-auth, requests, ...) se importa la primera vez que
+# se usa la base, no al importar la app: arranque rápido y sin credenciales
+# para herramientas que no tocan Firebase
+_init_lock = threading.Lock()
+_base_local = None
+_base_local_lock = threading.Lock()
+
+
+def usa_base_local():
+    """True con `FIAPP_DB_BACKEND=local`: la app usa `database/local_db.py` en vez de Firebase."""
+    return os.getenv("FIAPP_DB_BACKEND", "firebase").lower() == "local"
+
+
+def base_local():
+    """Base local del proceso (en memoria, o en `FIAPP_DB_LOCAL_PATH` si está definida)."""
+    global _base_local
+    if _base_local is None:
+        with _base_local_lock:
+            if _base_local is None:
+                from database.local_db import LocalDatabase
+                _base_local = LocalDatabase(
+                    path=os.getenv("FIAPP_DB_LOCAL_PATH") or None,
+                    latencia_ms=os.getenv("FIAPP_DB_LATENCIA_MS") or 0,
+                )
+    return _base_local
+
+
+def db_reference(path="/"):
+    """Igual que `firebase_admin.db.reference`, pero respeta `FIAPP_DB_BACKEND`.
+
+    Inicializa Firebase la primera vez que se llama.
+    """
+    if usa_base_local():
+        return base_local().reference(path)
+    init_firebase()
+    from firebase_admin import db
+    return db.reference(path)
+
 
 def init_firebase():
-    cred_path = os.getenv("FIREBASE_CREDENTIALS_PATH")
-    db_url = os.getenv("FIREBASE_DB_URL")
+    """Inicializa el SDK de Firebase una sola vez por proceso (idempotente)."""
+    if usa_base_local():
+        base_local()
+        return
+
+    import firebase_admin
+    if firebase_admin._apps:
+        return
+    with _init_lock:
+        if firebase_admin._apps:
+            return
+        from firebase_admin import credentials
+
+        cred_path = os.getenv("FIREBASE_CREDENTIALS_PATH")
+        db_url = os.getenv("FIREBASE_DB_URL")
 
-    if not firebase_admin._apps:
         cred = credentials.Certificate(cred_path)
         firebase_admin.initialize_app(cred, {"databaseURL": db_url})
 
-    print("✅ Firebase inicializado correctamente.\n")
+        print("✅ Firebase inicializado correctamente.\n")
@@ -0,0 +1,231 @@
+import glob
+import hashlib
+import importlib.util
+import os
+import re
+import tempfile
+import time
+
+# Pillow es opcional (sin él sólo se guarda el original) y se importa la
+# primera vez que se generan variantes, no al arrancar la app
+PIL_INSTALADO = importlib.util.find_spec("PIL") is not None
+Image = None
+ImageOps = None
+
+
+def _cargar_pil():
+    global Image, ImageOps
+    if Image is None:
+        from PIL import Image as _Image, ImageOps as _ImageOps
+        Image, ImageOps = _Image, _ImageOps
+
+
+class ImageService:
+    """
+    Almacén de imágenes de productos direccionado por contenido.
+
+    Cada imagen se guarda una sola vez como `<sha256>.<ext>`, sin importar
+    cuántos productos la usen; las referencias por producto se llevan en
+    `imagenes_refs/{hash}/{local_id}/{producto_id}` (ver `DBService`) y el
+    archivo se borra cuando deja de estar referenciado.
+
+    Además genera variantes WebP (`<sha256>_<variante>.webp`) descritas con un
+    mapa {variante: {"url": ..., "ancho": px}} que las plantillas usan para `srcset`.
+    """
+
+    # Ancho máximo (px) de cada variante
+    VARIANTES = {"thumb": 160, "card": 480, "full": 1280}
+    CALIDAD_WEBP = 80
+    CHUNK_SIZE = 64 * 1024
+    # Un archivo recién subido (o re-subido) no se borra aunque su contador
+    # llegue a 0: puede haber un producto en creación a punto de referenciarlo.
+    # El borrado se pospone con `programar_borrado(hash, vence)` hasta que pase.
+    GRACIA_BORRADO = 300
+
+    _NOMBRE_HASH_RE = re.compile(r"^([0-9a-f]{64})(?:_[a-z]+)?\.[a-z0-9]+$")
+
+    def __init__(self, upload_folder, url_prefix="/static/productos", db=None, programar_borrado=None):
+        self.upload_folder = upload_folder
+        self.url_prefix = url_prefix.rstrip("/")
+        self.db = db
+        self.programar_borrado = programar_borrado
+
+    @property
+    def disponible(self):
+        return PIL_INSTALADO
+
+    def ruta_local(self, imagen_url):
+        """Convierte '/static/productos/x.png' en la ruta del archivo en disco."""
+        nombre = os.path.basename(imagen_url or "")
+        return os.path.join(self.upload_folder, nombre)
+
+    def hash_de_url(self, imagen_url):
+        """Retorna el sha256 de una URL direccionada por contenido, o None (nombres antiguos)."""
+        m = self._NOMBRE_HASH_RE.match(os.path.basename(imagen_url or ""))
+        return m.group(1) if m else None
+
+    def es_inmutable(self, path):
+        """True si `path` apunta a un archivo del almacén por contenido (cacheable para siempre)."""
+        return path.startswith(self.url_prefix + "/") and self.hash_de_url(path) is not None
+
+    # --- Almacenamiento ---
+    def nueva_subida(self):
+        """Abre un temporal para escribir una imagen por bloques (ver `SubidaEnCurso`)."""
+        return SubidaEnCurso(self)
+
+    def guardar_chunks(self, chunks, ext):
+        """Escribe los bloques en un temporal calculando el sha256 al vuelo.
+
+        Si ya existe un archivo con el mismo contenido se descarta el temporal
+        y se reutiliza el existente. Retorna la URL relativa.
+        """
+        subida = self.nueva_subida()
+        try:
+            for chunk in chunks:
+                subida.escribir(chunk)
+            return subida.confirmar(ext)
+        finally:
+            subida.descartar()
+
+    def guardar_stream(self, stream, ext):
+        """Igual que `guardar_chunks` leyendo de un objeto tipo archivo en bloques."""
+        return self.guardar_chunks(iter(lambda: stream.read(self.CHUNK_SIZE), b""), ext)
+
+    # --- Conteo de referencias ---
+    def retener(self, imagen_url, local_id, producto_id):
+        """Registra que `producto_id` usa la imagen."""
+        imagen_hash = self.hash_de_url(imagen_url)
+        if imagen_hash and self.db:
+            self.db.retener_imagen(imagen_hash, local_id, producto_id)
+
+    def liberar(self, imagen_url, local_id, producto_id):
+        """Quita la referencia del producto y borra los archivos si nadie más la usa."""
+        imagen_hash = self.hash_de_url(imagen_url)
+        if not imagen_hash or not self.db:
+            return
+        restantes = self.db.liberar_imagen(imagen_hash, local_id, producto_id)
+        if restantes == 0:
+            self.borrar(imagen_hash)
+
+    def borrar(self, imagen_hash, forzar=False):
+        """Elimina el original y las variantes de `imagen_hash`; False si se pospuso."""
+        originales = glob.glob(os.path.join(self.upload_folder, f"{imagen_hash}.*"))
+        vence = max((os.path.getmtime(p) + self.GRACIA_BORRADO for p in originales), default=0)
+        if not forzar and vence > time.time():
+            if self.programar_borrado:
+                self.programar_borrado(imagen_hash, vence)
+                print(f"[IMG] {imagen_hash[:12]} subido recientemente, se borrará en {vence - time.time():.0f} s")
+            else:
+                print(f"[IMG] {imagen_hash[:12]} subido recientemente, no se borra")
+            return False
+        for ruta in originales + glob.glob(os.path.join(self.upload_folder, f"{imagen_hash}_*.webp")):
+            try:
+                os.remove(ruta)
+            except OSError as e:
+                print(f"[IMG] no se pudo borrar {ruta}: {e}")
+        print(f"[IMG] imagen {imagen_hash[:12]} sin referencias, archivos eliminados")
+        return True
+
+    # --- Variantes ---
+    def generar_variantes(self, imagen_url):
+        """Crea las variantes WebP de `imagen_url` y retorna el mapa de variantes.
+
+        Las variantes que ya existen en disco (mismo contenido subido antes)
+        no se regeneran. Retorna {} si Pillow no está instalado o la imagen
+        no se puede abrir.
+        """
+        if not self.disponible or not imagen_url:
+            return {}
+
+        origen = self.ruta_local(imagen_url)
+        base = os.path.splitext(os.path.basename(origen))[0]
+        variantes = {}
+        try:
+            _cargar_pil()
+            img = None
+            for nombre, ancho_max in self.VARIANTES.items():
+                archivo = f"{base}_{nombre}.webp"
+                destino = os.path.join(self.upload_folder, archivo)
+                if os.path.exists(destino):
+                    with Image.open(destino) as existente:  # sólo lee la cabecera
+                        ancho = existente.width
+                else:
+                    if img is None:
+                        img = self._abrir(origen)
+                    copia = img.copy()
+                    # thumbnail() nunca agranda: imágenes pequeñas conservan su tamaño
+                    copia.thumbnail((ancho_max, ancho_max * 4), Image.LANCZOS)
+                    # Temporal único: dos subidas del mismo contenido pueden generar a la vez
+                    fd, tmp = tempfile.mkstemp(dir=self.upload_folder, prefix=".variante_", suffix=".tmp")
+                    with os.fdopen(fd, "wb") as out:
+                        copia.save(out, "WEBP", quality=self.CALIDAD_WEBP, method=4)
+                    os.replace(tmp, destino)
+                    ancho = copia.width
+                variantes[nombre] = {"url": f"{self.url_prefix}/{archivo}", "ancho": ancho}
+        except Exception as e:
+            print(f"[IMG] error generando variantes de {imagen_url}: {e}")
+            return {}
+
+        variantes["original"] = {"url": imagen_url}
+        return variantes
+
+    def _abrir(self, ruta):
+        with Image.open(ruta) as original:
+            original.seek(0)  # GIF animados: primer cuadro
+            original.load()
+            img = ImageOps.exif_transpose(original)
+            if img is original:
+                img = original.copy()
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA")
+        return img
+
+
+class SubidaEnCurso:
+    """
+    Imagen que se está recibiendo: se escribe por bloques en un temporal
+    dentro de la carpeta de uploads mientras se calcula su sha256.
+
+    `confirmar()` la renombra atómicamente a `<sha256>.<ext>` (o reutiliza el
+    archivo idéntico existente); `descartar()` borra el temporal si no se
+    confirmó. Así una subida inválida o abandonada nunca deja archivos.
+    """
+
+    def __init__(self, image_service):
+        self._service = image_service
+        self._hasher = hashlib.sha256()
+        fd, self._tmp = tempfile.mkstemp(dir=image_service.upload_folder, prefix=".subida_", suffix=".tmp")
+        self._out = os.fdopen(fd, "wb")
+        self.tamano = 0
+        self.ext = None
+        self.url = None
+
+    def escribir(self, chunk):
+        self._hasher.update(chunk)
+        self._out.write(chunk)
+        self.tamano += len(chunk)
+
+    def confirmar(self, ext=None):
+        """Mueve el temporal a su nombre definitivo y retorna la URL relativa."""
+        if self.url:
+            return self.url
+        ext = ext or self.ext
+        ext = "jpg" if ext == "jpeg" else ext
+        self._out.close()
+        nombre = f"{self._hasher.hexdigest()}.{ext}"
+        destino = os.path.join(self._service.upload_folder, nombre)
+        if os.path.exists(destino):
+            os.remove(self._tmp)
+            os.utime(destino)  # reinicia la ventana de gracia
+            print(f"[IMG] contenido duplicado, se reutiliza {nombre}")
+        else:
+            os.replace(self._tmp, destino)
+        self.url = f"{self._service.url_prefix}/{nombre}"
+        return self.url
+
+    def descartar(self):
+        """Borra el temporal si la subida no se confirmó (idempotente)."""
+        if not self._out.closed:
+            self._out.close()
+        if self.url is None and os.path.exists(self._tmp):
+            os.remove(self._tmp)
@@ -0,0 +1,298 @@
+"""Sustituto local (en memoria / archivo JSON) de `firebase_admin.db`.
+
+Implementa el subconjunto de la API de `Reference`/`Query` que usa FIAPP:
+`child`, `get` (incluido `shallow`), `set`, `update` (multi-ruta), `delete`,
+`push`, `transaction` y consultas `order_by_key`/`order_by_child` con
+`start_at`/`end_at`/`equal_to`/`limit_to_first`/`limit_to_last`.
+
+Se usa para desarrollo sin credenciales, benchmarks y pruebas de carga
+(`FIAPP_DB_BACKEND=local`). Cuenta las operaciones en `stats` para poder
+medir los "round trips" que haría la app contra Firebase.
+"""
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def _split(path):
+    return [p for p in (path or "").strip("/").split("/") if p]
+
+
+class LocalDatabase:
+    """Árbol JSON en memoria con bloqueo global y persistencia opcional."""
+
+    def __init__(self, path=None, latencia_ms=0.0):
+        self.path = path
+        self.latencia_ms = float(latencia_ms or 0)
+        self.lock = threading.RLock()
+        self.root = {}
+        self.stats = {"reads": 0, "writes": 0}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fh:
+                self.root = json.load(fh) or {}
+
+    def reference(self, path="/"):
+        return Reference(self, _split(path))
+
+    # --- Helpers internos ---
+    def _contar(self, tipo):
+        with self.lock:
+            self.stats[tipo] += 1
+        if self.latencia_ms:
+            time.sleep(self.latencia_ms / 1000.0)
+
+    def _leer(self, partes):
+        nodo = self.root
+        for p in partes:
+            if not isinstance(nodo, dict) or p not in nodo:
+                return None
+            nodo = nodo[p]
+        return nodo
+
+    def _escribir(self, partes, valor):
+        if not partes:
+            self.root = _normalizar(valor) or {}
+            return
+        if valor is None:
+            self._borrar(partes)
+            return
+        nodo = self.root
+        for p in partes[:-1]:
+            hijo = nodo.get(p)
+            if not isinstance(hijo, dict):
+                hijo = {}
+                nodo[p] = hijo
+            nodo = hijo
+        valor = _normalizar(valor)
+        if valor is None:
+            self._borrar(partes)
+        else:
+            nodo[partes[-1]] = valor
+
+    def _borrar(self, partes):
+        if not partes:
+            self.root = {}
+            return
+        cadena = [self.root]
+        nodo = self.root
+        for p in partes[:-1]:
+            nodo = nodo.get(p) if isinstance(nodo, dict) else None
+            if not isinstance(nodo, dict):
+                return
+            cadena.append(nodo)
+        nodo.pop(partes[-1], None)
+        # Igual que Firebase: los nodos vacíos desaparecen
+        for i in range(len(partes) - 1, 0, -1):
+            if cadena[i]:
+                break
+            cadena[i - 1].pop(partes[i - 1], None)
+
+    def _persistir(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.root, fh)
+        os.replace(tmp, self.path)
+
+
+def _normalizar(valor):
+    """Copia profunda eliminando None y diccionarios vacíos (semántica de RTDB)."""
+    if isinstance(valor, dict):
+        res = {}
+        for k, v in valor.items():
+            v = _normalizar(v)
+            if v is not None:
+                res[str(k)] = v
+        return res or None
+    if isinstance(valor, (list, tuple)):
+        res = {str(i): _normalizar(v) for i, v in enumerate(valor) if v is not None}
+        return res or None
+    return valor
+
+
+_PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+_push_lock = threading.Lock()
+_ultimo_push = [0, 0]
+
+
+def _push_id():
+    """Genera IDs ordenables cronológicamente, como los de `push()` de Firebase."""
+    with _push_lock:
+        ahora = int(time.time() * 1000)
+        if ahora == _ultimo_push[0]:
+            _ultimo_push[1] += 1
+        else:
+            _ultimo_push[0], _ultimo_push[1] = ahora, 0
+        seq = _ultimo_push[1]
+    chars = []
+    for _ in range(8):
+        chars.append(_PUSH_CHARS[ahora % 64])
+        ahora //= 64
+    sufijo = []
+    for _ in range(12):
+        sufijo.append(_PUSH_CHARS[seq % 64])
+        seq //= 64
+    return "".join(reversed(chars)) + "".join(reversed(sufijo))
+
+
+class Reference:
+    def __init__(self, database, partes):
+        self._db = database
+        self._partes = list(partes)
+
+    @property
+    def key(self):
+        return self._partes[-1] if self._partes else None
+
+    @property
+    def path(self):
+        return "/" + "/".join(self._partes)
+
+    @property
+    def parent(self):
+        if not self._partes:
+            return None
+        return Reference(self._db, self._partes[:-1])
+
+    def child(self, path):
+        return Reference(self._db, self._partes + _split(path))
+
+    def get(self, etag=False, shallow=False):
+        self._db._contar("reads")
+        with self._db.lock:
+            valor = self._db._leer(self._partes)
+            if shallow and isinstance(valor, dict):
+                valor = {k: (True if isinstance(v, dict) else v) for k, v in valor.items()}
+            else:
+                valor = copy.deepcopy(valor)
+        if etag:
+            return valor, str(hash(json.dumps(valor, sort_keys=True, default=str)))
+        return valor
+
+    def set(self, value):
+        self._db._contar("writes")
+        with self._db.lock:
+            self._db._escribir(self._partes, value)
+            self._db._persistir()
+
+    def update(self, value):
+        if not isinstance(value, dict) or not value:
+            raise ValueError("update() requiere un diccionario no vacío")
+        self._db._contar("writes")
+        with self._db.lock:
+            for k, v in value.items():
+                self._db._escribir(self._partes + _split(k), v)
+            self._db._persistir()
+
+    def delete(self):
+        self._db._contar("writes")
+        with self._db.lock:
+            self._db._borrar(self._partes)
+            self._db._persistir()
+
+    def push(self, value=""):
+        ref = self.child(_push_id())
+        if value is not None and value != "":
+            ref.set(value)
+        return ref
+
+    def transaction(self, transaction_update):
+        # Lectura + escritura atómicas bajo el mismo bloqueo
+        self._db._contar("reads")
+        self._db._contar("writes")
+        with self._db.lock:
+            actual = copy.deepcopy(self._db._leer(self._partes))
+            nuevo = transaction_update(actual)
+            self._db._escribir(self._partes, nuevo)
+            self._db._persistir()
+            return copy.deepcopy(nuevo)
+
+    # --- Consultas ---
+    def order_by_key(self):
+        return Query(self, "$key")
+
+    def order_by_value(self):
+        return Query(self, "$value")
+
+    def order_by_child(self, path):
+        return Query(self, path)
+
+
+def _clave_orden(valor):
+    # Orden de RTDB: null < false < true < números < strings < objetos
+    if valor is None:
+        return (0, 0)
+    if isinstance(valor, bool):
+        return (1, int(valor))
+    if isinstance(valor, (int, float)):
+        return (2, valor)
+    if isinstance(valor, str):
+        return (3, valor)
+    return (4, 0)
+
+
+class Query:
+    def __init__(self, ref, orden):
+        self._ref = ref
+        self._orden = orden
+        self._inicio = None
+        self._fin = None
+        self._limite = None
+
+    def start_at(self, valor):
+        self._inicio = valor
+        return self
+
+    def end_at(self, valor):
+        self._fin = valor
+        return self
+
+    def equal_to(self, valor):
+        self._inicio = valor
+        self._fin = valor
+        return self
+
+    def limit_to_first(self, n):
+        self._limite = ("first", int(n))
+        return self
+
+    def limit_to_last(self, n):
+        self._limite = ("last", int(n))
+        return self
+
+    def _valor(self, clave, dato):
+        if self._orden == "$key":
+            return clave
+        if self._orden == "$value":
+            return dato
+        nodo = dato
+        for p in _split(self._orden):
+            nodo = nodo.get(p) if isinstance(nodo, dict) else None
+        return nodo
+
+    def get(self):
+        db = self._ref._db
+        db._contar("reads")
+        with db.lock:
+            datos = db._leer(self._ref._partes)
+            if not isinstance(datos, dict):
+                return OrderedDict()
+            items = []
+            for k, v in datos.items():
+                items.append((_clave_orden(self._valor(k, v)), k, v))
+            items.sort(key=lambda t: (t[0], t[1]))
+            if self._inicio is not None:
+                ini = _clave_orden(self._inicio)
+                items = [t for t in items if t[0] >= ini]
+            if self._fin is not None:
+                fin = _clave_orden(self._fin)
+                items = [t for t in items if t[0] <= fin]
+            if self._limite:
+                modo, n = self._limite
+                items = items[:n] if modo == "first" else items[-n:]
+            # Sólo se copia lo que devuelve la consulta (una página no copia todo el nodo)
+            return OrderedDict((k, copy.deepcopy(v)) for _, k, v in items)
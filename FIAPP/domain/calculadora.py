@@ -0,0 +1,216 @@
+"""Calculadora del asistente financiero.
+
+Evalúa expresiones aritméticas ("12.5*3+2", "(100-15)%7", "2**10") con
+`Decimal`, sin `eval`, y con el costo acotado:
+
+- largo máximo de la expresión y profundidad máxima de anidamiento;
+- operandos y resultados intermedios de magnitud limitada;
+- potencias sólo con exponente entero pequeño (`9**9**9` se rechaza en vez de
+  dejar un núcleo ocupado).
+
+Las expresiones ya analizadas se guardan en un caché LRU, así los cálculos
+repetidos no se vuelven a analizar. `evaluar_lote` evalúa varias expresiones
+de una vez y retorna el resultado o el error de cada una.
+"""
+import decimal
+import re
+from decimal import Decimal
+from functools import lru_cache
+
+MAX_LARGO = 200
+MAX_PROFUNDIDAD = 30
+MAX_OPERANDO = Decimal("1e15")
+MAX_EXPONENTE = 64
+
+CENTAVO = Decimal("0.01")
+
+_CONTEXTO = decimal.Context(
+    prec=28,
+    rounding=decimal.ROUND_HALF_EVEN,
+    traps=[decimal.InvalidOperation, decimal.DivisionByZero, decimal.Overflow],
+)
+
+_TOKEN = re.compile(r"\s*(?:(\d+(?:\.\d*)?|\.\d+)|(\*\*|[-+*/%()]))")
+
+
+class ErrorCalculo(ValueError):
+    """La expresión no es válida o excede los límites de la calculadora."""
+
+
+def tokenizar(expresion):
+    """Lista de tokens: `Decimal` para números y str para operadores/paréntesis."""
+    if len(expresion) > MAX_LARGO:
+        raise ErrorCalculo(f"Expresión demasiado larga (máximo {MAX_LARGO} caracteres)")
+    tokens = []
+    posicion = 0
+    fin = len(expresion.rstrip())
+    while posicion < fin:
+        coincidencia = _TOKEN.match(expresion, posicion)
+        if not coincidencia:
+            raise ErrorCalculo(f"Carácter no permitido: {expresion[posicion:].strip()[:1]!r}")
+        numero, operador = coincidencia.groups()
+        if numero is not None:
+            valor = Decimal(numero)
+            if abs(valor) > MAX_OPERANDO:
+                raise ErrorCalculo("Número demasiado grande")
+            tokens.append(valor)
+        else:
+            tokens.append(operador)
+        posicion = coincidencia.end()
+    if not tokens:
+        raise ErrorCalculo("Expresión vacía")
+    return tokens
+
+
+class _Parser:
+    """
+    Descenso recursivo; el árbol son tuplas `("num", Decimal)`,
+    `("neg", nodo)` y `(op, izq, der)`.
+
+        suma     := producto (("+" | "-") producto)*
+        producto := unario (("*" | "/" | "%") unario)*
+        unario   := ("-" | "+") unario | potencia
+        potencia := atomo ("**" unario)?        (asociativa a la derecha)
+        atomo    := numero | "(" suma ")"
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.i = 0
+        self.profundidad = 0
+
+    def _ver(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else None
+
+    def _tomar(self):
+        token = self._ver()
+        self.i += 1
+        return token
+
+    def _entrar(self):
+        self.profundidad += 1
+        if self.profundidad > MAX_PROFUNDIDAD:
+            raise ErrorCalculo("Expresión demasiado anidada")
+
+    def analizar(self):
+        nodo = self._suma()
+        if self._ver() is not None:
+            raise ErrorCalculo(f"Token inesperado: {self._ver()}")
+        return nodo
+
+    def _suma(self):
+        nodo = self._producto()
+        while self._ver() in ("+", "-"):
+            nodo = (self._tomar(), nodo, self._producto())
+        return nodo
+
+    def _producto(self):
+        nodo = self._unario()
+        while self._ver() in ("*", "/", "%"):
+            nodo = (self._tomar(), nodo, self._unario())
+        return nodo
+
+    def _unario(self):
+        if self._ver() in ("-", "+"):
+            self._entrar()
+            signo = self._tomar()
+            operando = self._unario()
+            self.profundidad -= 1
+            return ("neg", operando) if signo == "-" else operando
+        return self._potencia()
+
+    def _potencia(self):
+        base = self._atomo()
+        if self._ver() == "**":
+            self._tomar()
+            self._entrar()
+            exponente = self._unario()
+            self.profundidad -= 1
+            return ("**", base, exponente)
+        return base
+
+    def _atomo(self):
+        token = self._tomar()
+        if isinstance(token, Decimal):
+            return ("num", token)
+        if token == "(":
+            self._entrar()
+            nodo = self._suma()
+            if self._tomar() != ")":
+                raise ErrorCalculo("Falta cerrar un paréntesis")
+            self.profundidad -= 1
+            return nodo
+        raise ErrorCalculo("Expresión incompleta" if token is None else f"Token inesperado: {token}")
+
+
+@lru_cache(maxsize=512)
+def compilar(expresion):
+    """Árbol de la expresión (cacheado por texto). Lanza `ErrorCalculo`."""
+    return _Parser(tokenizar(expresion)).analizar()
+
+
+def _acotar(valor):
+    if abs(valor) > MAX_OPERANDO:
+        raise ErrorCalculo("Resultado demasiado grande")
+    return valor
+
+
+def _evaluar(nodo):
+    op = nodo[0]
+    if op == "num":
+        return nodo[1]
+    if op == "neg":
+        return -_evaluar(nodo[1])
+    izq = _evaluar(nodo[1])
+    der = _evaluar(nodo[2])
+    if op == "+":
+        return _acotar(izq + der)
+    if op == "-":
+        return _acotar(izq - der)
+    if op == "*":
+        return _acotar(izq * der)
+    if op in ("/", "%") and der == 0:
+        raise ErrorCalculo("División entre cero")
+    if op == "/":
+        return _acotar(izq / der)
+    if op == "%":
+        # Mismo signo que el divisor, como en Python
+        return izq - der * (izq / der).to_integral_value(rounding=decimal.ROUND_FLOOR)
+    # "**"
+    if der != der.to_integral_value() or abs(der) > MAX_EXPONENTE:
+        raise ErrorCalculo(f"Sólo se permiten exponentes enteros de hasta {MAX_EXPONENTE}")
+    if izq == 0 and der < 0:
+        raise ErrorCalculo("División entre cero")
+    return _acotar(izq ** int(der))
+
+
+def evaluar(expresion):
+    """Valor `Decimal` de la expresión. Lanza `ErrorCalculo`."""
+    try:
+        with decimal.localcontext(_CONTEXTO):
+            return _evaluar(compilar(expresion.strip()))
+    except decimal.DecimalException as e:
+        raise ErrorCalculo("Operación no permitida") from e
+
+
+def evaluar_lote(expresiones):
+    """Evalúa varias expresiones; por cada una retorna su `Decimal` o su `ErrorCalculo`."""
+    resultados = []
+    for expresion in expresiones:
+        try:
+            resultados.append(evaluar(expresion))
+        except ErrorCalculo as e:
+            resultados.append(e)
+    return resultados
+
+
+def a_dinero(valor):
+    """Redondea a centavos (mitad hacia arriba)."""
+    return valor.quantize(CENTAVO, rounding=decimal.ROUND_HALF_UP)
+
+
+def formatear(valor):
+    """Texto corto: sin ceros sobrantes ni notación científica ("39.5", "1024")."""
+    valor = valor.quantize(Decimal("1e-10"), context=_CONTEXTO) if valor != valor.to_integral_value() else valor
+    texto = format(valor.normalize(context=_CONTEXTO), "f")
+    return "0" if texto in ("-0", "") else texto
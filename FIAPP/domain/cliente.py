@@ -1,10 +1,35 @@
+from domain.coleccion import a_numero
 from domain.usuario import Usuario
 
 
 class Cliente(Usuario):
-    def __init__(self, uid, email):
+    """Cliente en una tienda: su cuenta (`locales/{id}/clientes/{uid}`)."""
+    __slots__ = ("deuda", "nombre", "movimientos")
+
+    def __init__(self, uid, email, nombre=None, deuda=0.0, movimientos=None):
         super().__init__(uid, email, "cliente")
-        self.deuda = 0.0
+        self.deuda = deuda
+        self.nombre = nombre
+        # Historial `deudas/{clave}` tal como viene de la base (None si no se cargó)
+        self.movimientos = movimientos
 
     def actualizar_deuda(self, monto):
         self.deuda += monto
+
+    def to_dict(self):
+        """Formato de la cuenta en la tienda (no el de `usuarios/`)."""
+        data = {"email": self.email, "deuda": self.deuda}
+        if self.nombre:
+            data["nombre"] = self.nombre
+        if self.movimientos:
+            data["deudas"] = self.movimientos
+        return data
+
+    @classmethod
+    def from_dict(cls, data, uid=None, historial=True):
+        """Crea un Cliente desde su cuenta en una tienda; `historial=False` no guarda los movimientos."""
+        if not isinstance(data, dict):
+            raise ValueError(f"Cliente inválido: {data!r}")
+        get = data.get
+        return cls(uid, get("email"), get("nombre"), a_numero(get("deuda")),
+                   (get("deudas") or {}) if historial else None)
@@ -0,0 +1,86 @@
+"""Colección tipada de modelos de dominio (productos o clientes de una tienda).
+
+Los datos llegan de la base como `{id: dict}` con números que a veces son
+strings. `Coleccion.desde_dict(Producto, datos)` los convierte una sola vez
+en objetos con `__slots__` (menos memoria que un dict por elemento y
+atributos ya tipados) y el resto del código itera esos objetos sin volver a
+llamar a `float(...)`/`int(...)`.
+
+Se comporta como un dict de sólo lectura (`items()`, `values()`, `get`,
+`in`, `len`), así que las plantillas pueden recorrerla igual que antes.
+"""
+import math
+from collections.abc import Mapping
+from operator import attrgetter
+
+
+def a_numero(valor, tipo=float):
+    """Convierte `valor` a `tipo`; lo vacío o inválido cuenta como 0."""
+    if type(valor) is tipo:
+        return valor
+    try:
+        return tipo(valor or 0)
+    except (TypeError, ValueError):
+        try:
+            # "12.0" como stock
+            return tipo(float(valor))
+        except (TypeError, ValueError):
+            return tipo(0)
+
+
+def a_monto(valor):
+    """`float(valor)` para montos y precios que vienen del usuario; NaN e infinito dan ValueError."""
+    monto = float(valor)
+    if not math.isfinite(monto):
+        raise ValueError(f"Número no finito: {valor!r}")
+    return monto
+
+
+class Coleccion(Mapping):
+    __slots__ = ("modelo", "_elementos")
+
+    def __init__(self, modelo, elementos=None):
+        self.modelo = modelo
+        self._elementos = elementos if elementos is not None else {}
+
+    @classmethod
+    def desde_dict(cls, modelo, datos, **opciones):
+        """Parsea `{id: dict}` con `modelo.from_dict(dato, id, **opciones)`; ignora lo que no es dict."""
+        desde = modelo.from_dict
+        return cls(modelo, {
+            clave: desde(dato, clave, **opciones)
+            for clave, dato in (datos or {}).items() if isinstance(dato, dict)
+        })
+
+    def __getitem__(self, clave):
+        return self._elementos[clave]
+
+    def __iter__(self):
+        return iter(self._elementos)
+
+    def __len__(self):
+        return len(self._elementos)
+
+    def __contains__(self, clave):
+        return clave in self._elementos
+
+    def __repr__(self):
+        return f"Coleccion({self.modelo.__name__}, {len(self._elementos)} elementos)"
+
+    def agregar(self, clave, elemento):
+        if not isinstance(elemento, self.modelo):
+            raise TypeError(f"Se esperaba {self.modelo.__name__}, no {type(elemento).__name__}")
+        self._elementos[clave] = elemento
+
+    def quitar(self, clave):
+        return self._elementos.pop(clave, None)
+
+    def ordenados(self, campo, descendente=False):
+        """Elementos ordenados por un atributo (p. ej. `"precio"`)."""
+        return sorted(self._elementos.values(), key=attrgetter(campo), reverse=descendente)
+
+    def filtrar(self, condicion):
+        return [e for e in self._elementos.values() if condicion(e)]
+
+    def to_dict(self):
+        return {clave: elemento.to_dict() for clave, elemento in self._elementos.items()}
@@ -1,16 +1,105 @@
+from domain.cliente import Cliente
+from domain.coleccion import Coleccion
+from domain.producto import Producto
+
+
 class Local:
-    def __init__(self, nombre, propietario_id):
+    """Tienda: los metadatos se leen siempre; productos, clientes y deudas, al usarlos.
+
+    Con `fuente` (un objeto con `listar_productos`, `listar_clientes`,
+    `obtener_historial_deudas` y sus variantes `_pagina`, como `UseCases`)
+    cada colección se lee la primera vez que se accede y queda guardada en el
+    objeto. Sin `fuente` las colecciones son las que se pasan (o vacías).
+    """
+    __slots__ = ("nombre", "propietario_id", "id", "_productos", "_clientes", "_fuente", "_deudas", "_paginas")
+
+    def __init__(self, nombre, propietario_id, productos=None, clientes=None, id=None, fuente=None):
         self.nombre = nombre
         self.propietario_id = propietario_id
-        self.productos = {} 
-        self.clientes = {}  
+        self.id = id
+        self._fuente = fuente
+        if fuente is None:
+            productos = productos if productos is not None else Coleccion(Producto)
+            clientes = clientes if clientes is not None else Coleccion(Cliente)
+        self._productos = productos
+        self._clientes = clientes
+        self._deudas = {}
+        self._paginas = {}
+
+    @classmethod
+    def perezoso(cls, id, datos, fuente):
+        """Local con sólo sus metadatos (`nombre`, `propietario_id`); el resto se lee de `fuente`."""
+        return cls(datos.get("nombre") or id, datos.get("propietario_id"), id=id, fuente=fuente)
+
+    # --- Colecciones bajo demanda ---
+    @property
+    def productos(self):
+        if self._productos is None:
+            self._productos = self._fuente.listar_productos(self.id)
+        return self._productos
+
+    @productos.setter
+    def productos(self, productos):
+        self._productos = productos
+
+    @property
+    def clientes(self):
+        if self._clientes is None:
+            self._clientes = self._fuente.listar_clientes(self.id)
+        return self._clientes
+
+    @clientes.setter
+    def clientes(self, clientes):
+        self._clientes = clientes
+
+    def cargado(self, coleccion):
+        """True si `"productos"` o `"clientes"` ya están en memoria."""
+        return getattr(self, f"_{coleccion}") is not None
+
+    def deudas(self, cliente_id):
+        """Historial de deudas de un cliente `{clave: movimiento}` (una lectura por cliente)."""
+        if cliente_id not in self._deudas:
+            cliente = self._clientes.get(cliente_id) if self._clientes is not None else None
+            if cliente is not None and cliente.movimientos is not None:
+                # Los clientes ya se leyeron con su historial
+                self._deudas[cliente_id] = cliente.movimientos
+            elif self._fuente is not None:
+                self._deudas[cliente_id] = self._fuente.obtener_historial_deudas(self.id, cliente_id)
+            else:
+                self._deudas[cliente_id] = {}
+        return self._deudas[cliente_id]
+
+    def pagina_productos(self, limite=50, cursor=None):
+        """(Coleccion de `limite` productos después de `cursor`, siguiente cursor)."""
+        return self._pagina("productos", Producto, limite, cursor)
+
+    def pagina_clientes(self, limite=50, cursor=None):
+        """(Coleccion de `limite` clientes después de `cursor`, siguiente cursor)."""
+        return self._pagina("clientes", Cliente, limite, cursor)
+
+    def _pagina(self, coleccion, modelo, limite, cursor):
+        clave = (coleccion, limite, cursor)
+        if clave not in self._paginas:
+            completa = getattr(self, f"_{coleccion}")
+            if completa is not None or self._fuente is None:
+                # Ya está toda en memoria: se corta ahí mismo, en el orden por clave de la base
+                completa = completa if completa is not None else Coleccion(modelo)
+                ids = sorted(k for k in completa if cursor is None or k > cursor)
+                siguiente = ids[limite - 1] if len(ids) > limite else None
+                pagina = Coleccion(modelo, {k: completa[k] for k in ids[:limite]})
+            else:
+                leer = getattr(self._fuente, f"listar_{coleccion}_pagina")
+                datos, siguiente = leer(self.id, limite, cursor)
+                pagina = Coleccion.desde_dict(modelo, datos)
+            self._paginas[clave] = (pagina, siguiente)
+        return self._paginas[clave]
 
     def to_dict(self):
         return {
             "nombre": self.nombre,
             "propietario_id": self.propietario_id,
-            "productos": self.productos,
-            "clientes": self.clientes
+            "productos": self.productos.to_dict(),
+            "clientes": self.clientes.to_dict()
         }
 
     def local_create(self):
@@ -18,4 +107,17 @@ class Local:
             "nombre": self.nombre,
             "propietario_id": self.propietario_id
             
-        }
\ No newline at end of file
+        }
+
+    @classmethod
+    def from_dict(cls, data, id=None, historial=True):
+        """Crea un Local con sus productos y clientes ya tipados (se parsean una vez)."""
+        if not isinstance(data, dict):
+            raise ValueError(f"Local inválido: {data!r}")
+        return cls(
+            data.get("nombre") or id,
+            data.get("propietario_id"),
+            Coleccion.desde_dict(Producto, data.get("productos")),
+            Coleccion.desde_dict(Cliente, data.get("clientes"), historial=historial),
+            id,
+        )
@@ -1,10 +1,19 @@
+from domain.coleccion import a_numero
+
+
 class Producto:
-    def __init__(self, nombre, precio, stock, imagen_url=None, proveedor=None):
+    __slots__ = ("nombre", "precio", "stock", "imagen_url", "proveedor", "imagenes", "id", "costo")
+
+    def __init__(self, nombre, precio, stock, imagen_url=None, proveedor=None, imagenes=None, id=None, costo=None):
         self.nombre = nombre
         self.precio = precio
         self.stock = stock
         self.imagen_url = imagen_url  # URL relativa a /static/productos/...
         self.proveedor = proveedor  # Nombre o ID del proveedor
+        # Variantes redimensionadas: {"thumb"|"card"|"full": {"url", "ancho"}, "original": {"url"}}
+        self.imagenes = imagenes
+        self.id = id
+        self.costo = costo  # Costo de compra por unidad (opcional, para márgenes)
 
     def to_dict(self):
         data = {
@@ -16,4 +25,29 @@ class Producto:
             data["imagen_url"] = self.imagen_url
         if self.proveedor:
             data["proveedor"] = self.proveedor
+        if self.imagenes:
+            data["imagenes"] = self.imagenes
+        if self.costo is not None:
+            data["costo"] = self.costo
         return data
+
+    @classmethod
+    def from_dict(cls, data, id=None):
+        """Crea un Producto desde lo guardado en la base (precio float, stock int)."""
+        if not isinstance(data, dict):
+            raise ValueError(f"Producto inválido: {data!r}")
+        get = data.get
+        costo = get("costo")
+        return cls(
+            get("nombre") or "Sin nombre",
+            a_numero(get("precio")),
+            a_numero(get("stock"), int),
+            get("imagen_url"),
+            get("proveedor"),
+            get("imagenes"),
+            id,
+            None if costo in (None, "") else a_numero(costo),
+        )
+
+    def __repr__(self):
+        return f"Producto({self.nombre!r}, precio={self.precio}, stock={self.stock})"
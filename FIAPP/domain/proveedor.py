@@ -4,6 +4,8 @@ class Proveedor:
     Ahora incluye `propietario_id` para identificar al tendero que lo creó.
     """
 
+    __slots__ = ("id", "nombre", "contacto", "email", "propietario_id")
+
     def __init__(self, id, nombre, contacto=None, email=None, propietario_id=None):
         self.id = id
         self.nombre = nombre
@@ -23,11 +25,13 @@ class Proveedor:
             data["propietario_id"] = self.propietario_id
         return data
 
-    @staticmethod
-    def from_dict(data):
+    @classmethod
+    def from_dict(cls, data, id=None):
         """Crea un Proveedor desde un diccionario."""
-        return Proveedor(
-            id=data.get("id"),
+        if not isinstance(data, dict):
+            raise ValueError(f"Proveedor inválido: {data!r}")
+        return cls(
+            id=data.get("id") or id,
             nombre=data.get("nombre"),
             contacto=data.get("contacto"),
             email=data.get("email"),
@@ -2,6 +2,8 @@ from domain.usuario import Usuario
 
 
 class Tendero(Usuario):
+    __slots__ = ("locales",)
+
     def __init__(self, uid, email):
         super().__init__(uid, email, "tendero")
         self.locales = []
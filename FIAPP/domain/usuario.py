@@ -1,5 +1,7 @@
 class Usuario:
     """Modelo de usuario sin rol fijo. El tipo se asigna después del registro."""
+    __slots__ = ("uid", "email", "tipo_usuario")
+
     def __init__(self, uid, email, tipo_usuario=None):
         self.uid = uid
         self.email = email
@@ -12,6 +14,13 @@ class Usuario:
             "tipo_usuario": self.tipo_usuario
         }
 
+    @classmethod
+    def from_dict(cls, data, uid=None):
+        """Crea un Usuario desde `usuarios/{clave}` (guarda el id en `user_id`)."""
+        if not isinstance(data, dict):
+            raise ValueError(f"Usuario inválido: {data!r}")
+        return cls(uid or data.get("user_id") or data.get("uid"), data.get("email"), data.get("tipo_usuario"))
+
     def __repr__(self):
         tipo_str = f" ({self.tipo_usuario})" if self.tipo_usuario else " (sin asignar)"
         return f"{self.email}{tipo_str}"
@@ -6,10 +6,11 @@ from database.db_service import DBService
 class ViewModel:
     def __init__(self, auth_service):
         self.auth_service = auth_service
-        self.use_cases = UseCases()
-        self.user_manager = Administrador()
-        self.current_user = None
+        # Un solo DBService (y su bus de eventos) para toda la app
         self.db = DBService()
+        self.use_cases = UseCases(self.db)
+        self.user_manager = Administrador(auth_service)
+        self.current_user = None
 
     # --- Sesión ---
     def login(self, uid):
@@ -36,8 +37,8 @@ class ViewModel:
 
     # --- Tendero ---
     # --Productos ---
-    def crear_producto(self, local_id, nombre, precio, stock, producto_id, imagen_url=None, proveedor=None):
-        return self.use_cases.crear_producto(local_id, nombre, precio, stock, producto_id, imagen_url, proveedor)
+    def crear_producto(self, local_id, nombre, precio, stock, producto_id, imagen_url=None, proveedor=None, costo=None):
+        return self.use_cases.crear_producto(local_id, nombre, precio, stock, producto_id, imagen_url, proveedor, costo)
 
     def listar_productos(self, local_id):
         return self.use_cases.listar_productos(local_id)
@@ -48,12 +49,47 @@ class ViewModel:
     def eliminar_producto(self, local_id, producto_id):
         return self.use_cases.eliminar_producto(local_id, producto_id)
 
+    def obtener_producto(self, local_id, producto_id):
+        return self.use_cases.obtener_producto(local_id, producto_id)
+
+    def listar_productos_pagina(self, local_id, limite=50, cursor=None):
+        return self.use_cases.listar_productos_pagina(local_id, limite, cursor)
+
+    def actualizar_productos_lote(self, local_id, cambios):
+        """Actualiza varios productos en una sola escritura."""
+        return self.use_cases.actualizar_productos_lote(local_id, cambios)
+
     def registrar_cliente(self, local_id, cliente_id, cliente_data):
         return self.use_cases.registrar_cliente(local_id, cliente_id, cliente_data)
 
     def listar_clientes(self, local_id):
         return self.use_cases.listar_clientes(local_id)
 
+    def listar_clientes_pagina(self, local_id, limite=50, cursor=None):
+        return self.use_cases.listar_clientes_pagina(local_id, limite, cursor)
+
+    def reporte_vencimientos(self, local_id, ahora=None, dias_por_vencer=30):
+        return self.use_cases.reporte_vencimientos(local_id, ahora, dias_por_vencer)
+
+    def iterar_productos(self, local_id, tam_pagina=500):
+        return self.use_cases.iterar_productos(local_id, tam_pagina)
+
+    def iterar_clientes(self, local_id, tam_pagina=500):
+        return self.use_cases.iterar_clientes(local_id, tam_pagina)
+
+    def iterar_movimientos(self, local_id, cliente_id, tam_pagina=500, detalle=False):
+        return self.use_cases.iterar_movimientos(local_id, cliente_id, tam_pagina, detalle)
+
+    def obtener_cliente(self, local_id, cliente_id):
+        return self.use_cases.obtener_cliente(local_id, cliente_id)
+
+    def eliminar_cliente(self, local_id, cliente_id):
+        return self.use_cases.eliminar_cliente(local_id, cliente_id)
+
+    def registrar_abono(self, local_id, cliente_id, monto):
+        """Resta un abono de la deuda de un cliente."""
+        return self.use_cases.registrar_abono(local_id, cliente_id, monto)
+
     def registrar_deuda(self, local_id, cliente_id, monto, plazo_dias=None):
         return self.use_cases.registrar_deuda(local_id, cliente_id, monto, plazo_dias)
 
@@ -81,6 +117,9 @@ class ViewModel:
     def _listar_locales(self):
         return self.use_cases._listar_locales()
 
+    def es_propietario(self, local_id, propietario_id):
+        return self.use_cases.es_propietario(local_id, propietario_id)
+
     def listar_locales_por_propietario(self, propietario_id):
         """Tendero: lista sus locales."""
         return self.use_cases.listar_locales_por_propietario(propietario_id)
@@ -181,6 +181,163 @@ if (window.FIAPP_PREVENT_DOUBLE_SUBMIT) {
   });
 }
 
+// Confirmación de formularios con `data-confirm` (la CSP no permite onsubmit en línea)
+document.querySelectorAll('form[data-confirm]').forEach(form => {
+  form.addEventListener('submit', function(e) {
+    if (!confirm(this.dataset.confirm)) {
+      e.preventDefault();
+      e.stopImmediatePropagation();
+    }
+  });
+});
+
+// Acciones de deuda sin recargar la página: el formulario se envía con fetch
+// pidiendo JSON y sólo se actualiza la tarjeta del cliente. Si el fetch falla
+// (red, servidor antiguo) se envía el formulario normal como respaldo.
+function formatearMonto(valor, conSigno = false) {
+  const n = Number(valor) || 0;
+  const texto = Math.abs(n).toFixed(2);
+  if (!conSigno) return `$${n.toFixed(2)}`;
+  return `${n < 0 ? '-' : '+'}${texto}`;
+}
+
+// Tarjeta afectada: la del cliente (vista del tendero) o la de la tienda (vista del cliente)
+function tarjetaDeEvento(data) {
+  const porCliente = data.cliente_id && document.querySelector(`[data-cliente-id="${CSS.escape(data.cliente_id)}"]`);
+  return porCliente || (data.local_id && document.querySelector(`.card[data-local-id="${CSS.escape(data.local_id)}"]`));
+}
+
+function actualizarFilaCliente(data) {
+  const card = tarjetaDeEvento(data);
+  if (!card) return;
+  const deuda = card.querySelector('[data-deuda]');
+  if (deuda) deuda.textContent = formatearMonto(data.deuda);
+  const ultimo = card.querySelector('[data-ultimo-movimiento]');
+  if (ultimo && data.ultimo_movimiento) {
+    ultimo.textContent = `Último movimiento: ${formatearMonto(data.ultimo_movimiento.monto, true)}`;
+  }
+}
+
+document.querySelectorAll('form[data-fiapp-deuda]').forEach(form => {
+  form.addEventListener('submit', async function(e) {
+    e.preventDefault();
+    const boton = this.querySelector('button[type="submit"]');
+    if (boton) boton.disabled = true;
+    let r;
+    try {
+      r = await fetch(this.action, {
+        method: 'POST',
+        body: new FormData(this),
+        headers: { 'Accept': 'application/json' },
+        credentials: 'same-origin'
+      });
+    } catch (err) {
+      console.warn('Acción de deuda sin conexión, se envía el formulario:', err);
+      HTMLFormElement.prototype.submit.call(this);
+      return;
+    } finally {
+      if (boton) boton.disabled = false;
+    }
+    const data = await r.json().catch(() => null);
+    if (!data) {
+      HTMLFormElement.prototype.submit.call(this);
+      return;
+    }
+    if (!r.ok) {
+      showAlert(`⚠️ ${data.error || 'No se pudo completar la acción'}`, 'error');
+      return;
+    }
+    actualizarFilaCliente(data);
+    this.reset();
+    showAlert(`✓ Deuda actualizada: ${formatearMonto(data.deuda)}`, 'success');
+  });
+});
+
+// Cambios en vivo (SSE): las páginas con `data-eventos` reciben los cambios
+// hechos por otros usuarios (otro empleado, el tendero) sin recargar.
+// EventSource se reconecta solo y reenvía Last-Event-ID; si el servidor no
+// puede reponer lo perdido envía `resync` y se recarga la página.
+document.querySelectorAll('[data-eventos]').forEach(contenedor => {
+  if (!window.EventSource) return;
+  const fuente = new EventSource(contenedor.dataset.eventos);
+  const vista = contenedor.dataset.vista || '';
+  const escuchar = (tipo, fn) => fuente.addEventListener(tipo, e => {
+    try {
+      fn(JSON.parse(e.data));
+    } catch (err) {
+      console.warn(`Evento '${tipo}' no válido:`, err);
+    }
+  });
+
+  escuchar('producto', data => {
+    const card = document.querySelector(`[data-producto-id="${CSS.escape(data.producto_id)}"]`);
+    if (!card) {
+      if (vista === 'inventario' && data.nombre) showAlert(`📦 Nuevo producto: ${data.nombre} (recarga para verlo)`, 'info');
+      return;
+    }
+    const precio = card.querySelector('[data-precio]');
+    if (precio && data.precio !== undefined) precio.textContent = data.precio;
+    const stock = card.querySelector('[data-stock]');
+    if (stock && data.stock !== undefined) stock.textContent = data.stock;
+  });
+  escuchar('producto_eliminado', data => {
+    const card = document.querySelector(`[data-producto-id="${CSS.escape(data.producto_id)}"]`);
+    if (card) card.remove();
+  });
+  escuchar('deuda', actualizarFilaCliente);
+  escuchar('cliente', data => {
+    if (vista !== 'inventario' && !tarjetaDeEvento(data)) showAlert('👥 Hay clientes o deudas nuevas (recarga para verlas)', 'info');
+  });
+  escuchar('cliente_eliminado', data => {
+    const card = tarjetaDeEvento(data);
+    if (card) card.remove();
+  });
+  fuente.addEventListener('resync', () => window.location.reload());
+  window.addEventListener('beforeunload', () => fuente.close());
+});
+
+// Búsqueda de productos mientras se escribe: pide el orden a /api/productos/buscar
+// y reordena las tarjetas del inventario (las que no coinciden se ocultan).
+// Sin JavaScript el formulario hace la misma búsqueda con `?q=`.
+document.querySelectorAll('input[data-buscar-productos]').forEach(input => {
+  const grilla = document.querySelector('[data-productos]');
+  const estado = document.querySelector('[data-buscar-estado]');
+  if (!grilla) return;
+  const tarjetas = Array.from(grilla.querySelectorAll('[data-producto-id]'));
+  let espera = null;
+  let pedido = 0;
+
+  const mostrar = ids => {
+    const visibles = new Set(ids || tarjetas.map(t => t.dataset.productoId));
+    const orden = ids ? ids.map(id => tarjetas.find(t => t.dataset.productoId === id)).filter(Boolean) : tarjetas;
+    tarjetas.forEach(t => { t.style.display = visibles.has(t.dataset.productoId) ? '' : 'none'; });
+    orden.forEach(t => grilla.appendChild(t));
+  };
+
+  input.addEventListener('input', () => {
+    clearTimeout(espera);
+    espera = setTimeout(async () => {
+      const q = input.value.trim();
+      const numero = ++pedido;
+      if (!q) {
+        mostrar(null);
+        if (estado) estado.textContent = '';
+        return;
+      }
+      try {
+        const url = `${input.dataset.buscarProductos}&q=${encodeURIComponent(q)}&limite=100`;
+        const r = await fetch(url, { headers: { 'Accept': 'application/json' }, credentials: 'same-origin' });
+        const data = await r.json();
+        if (numero !== pedido || !r.ok) return;  // llegó una búsqueda más nueva
+        mostrar(data.resultados.map(p => p.producto_id));
+        if (estado) estado.textContent = `${data.resultados.length} resultados para «${q}» (${data.ms} ms)`;
+      } catch (err) {
+        console.warn('Búsqueda no disponible:', err);
+      }
+    }, 150);
+  });
+});
+
 // Log page load
 console.log('%c🎨 FIAPP Web - Modern UI Ready', 'color: #00b4d8; font-size: 14px; font-weight: bold;');
 
@@ -215,6 +372,7 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     function closeChat(){
+      if (streamActual) streamActual.abort();
       chatModal.classList.add('hidden');
       chatModal.setAttribute('aria-hidden','true');
     }
@@ -252,6 +410,83 @@ document.addEventListener('DOMContentLoaded', function() {
       }
     }
 
+    // Respuesta en streaming (SSE sobre fetch POST): el texto se va pintando
+    // a medida que llega. Cerrar el chat cancela la petición y el servidor
+    // corta el stream con el proveedor.
+    let streamActual = null;
+
+    async function streamMessageFromServer(text){
+      if (!window.ReadableStream || !window.TextDecoder || !window.AbortController) {
+        return sendMessageToServer(text);
+      }
+      appendMessage('⌛ Pensando...', 'system');
+      const quitarPensando = () => {
+        const lastSys = chatMessages.querySelector('.chat-msg.system:last-child');
+        if (lastSys) lastSys.remove();
+      };
+      const control = new AbortController();
+      streamActual = control;
+      let burbuja = null;
+      try{
+        const r = await fetch('/api/ai_chat/stream', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+          body: JSON.stringify({ message: text }),
+          credentials: 'same-origin',
+          signal: control.signal
+        });
+        if (!r.ok || !r.body) {
+          quitarPensando();
+          const data = await r.json().catch(() => ({}));
+          appendMessage(data.error || 'No se recibió respuesta', 'bot');
+          return;
+        }
+        const reader = r.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          let corte;
+          while ((corte = buffer.indexOf('\n\n')) >= 0) {
+            const bloque = buffer.slice(0, corte);
+            buffer = buffer.slice(corte + 2);
+            let tipo = 'message';
+            let datos = '';
+            bloque.split('\n').forEach(linea => {
+              if (linea.startsWith('event:')) tipo = linea.slice(6).trim();
+              else if (linea.startsWith('data:')) datos += linea.slice(5).trim();
+            });
+            if (!datos) continue;
+            const data = JSON.parse(datos);
+            if (tipo === 'delta') {
+              if (!burbuja) {
+                quitarPensando();
+                appendMessage('', 'bot');
+                burbuja = chatMessages.lastElementChild;
+              }
+              burbuja.textContent += data.texto;
+              chatMessages.scrollTop = chatMessages.scrollHeight;
+            } else if (tipo === 'error') {
+              quitarPensando();
+              appendMessage(data.error || 'Error en la respuesta', 'bot');
+            } else if (tipo === 'done') {
+              console.debug('FIAPP chat ttft_ms=', data.ttft_ms, 'total_ms=', data.total_ms);
+            }
+          }
+        }
+        if (!burbuja) {
+          quitarPensando();
+        }
+      }catch(err){
+        quitarPensando();
+        if (err.name !== 'AbortError') appendMessage('Error de red: ' + (err.message || err), 'bot');
+      }finally{
+        if (streamActual === control) streamActual = null;
+      }
+    }
+
     chatButton.addEventListener('click', openChat);
     chatBackdrop && chatBackdrop.addEventListener('click', closeChat);
     chatClose && chatClose.addEventListener('click', closeChat);
@@ -263,7 +498,7 @@ document.addEventListener('DOMContentLoaded', function() {
         if (!text) return;
         appendMessage(text, 'user');
         chatInput.value = '';
-        sendMessageToServer(text);
+        streamMessageFromServer(text);
       });
     }
   } catch (err) {
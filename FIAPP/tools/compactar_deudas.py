@@ -0,0 +1,137 @@
+"""Compacta el historial de deudas de los clientes en resúmenes mensuales.
+
+Los movimientos de los meses (UTC) completos anteriores al horizonte pasan
+a `archivo_deudas/{local_id}/{cliente_id}/{AAAA-MM}/` y en `deudas/` queda
+un movimiento "resumen" por mes con el neto, los cargos, los abonos y la
+cantidad de movimientos (ver `DBService.archivar_movimientos`). La suma del
+historial no cambia: si no coincide, la cuenta no se toca.
+
+No se archivan las deudas con plazo que siguen pendientes en el índice de
+vencimientos, ni los meses con un solo movimiento (no hay nada que ahorrar).
+Volver a correrlo suma al resumen existente lo que se pueda archivar después.
+
+Uso (desde la carpeta FIAPP):
+    python -m tools.compactar_deudas --dry-run
+    python -m tools.compactar_deudas --dias 365 --local local_123
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timezone
+
+from database.firebase_config import init_firebase
+from database.db_service import DBService
+from domain.coleccion import a_numero
+
+HORIZONTE_DIAS = int(os.getenv("FIAPP_COMPACTAR_DIAS", "180"))
+TAM_PAGINA = 100
+
+
+def mes_de(timestamp):
+    """("AAAA-MM", inicio del mes en segundos) de un timestamp, en UTC."""
+    fecha = datetime.fromtimestamp(int(timestamp), timezone.utc)
+    inicio = fecha.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return inicio.strftime("%Y-%m"), int(inicio.timestamp())
+
+
+def corte(ahora, dias):
+    """Inicio del mes que contiene `ahora - dias`: se compacta lo anterior."""
+    return mes_de(ahora - dias * 86400)[1]
+
+
+def compactar_cuenta(cliente_id, cuenta, hasta):
+    """(archivados {mes: {clave: movimiento}}, resumenes {clave: resumen}) de una cuenta."""
+    historial = cuenta.get("deudas") or {}
+    pendientes = cuenta.get("vencimientos") or {}
+    archivados = {}
+    for clave in sorted(historial):
+        movimiento = historial[clave]
+        if not isinstance(movimiento, dict) or movimiento.get("tipo") == "resumen":
+            continue
+        try:
+            timestamp = int(movimiento.get("timestamp") or 0)
+        except (TypeError, ValueError):
+            continue
+        if not timestamp or timestamp >= hasta:
+            continue
+        plazo = movimiento.get("plazo_dias")
+        if isinstance(plazo, int) and plazo > 0 and \
+                DBService.clave_vencimiento(timestamp + plazo * 86400, cliente_id, clave) in pendientes:
+            continue  # todavía se descuenta de su vencimiento
+        archivados.setdefault(mes_de(timestamp)[0], {})[clave] = movimiento
+
+    resumenes = {}
+    for mes in list(archivados):
+        movimientos = archivados[mes]
+        inicio = mes_de(next(iter(movimientos.values()))["timestamp"])[1]
+        clave = f"{inicio * 1000}_resumen"
+        anterior = historial.get(clave)
+        if len(movimientos) < 2 and not isinstance(anterior, dict):
+            del archivados[mes]
+            continue
+        resumen = dict(anterior) if isinstance(anterior, dict) else {
+            "tipo": "resumen", "mes": mes, "timestamp": inicio, "monto": 0.0, "cargos": 0.0, "abonos": 0.0,
+            "movimientos": 0,
+        }
+        for movimiento in movimientos.values():
+            monto = a_numero(movimiento.get("monto"))
+            resumen["monto"] = round(resumen["monto"] + monto, 2)
+            if monto >= 0:
+                resumen["cargos"] = round(resumen["cargos"] + monto, 2)
+            else:
+                resumen["abonos"] = round(resumen["abonos"] - monto, 2)
+            resumen["movimientos"] += 1
+        resumenes[clave] = resumen
+    return archivados, resumenes
+
+
+def _saldo(historial):
+    return round(sum(a_numero(m.get("monto")) for m in historial.values() if isinstance(m, dict)), 2)
+
+
+def compactar(db, solo_local=None, dias=HORIZONTE_DIAS, dry_run=False, ahora=None):
+    hasta = corte(ahora or time.time(), dias)
+    locales = [solo_local] if solo_local else list(db.ref.child("locales").get(shallow=True) or {})
+    cuentas = archivados_total = 0
+    for local_id in locales:
+        cursor = None
+        while True:
+            clientes, cursor = db.get_clientes_pagina(local_id, TAM_PAGINA, cursor)
+            for cliente_id, cuenta in clientes.items():
+                if not isinstance(cuenta, dict):
+                    continue
+                archivados, resumenes = compactar_cuenta(cliente_id, cuenta, hasta)
+                if not archivados:
+                    continue
+                historial = dict(cuenta.get("deudas") or {})
+                for movimientos in archivados.values():
+                    for clave in movimientos:
+                        del historial[clave]
+                historial.update(resumenes)
+                if _saldo(historial) != _saldo(cuenta.get("deudas") or {}):
+                    print(f"[COMPACTAR] {local_id}/{cliente_id}: el saldo no coincide, se omite")
+                    continue
+                cuentas += 1
+                archivados_total += sum(len(m) for m in archivados.values())
+                if not dry_run:
+                    db.archivar_movimientos(local_id, cliente_id, archivados, resumenes)
+            if not cursor:
+                break
+    print(f"[COMPACTAR] locales: {len(locales)}, cuentas: {cuentas}, movimientos archivados: {archivados_total}"
+          f"{' (dry-run)' if dry_run else ''}")
+    return {"locales": len(locales), "cuentas": cuentas, "archivados": archivados_total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dias", type=int, default=HORIZONTE_DIAS,
+                        help=f"archivar los meses anteriores a hace N días (FIAPP_COMPACTAR_DIAS, {HORIZONTE_DIAS})")
+    parser.add_argument("--dry-run", action="store_true", help="sólo mostrar lo que se haría")
+    parser.add_argument("--local", help="compactar sólo este local")
+    args = parser.parse_args()
+    init_firebase()
+    compactar(DBService(), args.local, args.dias, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Proveedor de IA falso (compatible con la API de chat de Groq/OpenAI).
+
+Responde `POST /openai/v1/chat/completions` con `stream=true` enviando
+fragmentos SSE con la latencia configurada, para probar y medir el chat
+sin llave ni red: tiempo hasta el primer token, cancelación, plazos y el
+circuit breaker (`--fallos` / `--colgar`).
+
+Uso (desde la carpeta FIAPP):
+    python -m tools.fake_ai_provider --puerto 8765 --primer-token 0.4 --intervalo 0.05
+    # en otra terminal
+    QROQ_API_KEY=falsa FIAPP_AI_BASE_URL=http://127.0.0.1:8765 python -m app.main
+
+Desde código (benchmarks):
+    servidor, url = iniciar(primer_token=0.1)
+    ...
+    servidor.shutdown()
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RUTA = "/openai/v1/chat/completions"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: el cliente reutiliza la conexión
+    disable_nagle_algorithm = True  # fragmentos pequeños: sin esperar al ACK retrasado (~40ms)
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.conexiones += 1
+
+    def log_message(self, format, *args):
+        if self.server.opciones["verbose"]:
+            super().log_message(format, *args)
+
+    def do_POST(self):
+        opciones = self.server.opciones
+        largo = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(largo) or b"{}")
+        with self.server.lock:
+            self.server.peticiones += 1
+
+        if self.path != RUTA:
+            return self._json(404, {"error": {"message": "not found"}})
+        if random.random() < opciones["fallos"]:
+            return self._json(500, {"error": {"message": "fallo simulado"}})
+        if opciones["colgar"]:
+            # Acepta la petición y nunca responde (prueba de plazos)
+            time.sleep(opciones["colgar"])
+            return
+
+        if not body.get("stream"):
+            time.sleep(opciones["primer_token"])
+            texto = " ".join(self._tokens(body))
+            return self._json(200, self._completion(texto))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            time.sleep(opciones["primer_token"])
+            for i, token in enumerate(self._tokens(body)):
+                if i:
+                    time.sleep(opciones["intervalo"])
+                self._chunk(f"data: {json.dumps(self._delta(token + ' '))}\n\n")
+            self._chunk("data: [DONE]\n\n")
+            self._chunk("")
+        except (BrokenPipeError, ConnectionResetError):
+            with self.server.lock:
+                self.server.cancelados += 1
+
+    def _tokens(self, body):
+        n = self.server.opciones["tokens"]
+        return [f"token{i}" for i in range(n)]
+
+    def _chunk(self, texto):
+        data = texto.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _json(self, status, data):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    @staticmethod
+    def _delta(texto):
+        return {
+            "id": "chatcmpl-falso",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": "falso",
+            "choices": [{"index": 0, "delta": {"role": "assistant", "content": texto}, "finish_reason": None}],
+        }
+
+    @staticmethod
+    def _completion(texto):
+        return {
+            "id": "chatcmpl-falso",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "falso",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": texto}, "finish_reason": "stop"}],
+        }
+
+
+def iniciar(puerto=0, primer_token=0.2, intervalo=0.02, tokens=20, fallos=0.0, colgar=0.0, verbose=False):
+    """Arranca el servidor en un hilo de fondo. Retorna `(servidor, url_base)`.
+
+    El servidor cuenta `conexiones`, `peticiones` y `cancelados` (streams que
+    el cliente cortó) para verificar keep-alive y cancelación.
+    """
+    servidor = ThreadingHTTPServer(("127.0.0.1", puerto), _Handler)
+    servidor.daemon_threads = True
+    servidor.opciones = {
+        "primer_token": primer_token, "intervalo": intervalo, "tokens": tokens,
+        "fallos": fallos, "colgar": colgar, "verbose": verbose,
+    }
+    servidor.lock = threading.Lock()
+    servidor.conexiones = servidor.peticiones = servidor.cancelados = 0
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--primer-token", type=float, default=0.2, help="segundos hasta el primer fragmento")
+    parser.add_argument("--intervalo", type=float, default=0.02, help="segundos entre fragmentos")
+    parser.add_argument("--tokens", type=int, default=20, help="fragmentos por respuesta")
+    parser.add_argument("--fallos", type=float, default=0.0, help="probabilidad (0-1) de responder 500")
+    parser.add_argument("--colgar", type=float, default=0.0, help="segundos sin responder (simula un proveedor caído)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    servidor, url = iniciar(args.puerto, args.primer_token, args.intervalo, args.tokens,
+                            args.fallos, args.colgar, args.verbose)
+    print(f"[FAKE AI] escuchando en {url} (FIAPP_AI_BASE_URL={url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
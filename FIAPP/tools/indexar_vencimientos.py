@@ -0,0 +1,101 @@
+"""Reconstruye el índice de vencimientos (`vencimientos/{local_id}`) desde el historial.
+
+Para cada cliente de cada local recorre `deudas/` en orden: cada cargo con
+`plazo_dias` agrega una entrada que vence `timestamp + plazo_dias` días,
+los abonos y cancelaciones se descuentan de lo que vence primero
+(`DBService.repartir_pago`) y al final lo pendiente se ajusta a la deuda
+actual del cliente. Reemplaza el índice de cada local y los punteros
+`vencimientos/` de sus clientes en una sola escritura por local.
+
+En los meses compactados (`tools/compactar_deudas.py`) se recorren los
+movimientos archivados en lugar del resumen, así el resultado es el mismo
+que con el historial completo.
+
+Uso (desde la carpeta FIAPP):
+    python -m tools.indexar_vencimientos --dry-run
+    python -m tools.indexar_vencimientos --local local_123
+"""
+import argparse
+
+from database.firebase_config import init_firebase
+from database.db_service import DBService
+from domain.coleccion import a_numero
+
+
+def vencimientos_cliente(cliente_id, cuenta, archivados=None):
+    """{clave_indice: entrada} pendientes de una cuenta, según su historial y su deuda actual.
+
+    `archivados` = {clave: movimiento} de los meses compactados de la cuenta.
+    """
+    entradas = {}
+    nombre = cuenta.get("nombre") or cuenta.get("email") or cliente_id
+    historial = {**(cuenta.get("deudas") or {}), **(archivados or {})}
+    for clave in sorted(historial):
+        movimiento = historial[clave]
+        if not isinstance(movimiento, dict) or movimiento.get("tipo") == "resumen":
+            continue
+        monto = a_numero(movimiento.get("monto"))
+        plazo = movimiento.get("plazo_dias")
+        if monto > 0:
+            if isinstance(plazo, int) and plazo > 0 and movimiento.get("timestamp"):
+                vence = int(movimiento["timestamp"]) + plazo * 86400
+                entradas[DBService.clave_vencimiento(vence, cliente_id, clave)] = {
+                    "cliente_id": cliente_id, "nombre": nombre, "movimiento": clave, "monto": monto,
+                    "pendiente": monto, "vence": vence,
+                }
+        elif monto < 0:
+            _aplicar(entradas, -monto)
+    # Lo que se ajustó a mano (`set_deuda`) no deja movimiento: manda la deuda actual
+    exceso = sum(e["pendiente"] for e in entradas.values()) - a_numero(cuenta.get("deuda"))
+    if exceso > 0:
+        _aplicar(entradas, exceso)
+    return entradas
+
+
+def _aplicar(entradas, pago):
+    pendientes = {clave: e["pendiente"] for clave, e in entradas.items()}
+    for clave, pendiente in DBService.repartir_pago(pendientes, pago).items():
+        if pendiente > 0:
+            entradas[clave]["pendiente"] = pendiente
+        else:
+            del entradas[clave]
+
+
+def indexar(db, solo_local=None, dry_run=False):
+    locales = [solo_local] if solo_local else list(db.ref.child("locales").get(shallow=True) or {})
+    total = 0
+    for local_id in locales:
+        clientes = db.get_clientes(local_id)
+        indice = {}
+        rutas = {}
+        for cliente_id, cuenta in clientes.items():
+            if not isinstance(cuenta, dict):
+                continue
+            archivados = {}
+            for movimiento in (cuenta.get("deudas") or {}).values():
+                if isinstance(movimiento, dict) and movimiento.get("tipo") == "resumen" and movimiento.get("mes"):
+                    archivados.update(db.get_archivo_deudas(local_id, cliente_id, movimiento["mes"]))
+            entradas = vencimientos_cliente(cliente_id, cuenta, archivados)
+            indice.update(entradas)
+            rutas[f"locales/{local_id}/clientes/{cliente_id}/vencimientos"] = (
+                {clave: e["pendiente"] for clave, e in entradas.items()} or None)
+        rutas[f"vencimientos/{local_id}"] = indice or None
+        total += len(indice)
+        print(f"[VENCIMIENTOS] {local_id}: {len(indice)} deudas pendientes con plazo")
+        if not dry_run:
+            db.ref.update(rutas)
+    print(f"[VENCIMIENTOS] locales: {len(locales)}, entradas: {total}{' (dry-run)' if dry_run else ''}")
+    return {"locales": len(locales), "entradas": total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="sólo mostrar lo que se haría")
+    parser.add_argument("--local", help="reconstruir sólo este local")
+    args = parser.parse_args()
+    init_firebase()
+    indexar(DBService(), args.local, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Migra las imágenes de productos al almacén direccionado por contenido.
+
+Para cada producto con `imagen_url` antiguo (`producto_<ts>_<rand>.<ext>`):
+  1. calcula el sha256 del archivo y lo guarda como `<sha256>.<ext>`
+     (los archivos idénticos quedan en uno solo),
+  2. reescribe `imagen_url` y regenera el mapa `imagenes` de variantes,
+  3. reconstruye `imagenes_refs` con los productos que usan cada imagen.
+
+Los archivos antiguos sólo se borran con `--borrar-antiguos`, y los que no
+usa ningún producto sólo con `--borrar-huerfanos`.
+
+Uso (desde la carpeta FIAPP):
+    python -m tools.migrar_imagenes --dry-run
+    python -m tools.migrar_imagenes --borrar-antiguos
+"""
+import argparse
+import hashlib
+import os
+
+from database.firebase_config import init_firebase
+from database.db_service import DBService
+from database.image_service import ImageService
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), "../static/productos")
+
+
+def _sha256_archivo(ruta):
+    hasher = hashlib.sha256()
+    with open(ruta, "rb") as fh:
+        for chunk in iter(lambda: fh.read(ImageService.CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def migrar(db, imagenes, dry_run=False, borrar_antiguos=False, borrar_huerfanos=False):
+    locales = db.ref.child("locales").get() or {}
+    migrados = {}  # nombre antiguo -> url nueva
+    refs = {}      # hash -> {local_id: {producto_id: True}}
+    reescritos = 0
+
+    for local_id, local_data in locales.items():
+        for producto_id, producto in (local_data.get("productos") or {}).items():
+            imagen_url = producto.get("imagen_url")
+            if not imagen_url:
+                continue
+            nueva_url = imagen_url
+            if not imagenes.hash_de_url(imagen_url):
+                nombre = os.path.basename(imagen_url)
+                if nombre not in migrados:
+                    ruta = imagenes.ruta_local(imagen_url)
+                    if not os.path.exists(ruta):
+                        print(f"[MIGRAR] {local_id}/{producto_id}: {nombre} no existe en disco, se omite")
+                        continue
+                    ext = nombre.rsplit(".", 1)[-1].lower()
+                    if dry_run:
+                        ext = "jpg" if ext == "jpeg" else ext
+                        migrados[nombre] = f"{imagenes.url_prefix}/{_sha256_archivo(ruta)}.{ext}"
+                    else:
+                        with open(ruta, "rb") as fh:
+                            migrados[nombre] = imagenes.guardar_stream(fh, ext)
+                nueva_url = migrados[nombre]
+                print(f"[MIGRAR] {local_id}/{producto_id}: {nombre} -> {os.path.basename(nueva_url)}")
+                if not dry_run:
+                    data = {"imagen_url": nueva_url}
+                    variantes = imagenes.generar_variantes(nueva_url)
+                    data["imagenes"] = variantes or None
+                    db.update_producto(local_id, producto_id, data)
+                reescritos += 1
+
+            imagen_hash = imagenes.hash_de_url(nueva_url)
+            refs.setdefault(imagen_hash, {}).setdefault(local_id, {})[producto_id] = True
+
+    if not dry_run:
+        db.ref.child("imagenes_refs").set(refs or None)
+
+    # Limpieza de archivos en disco
+    en_uso = set(refs)
+    for nombre in sorted(os.listdir(imagenes.upload_folder)):
+        if nombre.startswith("."):
+            continue
+        imagen_hash = imagenes.hash_de_url(nombre)
+        if imagen_hash:
+            huerfano = imagen_hash not in en_uso
+            borrar = borrar_huerfanos
+        else:
+            huerfano = nombre not in migrados
+            borrar = borrar_huerfanos if huerfano else borrar_antiguos
+        if huerfano:
+            print(f"[MIGRAR] huérfano: {nombre}")
+        if borrar and not dry_run:
+            os.remove(os.path.join(imagenes.upload_folder, nombre))
+            print(f"[MIGRAR] borrado: {nombre}")
+
+    print(f"[MIGRAR] productos reescritos: {reescritos}, archivos antiguos migrados: {len(migrados)}, "
+          f"imágenes únicas en uso: {len(en_uso)}{' (dry-run)' if dry_run else ''}")
+    return {"reescritos": reescritos, "migrados": len(migrados), "unicas": len(en_uso)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="sólo mostrar lo que se haría")
+    parser.add_argument("--borrar-antiguos", action="store_true", help="borrar los archivos antiguos ya migrados")
+    parser.add_argument("--borrar-huerfanos", action="store_true", help="borrar archivos que ningún producto usa")
+    args = parser.parse_args()
+
+    init_firebase()
+    db = DBService()
+    imagenes = ImageService(UPLOAD_FOLDER, db=db)
+    migrar(db, imagenes, args.dry_run, args.borrar_antiguos, args.borrar_huerfanos)
+
+
+if __name__ == "__main__":
+    main()